@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+KarnaliX - Transactional bet-lock benchmark
+
+Measures the latency cost of running the bet-lock path (two wallet legs,
+bet insert, transaction insert) inside a MongoDB transaction versus the
+plain non-transactional sequence. Needs a replica set for the
+transactional half; runs against a throwaway database that is dropped
+before and after the run, so its name must start with bench_ (or pass
+--yes-drop to confirm another name).
+
+Usage:
+    python bench_transactions.py --iterations 2000 --concurrency 32
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+parser = argparse.ArgumentParser(description='Benchmark transactional vs plain bet placement')
+parser.add_argument('--iterations', type=int, default=1000, help='Bets to place per mode')
+parser.add_argument('--concurrency', type=int, default=16, help='Concurrent in-flight bets')
+parser.add_argument('--users', type=int, default=50, help='Distinct wallets to spread bets over')
+parser.add_argument('--db', default='bench_karnalix', help='Scratch database, dropped before and after (must start with bench_)')
+parser.add_argument('--yes-drop', action='store_true', help='Allow a --db name without the bench_ prefix to be dropped')
+args = parser.parse_args()
+
+SCRATCH_PREFIX = 'bench_'
+if not args.db.startswith(SCRATCH_PREFIX) and not args.yes_drop:
+    sys.exit(f'Refusing to drop {args.db!r}: scratch databases must start with {SCRATCH_PREFIX!r} (or pass --yes-drop)')
+
+# Point the app modules at the scratch database before they connect
+os.environ['DB_NAME'] = args.db
+os.environ.setdefault('MONGO_TRANSACTIONS', 'auto')
+sys.path.insert(0, str(Path(__file__).parent))
+
+from config.database import client, db
+from models.money import ZERO, to_money
+from utils.wallet import move_balance
+from utils.transactions import run_in_transaction, transactions_supported
+
+async def seed_wallets(user_ids):
+    docs = []
+    for user_id in user_ids:
+        for wallet_type, balance in (('main_coin', to_money(10 ** 12)), ('locked', ZERO)):
+            docs.append({
+                'id': str(uuid.uuid4()),
+                'user_id': user_id,
+                'wallet_type': wallet_type,
+                'balance': balance,
+                'created_at': datetime.utcnow(),
+                'updated_at': datetime.utcnow()
+            })
+    await db.wallets.insert_many(docs)
+    await db.wallets.create_index([('user_id', 1), ('wallet_type', 1)])
+
+STAKE = to_money(1)
+
+def make_writes(user_id):
+    bet_id = str(uuid.uuid4())
+    bet = {'id': bet_id, 'user_id': user_id, 'game_id': 'bench', 'amount': STAKE,
+           'status': 'pending', 'created_at': datetime.utcnow()}
+    txn = {'id': str(uuid.uuid4()), 'from_user_id': user_id, 'to_user_id': user_id, 'amount': STAKE,
+           'transaction_type': 'bet', 'wallet_type': 'locked', 'metadata': {'bet_id': bet_id},
+           'created_at': datetime.utcnow()}
+
+    async def lock_and_record(session):
+        await move_balance(user_id, 'main_coin', user_id, 'locked', STAKE, session=session)
+        await db.bets.insert_one(bet, session=session)
+        await db.transactions.insert_one(txn, session=session)
+
+    return lock_and_record
+
+async def run_mode(name, user_ids, transactional):
+    latencies = []
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def one(i):
+        callback = make_writes(user_ids[i % len(user_ids)])
+        async with semaphore:
+            start = time.perf_counter()
+            if transactional:
+                await run_in_transaction(callback)
+            else:
+                await callback(None)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    wall_start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(args.iterations)))
+    wall = time.perf_counter() - wall_start
+
+    latencies.sort()
+    return {
+        'mode': name,
+        'p50': latencies[int(len(latencies) * 0.50)],
+        'p99': latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))],
+        'max': latencies[-1],
+        'throughput': args.iterations / wall
+    }
+
+async def main():
+    print("\n" + "="*60)
+    print("🎰 KarnaliX - Transactional Bet Placement Benchmark")
+    print("="*60 + "\n")
+    print(f"Iterations: {args.iterations}  Concurrency: {args.concurrency}  Wallets: {args.users}\n")
+
+    await client.drop_database(args.db)
+    user_ids = [str(uuid.uuid4()) for _ in range(args.users)]
+    await seed_wallets(user_ids)
+
+    results = [await run_mode('non-transactional', user_ids, transactional=False)]
+
+    if await transactions_supported():
+        results.append(await run_mode('transactional', user_ids, transactional=True))
+    else:
+        print("⏭️  Transactions unavailable (standalone mongod) - skipping transactional run\n")
+
+    print(f"{'mode':<20}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}{'ops/s':>10}")
+    for r in results:
+        print(f"{r['mode']:<20}{r['p50']:>10.2f}{r['p99']:>10.2f}{r['max']:>10.2f}{r['throughput']:>10.0f}")
+
+    if len(results) == 2:
+        base, txn = results
+        print(f"\nTransaction overhead: p50 x{txn['p50'] / base['p50']:.2f}, p99 x{txn['p99'] / base['p99']:.2f}")
+
+    await client.drop_database(args.db)
+    client.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+KarnaliX - Index plan check
+
+Reconciles the server's indexes with the registry in config/indexes.py and
+explains every registered route query shape. Exits non-zero if any query
+is planned as a collection scan, so it can gate deploys and CI.
+
+Usage:
+    python check_indexes.py             # create missing indexes, report, explain
+    python check_indexes.py --dry-run   # report only, create nothing
+"""
+
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from config.database import close_database
+from utils.indexes import reconcile_indexes, explain_query_shapes
+
+async def main(dry_run: bool):
+    print("\n" + "="*60)
+    print("🎰 KarnaliX - Index Plan Check")
+    print("="*60 + "\n")
+
+    report = await reconcile_indexes(create=not dry_run)
+
+    labels = {
+        'created': 'Would create' if dry_run else 'Created',
+        'conflicts': 'Option conflicts',
+        'redundant': 'Redundant (prefix of another index)',
+        'unregistered': 'Not in registry',
+        'unused': 'No accesses since server start'
+    }
+    for kind, label in labels.items():
+        if report[kind]:
+            print(f"{label}:")
+            for item in report[kind]:
+                detail = f"  ({item['detail']})" if item.get('detail') else ''
+                print(f"    {item['collection']}.{item['index']}{detail}")
+            print()
+
+    results = await explain_query_shapes()
+    scans = [r for r in results if r['collscan']]
+    for r in results:
+        print(f"{'❌ COLLSCAN' if r['collscan'] else '✅ IXSCAN  '}  {r['name']}")
+
+    print(f"\n{len(results) - len(scans)}/{len(results)} query shapes index-backed\n")
+
+    close_database()
+    return 1 if scans else 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Reconcile indexes and check route query plans')
+    parser.add_argument('--dry-run', action='store_true', help='Report missing indexes without creating them')
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.dry_run)))
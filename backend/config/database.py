@@ -1,4 +1,7 @@
 from motor.motor_asyncio import AsyncIOMotorClient
+from bson.codec_options import CodecOptions, TypeCodec, TypeRegistry
+from bson.decimal128 import Decimal128
+from decimal import Decimal
 import os
 from dotenv import load_dotenv
 from pathlib import Path
@@ -10,8 +13,21 @@ load_dotenv(ROOT_DIR / '.env')
 mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
 db_name = os.environ.get('DB_NAME', 'karnalix_db')
 
+class DecimalCodec(TypeCodec):
+    """Store decimal.Decimal (money) as Decimal128 and read it back as Decimal"""
+    python_type = Decimal
+    bson_type = Decimal128
+
+    def transform_python(self, value):
+        return Decimal128(value)
+
+    def transform_bson(self, value):
+        return value.to_decimal()
+
+codec_options = CodecOptions(type_registry=TypeRegistry([DecimalCodec()]))
+
 client = AsyncIOMotorClient(mongo_url)
-db = client[db_name]
+db = client.get_database(db_name, codec_options=codec_options)
 
 def get_database():
     """Get database instance"""
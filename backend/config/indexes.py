@@ -0,0 +1,181 @@
+from pymongo import IndexModel, ASCENDING, DESCENDING
+from datetime import datetime
+
+# Declarative index plan. Every index the application relies on is listed
+# here against its collection; utils.indexes creates what is missing at
+# startup and reports anything on the server that is not in this list.
+# Keep each entry next to a comment naming the queries it serves.
+
+# Listing order shared by every keyset-paginated history endpoint
+NEWEST_FIRST = [('created_at', DESCENDING), ('id', DESCENDING)]
+
+def _unique_id() -> IndexModel:
+    return IndexModel([('id', ASCENDING)], unique=True)
+
+def _owned_history(owner_field: str = 'user_id') -> list:
+    """Indexes for a ledger collection listed per owner, per status and by downline"""
+    return [
+        IndexModel(NEWEST_FIRST),
+        IndexModel([(owner_field, ASCENDING)] + NEWEST_FIRST),
+        IndexModel([('status', ASCENDING)] + NEWEST_FIRST),
+        IndexModel([('scope_ids', ASCENDING)] + NEWEST_FIRST),
+        # Dashboard counters: {user_id, status} and {user_id, status, created_at >= today}
+        IndexModel([(owner_field, ASCENDING), ('status', ASCENDING), ('created_at', DESCENDING)]),
+    ]
+
+INDEXES = {
+    'users': [
+        _unique_id(),
+        IndexModel([('email', ASCENDING)], unique=True),
+        IndexModel([('username', ASCENDING)], unique=True),
+        IndexModel([('role', ASCENDING)]),
+        IndexModel([('ancestors', ASCENDING)]),
+    ],
+    'wallets': [
+        IndexModel([('user_id', ASCENDING), ('wallet_type', ASCENDING)]),
+        # Incremental reconciliation: wallets updated since the checkpoint
+        IndexModel([('updated_at', ASCENDING)]),
+    ],
+    'transactions': [
+        _unique_id(),
+        IndexModel(NEWEST_FIRST),
+        # User history and recent activity: $or on either side, newest first
+        IndexModel([('from_user_id', ASCENDING)] + NEWEST_FIRST),
+        IndexModel([('to_user_id', ASCENDING)] + NEWEST_FIRST),
+        IndexModel([('scope_ids', ASCENDING)] + NEWEST_FIRST),
+    ],
+    'bets': [_unique_id()] + _owned_history(),
+    'deposits': [_unique_id()] + _owned_history(),
+    'withdrawals': [_unique_id()] + _owned_history(),
+    'games': [
+        _unique_id(),
+        IndexModel([('category', ASCENDING)]),
+        IndexModel([('is_active', ASCENDING)]),
+    ],
+    'game_providers': [
+        _unique_id(),
+        IndexModel([('name', ASCENDING)]),
+    ],
+    'game_sessions': [
+        IndexModel([('user_id', ASCENDING), ('created_at', DESCENDING)]),
+    ],
+    'kyc_documents': [
+        _unique_id(),
+        # Latest document per user, and the oldest-first review queue
+        IndexModel([('user_id', ASCENDING), ('created_at', DESCENDING)]),
+        IndexModel([('status', ASCENDING), ('created_at', ASCENDING), ('id', ASCENDING)]),
+    ],
+    'tickets': [
+        _unique_id(),
+        IndexModel([('updated_at', DESCENDING), ('id', DESCENDING)]),
+        IndexModel([('user_id', ASCENDING), ('updated_at', DESCENDING), ('id', DESCENDING)]),
+    ],
+    'ticket_messages': [
+        _unique_id(),
+        # Thread reads: {ticket_id}, oldest first, keyset over (created_at, id)
+        IndexModel([('ticket_id', ASCENDING), ('created_at', ASCENDING), ('id', ASCENDING)]),
+    ],
+    'platform_stats': [
+        # Rollup reads: base by _id plus its slots by rollup
+        IndexModel([('rollup', ASCENDING)]),
+    ],
+    'system_configs': [
+        IndexModel([('config_key', ASCENDING)], unique=True),
+        IndexModel([('category', ASCENDING)]),
+    ],
+    'payment_methods': [
+        _unique_id(),
+        IndexModel([('is_active', ASCENDING), ('sort_order', ASCENDING)]),
+    ],
+    'bonus_rules': [
+        IndexModel([('is_active', ASCENDING), ('auto_apply', ASCENDING)]),
+    ],
+    'referrals': [
+        IndexModel([('referrer_id', ASCENDING)]),
+    ],
+    'ledger_entries': [
+        _unique_id(),
+        IndexModel([('posting_id', ASCENDING)]),
+        # Snapshot windows and replay: created_at range scans in order
+        IndexModel([('created_at', ASCENDING)]),
+        # Balance tails: {account, created_at > snapshot.as_of}
+        IndexModel([('account', ASCENDING), ('created_at', ASCENDING)]),
+        # Per-user statement
+        IndexModel([('user_id', ASCENDING)] + NEWEST_FIRST),
+    ],
+    'reconciliation_runs': [
+        IndexModel([('status', ASCENDING), ('as_of', DESCENDING)]),
+    ],
+    'ledger_snapshots': [
+        IndexModel([('account', ASCENDING), ('as_of', DESCENDING)]),
+    ],
+    'sessions': [
+        _unique_id(),
+        # revoke_user_sessions
+        IndexModel([('user_id', ASCENDING), ('revoked_at', ASCENDING)]),
+        # Revocation sync: {revoked_at > since}
+        IndexModel([('revoked_at', ASCENDING)]),
+        # TTL: MongoDB drops each session once its sliding expiry passes
+        IndexModel([('expires_at', ASCENDING)], expireAfterSeconds=0),
+    ],
+    'idempotency_keys': [
+        # Lookups are by _id (<user_id>:<key>); TTL drops keys past their replay window
+        IndexModel([('expires_at', ASCENDING)], expireAfterSeconds=0),
+    ],
+}
+
+# Representative shapes of the route queries that must be index-backed.
+# check_indexes.py explains each one and fails on a COLLSCAN; filter values
+# are placeholders since only the shape matters to the planner.
+_TODAY = datetime(2000, 1, 1)
+
+QUERY_SHAPES = [
+    {'name': 'users.get_user', 'collection': 'users', 'filter': {'id': 'x'}},
+    {'name': 'users.login', 'collection': 'users', 'filter': {'email': 'x'}},
+    {'name': 'ledger.get_account_balances[tail]', 'collection': 'ledger_entries', 'filter': {'account': 'x', 'created_at': {'$gt': _TODAY}}},
+    {'name': 'ledger.take_snapshot[window]', 'collection': 'ledger_entries', 'filter': {'created_at': {'$gt': _TODAY, '$lte': _TODAY}}},
+    {'name': 'ledger.get_account_balances[snapshot]', 'collection': 'ledger_snapshots', 'filter': {'account': {'$in': ['x', 'y']}, 'as_of': {'$lte': _TODAY}}},
+    {'name': 'wallets.get_ledger', 'collection': 'ledger_entries', 'filter': {'user_id': 'x'}, 'sort': NEWEST_FIRST},
+    {'name': 'sessions.refresh_session', 'collection': 'sessions', 'filter': {'id': 'x', 'refresh_jti': 'x', 'revoked_at': None}},
+    {'name': 'sessions.sync', 'collection': 'sessions', 'filter': {'revoked_at': {'$gt': _TODAY}}},
+    {'name': 'users.list_users[agent]', 'collection': 'users', 'filter': {'ancestors': 'x'}},
+    {'name': 'users.list_users[admin]', 'collection': 'users', 'filter': {'role': {'$in': ['agent', 'user']}}},
+    {'name': 'wallets.update_wallet_balance', 'collection': 'wallets', 'filter': {'user_id': 'x', 'wallet_type': 'main_coin'}},
+    {'name': 'bets.get_bet', 'collection': 'bets', 'filter': {'id': 'x'}},
+    {'name': 'bets.settle_bet[claim]', 'collection': 'bets', 'filter': {'id': 'x', 'status': 'pending'}},
+    {'name': 'bets.get_bets[user]', 'collection': 'bets', 'filter': {'user_id': 'x'}, 'sort': NEWEST_FIRST},
+    {'name': 'bets.get_bets[agent]', 'collection': 'bets', 'filter': {'scope_ids': 'x'}, 'sort': NEWEST_FIRST},
+    {'name': 'bets.get_bets[admin]', 'collection': 'bets', 'filter': {'status': 'pending'}, 'sort': NEWEST_FIRST},
+    {'name': 'dashboard.get_dashboard_overview', 'collection': 'bets', 'filter': {'user_id': 'x', 'status': 'won'}},
+    {'name': 'dashboard.get_quick_stats', 'collection': 'bets', 'filter': {'user_id': 'x', 'status': 'won', 'created_at': {'$gte': _TODAY}}},
+    {'name': 'dashboard.get_recent_activity', 'collection': 'transactions',
+     'filter': {'$or': [{'from_user_id': 'x'}, {'to_user_id': 'x'}]}, 'sort': [('created_at', DESCENDING)]},
+    {'name': 'coins.get_transaction', 'collection': 'transactions', 'filter': {'id': 'x'}},
+    {'name': 'coins.get_transactions[agent]', 'collection': 'transactions', 'filter': {'scope_ids': 'x'}, 'sort': NEWEST_FIRST},
+    {'name': 'coins.get_transactions[admin]', 'collection': 'transactions', 'filter': {}, 'sort': NEWEST_FIRST},
+    {'name': 'deposits.get_deposit', 'collection': 'deposits', 'filter': {'id': 'x'}},
+    {'name': 'deposits.get_deposits[user]', 'collection': 'deposits', 'filter': {'user_id': 'x'}, 'sort': NEWEST_FIRST},
+    {'name': 'deposits.get_deposits[admin]', 'collection': 'deposits', 'filter': {'status': 'pending'}, 'sort': NEWEST_FIRST},
+    {'name': 'exports.transactions[user]', 'collection': 'transactions',
+     'filter': {'$or': [{'from_user_id': 'x'}, {'to_user_id': 'x'}], 'created_at': {'$gte': _TODAY, '$lt': _TODAY}},
+     'sort': [('created_at', ASCENDING), ('id', ASCENDING)]},
+    {'name': 'exports.bets[agent]', 'collection': 'bets', 'filter': {'scope_ids': 'x', 'created_at': {'$gte': _TODAY}},
+     'sort': [('created_at', ASCENDING), ('id', ASCENDING)]},
+    {'name': 'deposits.get_withdrawals[user]', 'collection': 'withdrawals', 'filter': {'user_id': 'x'}, 'sort': NEWEST_FIRST},
+    {'name': 'dashboard.get_notifications', 'collection': 'withdrawals', 'filter': {'user_id': 'x', 'status': 'approved'}},
+    {'name': 'games.get_game', 'collection': 'games', 'filter': {'id': 'x', 'is_active': True}},
+    {'name': 'games.get_provider', 'collection': 'game_providers', 'filter': {'id': 'x'}},
+    {'name': 'games.get_my_game_sessions', 'collection': 'game_sessions', 'filter': {'user_id': 'x'}, 'sort': [('created_at', DESCENDING)]},
+    {'name': 'kyc.get_kyc_status', 'collection': 'kyc_documents', 'filter': {'user_id': 'x'}, 'sort': [('created_at', DESCENDING)]},
+    {'name': 'kyc.get_pending_kyc', 'collection': 'kyc_documents', 'filter': {'status': 'pending'},
+     'sort': [('created_at', ASCENDING), ('id', ASCENDING)]},
+    {'name': 'support.get_ticket', 'collection': 'tickets', 'filter': {'id': 'x'}},
+    {'name': 'support.get_tickets[user]', 'collection': 'tickets', 'filter': {'user_id': 'x'},
+     'sort': [('updated_at', DESCENDING), ('id', DESCENDING)]},
+    {'name': 'support.get_ticket_messages', 'collection': 'ticket_messages', 'filter': {'ticket_id': 'x'},
+     'sort': [('created_at', ASCENDING), ('id', ASCENDING)]},
+    {'name': 'dashboard.get_admin_dashboard_stats', 'collection': 'platform_stats',
+     'filter': {'$or': [{'_id': {'$in': ['global', 'x']}}, {'rollup': {'$in': ['global', 'x']}}]}},
+    {'name': 'config.get_config', 'collection': 'system_configs', 'filter': {'config_key': 'x'}},
+    {'name': 'dashboard.referrals', 'collection': 'referrals', 'filter': {'referrer_id': 'x'}},
+]
@@ -9,19 +9,69 @@ class Settings:
     # MongoDB
     MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
     DB_NAME = os.environ.get('DB_NAME', 'karnalix_db')
+    MONGO_TRANSACTIONS = os.environ.get('MONGO_TRANSACTIONS', 'auto')  # auto, on, off (off = non-atomic writes, development only)
+    MONGO_TXN_MAX_ATTEMPTS = int(os.environ.get('MONGO_TXN_MAX_ATTEMPTS', '5'))
+    PLATFORM_STATS_SLOTS = int(os.environ.get('PLATFORM_STATS_SLOTS', '16'))  # documents each rollup's $inc is spread over
+    MIGRATION_LOCK_SECONDS = float(os.environ.get('MIGRATION_LOCK_SECONDS', '120'))  # startup migration lease, renewed while it runs
+    
+    # Config cache (per worker; invalidations are synced across workers)
+    CONFIG_CACHE_TTL_SECONDS = float(os.environ.get('CONFIG_CACHE_TTL_SECONDS', '300'))
+    CONFIG_CACHE_SYNC_SECONDS = float(os.environ.get('CONFIG_CACHE_SYNC_SECONDS', '2'))
+    
+    # Ledger snapshots (balance reads = newest snapshot + entries after it)
+    LEDGER_SNAPSHOT_INTERVAL_SECONDS = float(os.environ.get('LEDGER_SNAPSHOT_INTERVAL_SECONDS', '900'))
+    LEDGER_SNAPSHOT_LAG_SECONDS = float(os.environ.get('LEDGER_SNAPSHOT_LAG_SECONDS', '60'))  # stay behind in-flight writes
+    
+    # Betting
+    BET_SETTLE_BATCH_MAX = int(os.environ.get('BET_SETTLE_BATCH_MAX', '1000'))  # bets per /bets/settle-batch call
+    
+    # History exports (/exports/{collection})
+    EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', '1000'))  # cursor batch size
+    EXPORT_CHUNK_BYTES = int(os.environ.get('EXPORT_CHUNK_BYTES', str(64 * 1024)))  # flushed to the client per chunk
+    
+    # Blob store for uploaded files (KYC documents, deposit screenshots); files are keyed by SHA-256
+    BLOB_STORE = os.environ.get('BLOB_STORE', 'local')  # local, s3
+    BLOB_LOCAL_PATH = os.environ.get('BLOB_LOCAL_PATH', str(ROOT_DIR / 'blobs'))
+    BLOB_S3_BUCKET = os.environ.get('BLOB_S3_BUCKET', '')
+    BLOB_S3_PREFIX = os.environ.get('BLOB_S3_PREFIX', 'blobs/')
+    BLOB_S3_ENDPOINT_URL = os.environ.get('BLOB_S3_ENDPOINT_URL')  # any S3-compatible service
+    BLOB_S3_REGION = os.environ.get('BLOB_S3_REGION')
+    BLOB_MAX_BYTES = int(os.environ.get('BLOB_MAX_BYTES', str(10 * 1024 * 1024)))  # per uploaded file
+    UPLOAD_TMP_DIR = os.environ.get('UPLOAD_TMP_DIR')  # multipart spool; default next to local blobs
+    THUMBNAIL_SIZE = int(os.environ.get('THUMBNAIL_SIZE', '256'))  # px, longest side (review lists)
+    PREVIEW_SIZE = int(os.environ.get('PREVIEW_SIZE', '1280'))  # px, longest side (detail view)
+    THUMBNAIL_WORKERS = int(os.environ.get('THUMBNAIL_WORKERS', '2'))
+    
+    # Idempotency-Key on money-moving POSTs
+    IDEMPOTENCY_TTL_HOURS = float(os.environ.get('IDEMPOTENCY_TTL_HOURS', '24'))  # how long a key replays its response
+    IDEMPOTENCY_LOCK_SECONDS = float(os.environ.get('IDEMPOTENCY_LOCK_SECONDS', '60'))  # lease before a stuck claim is taken over
+    IDEMPOTENCY_WAIT_SECONDS = float(os.environ.get('IDEMPOTENCY_WAIT_SECONDS', '10'))  # max wait on an in-flight duplicate
     
     # JWT
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY', 'your-secret-key-change-in-production-2024-karnalix')
     JWT_ALGORITHM = 'HS256'
-    JWT_ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24  # 24 hours
-    JWT_REFRESH_TOKEN_EXPIRE_DAYS = 30
+    # Access tokens can be made short-lived now that /auth/refresh rotates them
+    JWT_ACCESS_TOKEN_EXPIRE_MINUTES = int(os.environ.get('JWT_ACCESS_TOKEN_EXPIRE_MINUTES', str(60 * 24)))  # 24 hours
+    JWT_REFRESH_TOKEN_EXPIRE_DAYS = int(os.environ.get('JWT_REFRESH_TOKEN_EXPIRE_DAYS', '30'))  # sliding, per session
+    SESSION_SYNC_SECONDS = float(os.environ.get('SESSION_SYNC_SECONDS', '2'))  # revocation sync across workers
+    JWT_CACHE_SIZE = int(os.environ.get('JWT_CACHE_SIZE', '10000'))  # verified tokens kept per worker
     
     # CORS
     CORS_ORIGINS = os.environ.get('CORS_ORIGINS', '*').split(',')
     
     # Security
     PASSWORD_MIN_LENGTH = 8
-    BCRYPT_ROUNDS = 12
+    # Password hashing: algorithm for new hashes and per-algorithm cost.
+    # Existing hashes keep their own parameters and are upgraded on login.
+    PASSWORD_HASHER = os.environ.get('PASSWORD_HASHER', 'pbkdf2_sha256')  # pbkdf2_sha256, bcrypt_sha256, scrypt
+    PBKDF2_ITERATIONS = int(os.environ.get('PBKDF2_ITERATIONS', '100000'))
+    BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', '12'))
+    SCRYPT_N = int(os.environ.get('SCRYPT_N', '16384'))
+    SCRYPT_R = int(os.environ.get('SCRYPT_R', '8'))
+    SCRYPT_P = int(os.environ.get('SCRYPT_P', '1'))
+    PASSWORD_HASH_EXECUTOR = os.environ.get('PASSWORD_HASH_EXECUTOR', 'thread')  # thread, process
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', str(os.cpu_count() or 2)))
+    PASSWORD_HASH_MAX_CONCURRENCY = int(os.environ.get('PASSWORD_HASH_MAX_CONCURRENCY', str(PASSWORD_HASH_WORKERS)))
     
     # 2FA
     TOTP_ISSUER = 'KarnaliX'
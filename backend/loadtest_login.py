@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+KarnaliX - Login storm load test
+
+Fires logins at a fixed arrival rate (default 200/s) against a running
+server while probing an unrelated endpoint, then compares the probe's
+latency during the storm with a quiet baseline. With password hashing on
+the event loop the probe p99 tracks the login backlog; with the hashing
+pool it should stay close to baseline.
+
+Usage:
+    python loadtest_login.py --url http://localhost:8001/api \\
+        --email admin@karnalix.com --password Admin123 --rate 200 --duration 20
+"""
+
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+parser = argparse.ArgumentParser(description='Measure unrelated-endpoint latency during a login storm')
+parser.add_argument('--url', default='http://localhost:8001/api', help='API base URL')
+parser.add_argument('--email', default='admin@karnalix.com', help='Login email for the storm')
+parser.add_argument('--password', default='Admin123', help='Login password for the storm')
+parser.add_argument('--rate', type=float, default=200, help='Logins per second')
+parser.add_argument('--duration', type=float, default=20, help='Storm length in seconds')
+parser.add_argument('--probe', default='/health', help='Unrelated endpoint to probe')
+parser.add_argument('--probe-rate', type=float, default=20, help='Probe requests per second')
+parser.add_argument('--threads', type=int, default=256, help='Client threads for the storm')
+args = parser.parse_args()
+
+local = threading.local()
+
+def session():
+    if not hasattr(local, 'session'):
+        local.session = requests.Session()
+    return local.session
+
+def timed(method, path, **kwargs):
+    start = time.perf_counter()
+    try:
+        response = session().request(method, args.url + path, timeout=30, **kwargs)
+        ok = response.status_code < 500
+    except requests.RequestException:
+        ok = False
+    return (time.perf_counter() - start) * 1000, ok
+
+def open_loop(rate, duration, fire, pool):
+    """Schedule ``fire`` at a fixed rate regardless of how long responses take"""
+    futures = []
+    interval = 1.0 / rate
+    start = time.perf_counter()
+    n = 0
+    while True:
+        due = start + n * interval
+        if due - start >= duration:
+            break
+        delay = due - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        futures.append(pool.submit(fire))
+        n += 1
+    return [f.result() for f in futures]
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else float('nan')
+
+def summarize(name, samples):
+    latencies = [ms for ms, _ in samples]
+    errors = sum(1 for _, ok in samples if not ok)
+    print(f"{name:<28}{len(samples):>8}{percentile(latencies, 0.50):>10.1f}"
+          f"{percentile(latencies, 0.99):>10.1f}{max(latencies, default=0):>10.1f}{errors:>8}")
+
+def probe():
+    return timed('GET', args.probe)
+
+def login():
+    return timed('POST', '/auth/login', json={'email': args.email, 'password': args.password})
+
+def main():
+    print("\n" + "="*60)
+    print("🎰 KarnaliX - Login Storm Load Test")
+    print("="*60 + "\n")
+    print(f"Target: {args.url}  Storm: {args.rate:.0f} logins/s for {args.duration:.0f}s  Probe: {args.probe}\n")
+
+    with ThreadPoolExecutor(max_workers=8) as probe_pool:
+        baseline = open_loop(args.probe_rate, min(args.duration, 10), probe, probe_pool)
+
+    with ThreadPoolExecutor(max_workers=args.threads) as storm_pool, \
+            ThreadPoolExecutor(max_workers=8) as probe_pool:
+        results = {}
+        storm = threading.Thread(target=lambda: results.update(
+            logins=open_loop(args.rate, args.duration, login, storm_pool)))
+        storm.start()
+        during = open_loop(args.probe_rate, args.duration, probe, probe_pool)
+        storm.join()
+
+    print(f"{'series':<28}{'count':>8}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}{'errors':>8}")
+    summarize(f'{args.probe} (baseline)', baseline)
+    summarize(f'{args.probe} (during storm)', during)
+    summarize('POST /auth/login', results['logins'])
+
+    base_p99 = percentile([ms for ms, _ in baseline], 0.99)
+    storm_p99 = percentile([ms for ms, _ in during], 0.99)
+    print(f"\nProbe p99 inflation during storm: x{storm_p99 / base_p99:.1f}\n")
+
+if __name__ == "__main__":
+    main()
@@ -2,25 +2,31 @@ from fastapi import HTTPException, Security, Depends, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from typing import Optional, List
 from utils.security import decode_token
+from utils.sessions import is_session_revoked
 from config.settings import settings
 import logging
 
 logger = logging.getLogger(__name__)
 security = HTTPBearer()
 
+def _access_payload(token: str) -> dict:
+    """Verified payload of an access token whose session hasn't been revoked"""
+    payload = decode_token(token)
+    
+    # Refresh tokens are only good at /auth/refresh
+    if not payload or payload.get('type') == 'refresh' or is_session_revoked(payload.get('sid')):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail='Invalid or expired token'
+        )
+    return payload
+
 class RoleChecker:
     def __init__(self, allowed_roles: List[str]):
         self.allowed_roles = allowed_roles
     
     async def __call__(self, credentials: HTTPAuthorizationCredentials = Security(security)):
-        token = credentials.credentials
-        payload = decode_token(token)
-        
-        if not payload:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail='Invalid or expired token'
-            )
+        payload = _access_payload(credentials.credentials)
         
         user_id = payload.get('sub')
         role = payload.get('role')
@@ -37,18 +43,11 @@ class RoleChecker:
                 detail=f'Access denied. Required roles: {self.allowed_roles}'
             )
         
-        return {'user_id': user_id, 'role': role}
+        return {'user_id': user_id, 'role': role, 'sid': payload.get('sid')}
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Security(security)):
     """Get current authenticated user"""
-    token = credentials.credentials
-    payload = decode_token(token)
-    
-    if not payload:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail='Invalid or expired token'
-        )
+    payload = _access_payload(credentials.credentials)
     
     user_id = payload.get('sub')
     role = payload.get('role')
@@ -59,7 +58,7 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Security(
             detail='Invalid token payload'
         )
     
-    return {'user_id': user_id, 'role': role}
+    return {'user_id': user_id, 'role': role, 'sid': payload.get('sid')}
 
 def require_role(allowed_roles: List[str]):
     """Decorator to require specific roles"""
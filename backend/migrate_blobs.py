@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+KarnaliX - Blob migration
+
+Moves files stored inline as base64 strings (KYC document images,
+deposit screenshots) into the blob store configured by BLOB_STORE,
+leaving a reference in each
+document. Identical files are stored once. Already migrated documents
+are skipped, so it can be re-run at any time; the server also runs it
+once at startup.
+
+Usage:
+    python migrate_blobs.py --dry-run
+    python migrate_blobs.py --batch-size 20
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from config.database import close_database
+from config.settings import settings
+from utils.blob_migration import migrate_blobs
+
+async def main(args) -> int:
+    print("\n" + "="*60)
+    print(f"🎰 KarnaliX - Blob Migration (inline base64 -> {settings.BLOB_STORE} blob store)")
+    print("="*60 + "\n")
+
+    start = time.perf_counter()
+    counts = await migrate_blobs(batch_size=args.batch_size, dry_run=args.dry_run)
+    elapsed = time.perf_counter() - start
+
+    for name, converted in counts.items():
+        print(f"  {name:<22}{converted:>10} {'to convert' if args.dry_run else 'converted'}")
+    print(f"\n{sum(counts.values())} document(s) in {elapsed:.1f}s")
+    print("Dry run, nothing written\n" if args.dry_run else "✅ Files are in the blob store\n")
+
+    close_database()
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Move inline base64 files into the blob store')
+    parser.add_argument('--batch-size', type=int, default=50, help='Documents per bulk_write (they can be large)')
+    parser.add_argument('--dry-run', action='store_true', help='Count documents that would change')
+    sys.exit(asyncio.run(main(parser.parse_args())))
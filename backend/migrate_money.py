@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+KarnaliX - Money migration
+
+Converts every stored money field (wallet balances, bet/transaction/
+deposit/withdrawal amounts, ledger rows, rollups, limits...) from BSON
+double to 2-place Decimal128, in bulk_write batches. Already converted
+documents are skipped, so it can be re-run at any time; the server also
+runs it once at startup.
+
+Usage:
+    python migrate_money.py --dry-run
+    python migrate_money.py --batch-size 5000
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from config.database import close_database
+from utils.money import migrate_money
+
+async def main(args) -> int:
+    print("\n" + "="*60)
+    print("🎰 KarnaliX - Money Migration (double -> Decimal128)")
+    print("="*60 + "\n")
+
+    start = time.perf_counter()
+    counts = await migrate_money(batch_size=args.batch_size, dry_run=args.dry_run)
+    elapsed = time.perf_counter() - start
+
+    for name, converted in counts.items():
+        print(f"  {name:<22}{converted:>10} {'to convert' if args.dry_run else 'converted'}")
+    print(f"\n{sum(counts.values())} document(s) in {elapsed:.1f}s")
+    print("Dry run, nothing written\n" if args.dry_run else "✅ Money fields are Decimal128\n")
+
+    close_database()
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Convert stored money fields to Decimal128')
+    parser.add_argument('--batch-size', type=int, default=1000, help='Documents per bulk_write')
+    parser.add_argument('--dry-run', action='store_true', help='Count documents that would change')
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+KarnaliX - Ticket message migration
+
+Moves support ticket threads out of the embedded messages array on each
+ticket into the ticket_messages collection, and sets message_count and
+last_message on the ticket. Already migrated tickets are skipped, so it
+can be re-run at any time; the server also runs it once at startup.
+
+Usage:
+    python migrate_ticket_messages.py --dry-run
+    python migrate_ticket_messages.py --batch-size 200
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from config.database import close_database
+from utils.ticket_messages import migrate_ticket_messages
+
+async def main(args) -> int:
+    print("\n" + "="*60)
+    print("🎰 KarnaliX - Ticket Message Migration (embedded -> ticket_messages)")
+    print("="*60 + "\n")
+
+    start = time.perf_counter()
+    counts = await migrate_ticket_messages(batch_size=args.batch_size, dry_run=args.dry_run)
+    elapsed = time.perf_counter() - start
+
+    print(f"  {'tickets':<22}{counts['tickets']:>10}")
+    print(f"  {'messages':<22}{counts['messages']:>10}")
+    print(f"\n{elapsed:.1f}s")
+    print("Dry run, nothing written\n" if args.dry_run else "✅ Ticket threads are in ticket_messages\n")
+
+    close_database()
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Move embedded ticket messages into ticket_messages')
+    parser.add_argument('--batch-size', type=int, default=100, help='Tickets read per cursor batch')
+    parser.add_argument('--dry-run', action='store_true', help='Count tickets and messages that would move')
+    sys.exit(asyncio.run(main(parser.parse_args())))
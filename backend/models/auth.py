@@ -7,6 +7,9 @@ class Token(BaseModel):
     token_type: str = 'bearer'
     user: dict
 
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
 class TokenData(BaseModel):
     user_id: Optional[str] = None
     role: Optional[str] = None
@@ -1,24 +1,33 @@
 from pydantic import BaseModel, Field
-from typing import Optional, Dict
+from typing import Optional, Dict, List
 from datetime import datetime
+from models.money import ZERO, Money
 import uuid
 
 class BetBase(BaseModel):
     user_id: str
     game_id: str
     game_session_id: Optional[str] = None
-    amount: float
+    amount: Money
     odds: float = 1.0
-    potential_win: float
+    potential_win: Money
     bet_data: Optional[Dict] = None  # Game-specific bet data
 
 class BetCreate(BetBase):
     pass
 
+class BetSettlement(BaseModel):
+    bet_id: str
+    result: str  # won, lost
+    actual_win: Money = ZERO
+
+class BetSettleBatch(BaseModel):
+    settlements: List[BetSettlement]
+
 class Bet(BetBase):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     status: str = 'pending'  # pending, won, lost, cancelled, refunded
-    actual_win: float = 0.0
+    actual_win: Money = ZERO
     settled_at: Optional[datetime] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
     provider_bet_id: Optional[str] = None
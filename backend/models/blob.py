@@ -0,0 +1,7 @@
+from pydantic import BaseModel
+
+class BlobRef(BaseModel):
+    """Reference to a file in the blob store; the key is its SHA-256"""
+    key: str
+    size: int
+    content_type: str = 'application/octet-stream'
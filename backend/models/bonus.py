@@ -1,13 +1,14 @@
 from pydantic import BaseModel, Field
 from typing import Optional
 from datetime import datetime
+from models.money import ZERO, Money, to_money
 import uuid
 
 class BonusConfigBase(BaseModel):
     config_type: str  # deposit_bonus, referral_bonus, welcome_bonus
     percentage: float = 10.0
-    min_amount: float = 500.0
-    max_bonus: float = 5000.0
+    min_amount: Money = to_money(500)
+    max_bonus: Money = to_money(5000)
     wagering_requirement: float = 1.0
     is_active: bool = True
 
@@ -24,5 +25,5 @@ class ReferralBase(BaseModel):
 class Referral(ReferralBase):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     status: str = 'pending'  # pending, active, completed
-    commission_paid: float = 0.0
+    commission_paid: Money = ZERO
     created_at: datetime = Field(default_factory=datetime.utcnow)
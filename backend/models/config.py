@@ -1,6 +1,7 @@
 from pydantic import BaseModel, Field
 from typing import Optional, Dict, Any, List
 from datetime import datetime
+from models.money import ZERO, Money, to_money
 import uuid
 
 class SystemConfig(BaseModel):
@@ -25,8 +26,8 @@ class PaymentMethod(BaseModel):
     icon: Optional[str] = None
     qr_code: Optional[str] = None  # Base64 encoded
     account_details: Optional[Dict] = None
-    min_amount: float = 100.0
-    max_amount: float = 100000.0
+    min_amount: Money = to_money(100)
+    max_amount: Money = to_money(100000)
     processing_time: str = '5-10 minutes'
     fees: float = 0.0
     is_active: bool = True
@@ -41,9 +42,9 @@ class BonusRule(BaseModel):
     name: str
     bonus_type: str  # 'deposit', 'referral', 'welcome', 'loyalty', 'promo_code'
     percentage: float = 0.0
-    fixed_amount: float = 0.0
-    min_deposit: float = 0.0
-    max_bonus: float = 0.0
+    fixed_amount: Money = ZERO
+    min_deposit: Money = ZERO
+    max_bonus: Money = ZERO
     wagering_requirement: float = 1.0
     valid_days: int = 30
     promo_code: Optional[str] = None
@@ -86,9 +87,9 @@ class Limit(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     limit_type: str  # 'deposit', 'withdrawal', 'bet', 'loss'
     period: str  # 'daily', 'weekly', 'monthly'
-    min_amount: float = 0.0
-    max_amount: float = 0.0
-    default_limit: float = 0.0
+    min_amount: Money = ZERO
+    max_amount: Money = ZERO
+    default_limit: Money = ZERO
     user_configurable: bool = True
     role: Optional[str] = None  # Apply to specific role
     is_active: bool = True
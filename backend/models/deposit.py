@@ -1,21 +1,23 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Dict, Optional
 from datetime import datetime
+from models.blob import BlobRef
+from models.money import Money
 import uuid
 
 class DepositBase(BaseModel):
     user_id: str
-    amount: float
+    amount: Money
     payment_method: str  # esewa, khalti, bank, qrcode, upi
     transaction_code: Optional[str] = None
-    screenshot: Optional[str] = None  # base64 encoded
+    screenshot: Optional[BlobRef] = None  # served by GET /transactions/deposits/{id}/screenshot
     notes: Optional[str] = None
 
 class DepositCreate(BaseModel):
-    amount: float
+    amount: Money
     payment_method: str
     transaction_code: Optional[str] = None
-    screenshot: Optional[str] = None
+    screenshot: Optional[str] = None  # base64 or data: URL
     notes: Optional[str] = None
 
 class Deposit(DepositBase):
@@ -25,16 +27,37 @@ class Deposit(DepositBase):
     review_notes: Optional[str] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
     reviewed_at: Optional[datetime] = None
+    screenshot_variants: Dict[str, BlobRef] = {}  # thumbnail/preview when the screenshot is an image
+
+class DepositResponse(Deposit):
+    screenshot_url: Optional[str] = None
+    screenshot_thumbnail_url: Optional[str] = None
+
+class DepositSummary(BaseModel):
+    """Deposit as listed; the screenshot is only linked, never loaded"""
+    id: str
+    user_id: str
+    amount: Money
+    payment_method: str
+    transaction_code: Optional[str] = None
+    notes: Optional[str] = None
+    status: str
+    reviewed_by: Optional[str] = None
+    review_notes: Optional[str] = None
+    created_at: datetime
+    reviewed_at: Optional[datetime] = None
+    screenshot_url: Optional[str] = None
+    screenshot_thumbnail_url: Optional[str] = None
 
 class WithdrawalBase(BaseModel):
     user_id: str
-    amount: float
+    amount: Money
     payment_method: str
     account_details: Optional[str] = None
     notes: Optional[str] = None
 
 class WithdrawalCreate(BaseModel):
-    amount: float
+    amount: Money
     payment_method: str
     account_details: Optional[str] = None
     notes: Optional[str] = None
@@ -1,6 +1,7 @@
 from pydantic import BaseModel, Field
 from typing import Optional, Dict, List
 from datetime import datetime
+from models.money import Money, to_money
 import uuid
 
 class GameProviderBase(BaseModel):
@@ -25,8 +26,8 @@ class GameBase(BaseModel):
     name: str
     category: str  # casino, sports, card, dice, skill
     thumbnail: Optional[str] = None
-    min_bet: float = 10.0
-    max_bet: float = 10000.0
+    min_bet: Money = to_money(10)
+    max_bet: Money = to_money(10000)
     rtp: Optional[float] = 96.0  # Return to Player %
     is_active: bool = True
     config: Optional[Dict] = None
@@ -36,6 +37,21 @@ class Game(GameBase):
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
+class GameSummary(BaseModel):
+    """Game as listed for admins, without its provider config"""
+    id: str
+    provider_id: str
+    game_id: str
+    name: str
+    category: str
+    thumbnail: Optional[str] = None
+    min_bet: Money
+    max_bet: Money
+    rtp: Optional[float] = None
+    is_active: bool
+    created_at: datetime
+    updated_at: datetime
+
 class GameSession(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     user_id: str
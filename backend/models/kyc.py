@@ -1,18 +1,20 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from models.blob import BlobRef
+from typing import Dict, Optional
 from datetime import datetime
 import uuid
 
 class KYCDocumentBase(BaseModel):
     user_id: str
     document_type: str  # citizenship, passport, driving_license, selfie
-    document_front: str  # base64
-    document_back: Optional[str] = None  # base64
-    selfie: Optional[str] = None  # base64
+    # Files live in the blob store; served by GET /kyc/{id}/files/{field}
+    document_front: BlobRef
+    document_back: Optional[BlobRef] = None
+    selfie: Optional[BlobRef] = None
 
 class KYCDocumentCreate(BaseModel):
     document_type: str
-    document_front: str
+    document_front: str  # base64 or data: URL
     document_back: Optional[str] = None
     selfie: Optional[str] = None
 
@@ -23,3 +25,8 @@ class KYCDocument(KYCDocumentBase):
     review_notes: Optional[str] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
     reviewed_at: Optional[datetime] = None
+    variants: Dict[str, Dict[str, BlobRef]] = {}  # field -> thumbnail/preview of image files
+
+class KYCDocumentResponse(KYCDocument):
+    file_urls: Dict[str, str] = {}
+    thumbnail_urls: Dict[str, str] = {}
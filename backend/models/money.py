@@ -0,0 +1,34 @@
+from decimal import Decimal, InvalidOperation, ROUND_HALF_EVEN
+from bson.decimal128 import Decimal128
+from pydantic import BeforeValidator, PlainSerializer
+from typing import Annotated
+
+# Money is a Decimal with two places in Python and Decimal128 in MongoDB
+# (config.database registers the codec), so $inc, $sum and Python
+# arithmetic are all exact. API payloads keep plain JSON numbers: inputs
+# are parsed through their decimal text, outputs are rendered as floats.
+#
+# Never mix Money with float arithmetic (Decimal + float raises); use
+# to_money() on anything that did not come from a Money field or the DB.
+
+MONEY_QUANTUM = Decimal('0.01')
+
+def to_money(value) -> Decimal:
+    """Coerce a number (or numeric string / Decimal128) to a 2-place Decimal"""
+    if isinstance(value, Decimal128):
+        value = value.to_decimal()
+    elif isinstance(value, float):
+        # repr gives the shortest text that round-trips, e.g. 0.1 -> '0.1'
+        value = repr(value)
+    try:
+        return Decimal(value).quantize(MONEY_QUANTUM, rounding=ROUND_HALF_EVEN)
+    except (InvalidOperation, TypeError):
+        raise ValueError(f'Not a money amount: {value!r}')
+
+Money = Annotated[
+    Decimal,
+    BeforeValidator(to_money),
+    PlainSerializer(float, return_type=float, when_used='json')
+]
+
+ZERO = to_money(0)
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Optional
 from datetime import datetime
 import uuid
 
@@ -10,6 +10,7 @@ class TicketMessageBase(BaseModel):
 
 class TicketMessage(TicketMessageBase):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    ticket_id: str
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
 class TicketBase(BaseModel):
@@ -28,6 +29,19 @@ class Ticket(TicketBase):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     status: str = 'open'  # open, in_progress, closed
     assigned_to: Optional[str] = None
-    messages: List[TicketMessage] = []
+    # The thread lives in ticket_messages (GET /tickets/{id}/messages);
+    # the ticket only keeps its size and latest message
+    message_count: int = 0
+    last_message: Optional[TicketMessage] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+class TicketSummary(TicketBase):
+    """Ticket as listed"""
+    id: str
+    status: str
+    assigned_to: Optional[str] = None
+    message_count: int = 0
+    last_message: Optional[TicketMessage] = None
+    created_at: datetime
+    updated_at: datetime
@@ -1,6 +1,7 @@
 from pydantic import BaseModel, Field, EmailStr, validator
 from typing import Optional, List
 from datetime import datetime
+from models.money import ZERO, Money
 import uuid
 
 class UserBase(BaseModel):
@@ -39,6 +40,7 @@ class User(UserBase):
     is_2fa_enabled: bool = False
     kyc_status: str = 'pending'  # pending, approved, rejected
     created_by: Optional[str] = None  # user_id of creator (for hierarchy)
+    ancestors: List[str] = []  # root-first chain of creators, maintained by utils.hierarchy
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
     last_login: Optional[datetime] = None
@@ -48,7 +50,7 @@ class UserInDB(User):
     totp_secret: Optional[str] = None
 
 class UserResponse(User):
-    wallet_balance: Optional[float] = 0.0
+    wallet_balance: Optional[Money] = ZERO
     
     class Config:
         from_attributes = True
@@ -1,12 +1,13 @@
 from pydantic import BaseModel, Field
 from typing import Optional
 from datetime import datetime
+from models.money import ZERO, Money
 import uuid
 
 class WalletBase(BaseModel):
     user_id: str
     wallet_type: str  # main_coin, bonus, locked
-    balance: float = 0.0
+    balance: Money = ZERO
 
 class WalletCreate(WalletBase):
     pass
@@ -18,15 +19,26 @@ class Wallet(WalletBase):
 
 class WalletResponse(BaseModel):
     user_id: str
-    main_coin: float = 0.0
-    bonus: float = 0.0
-    locked: float = 0.0
-    total: float = 0.0
+    main_coin: Money = ZERO
+    bonus: Money = ZERO
+    locked: Money = ZERO
+    total: Money = ZERO
+
+class LedgerEntry(BaseModel):
+    id: str
+    posting_id: str
+    account: str  # <user_id>:<wallet_type> or system:<name>
+    user_id: Optional[str] = None
+    wallet_type: Optional[str] = None
+    amount: Money  # signed: credit > 0, debit < 0
+    entry_type: str  # bet_placed, bet_won, bet_lost, mint, transfer, deposit, withdrawal_hold, ...
+    ref: dict = {}
+    created_at: datetime
 
 class TransactionBase(BaseModel):
     from_user_id: Optional[str] = None
-    to_user_id: str
-    amount: float
+    to_user_id: Optional[str] = None  # None for external payouts (withdrawals)
+    amount: Money
     transaction_type: str  # mint, transfer, bet, win, deposit, withdrawal, bonus, referral
     wallet_type: str = 'main_coin'
     description: Optional[str] = None
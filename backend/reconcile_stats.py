@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+KarnaliX - Platform stats reconciliation
+
+Recomputes the platform_stats rollups (global totals and per-day buckets)
+from transactions, wallets, bets, deposits and withdrawals and reports any
+drift against the incrementally maintained documents.
+
+Usage:
+    python reconcile_stats.py           # report drift only
+    python reconcile_stats.py --apply   # report and overwrite the rollups
+"""
+
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from config.database import close_database
+from utils.platform_stats import reconcile_platform_stats
+
+async def main(apply: bool):
+    print("\n" + "="*60)
+    print("🎰 KarnaliX - Platform Stats Reconciliation")
+    print("="*60 + "\n")
+
+    drift = await reconcile_platform_stats(apply=apply)
+
+    if not drift:
+        print("✅ Rollups match source collections\n")
+    else:
+        for doc_id in sorted(drift):
+            print(f"⚠️  {doc_id}")
+            for counter, (stored, expected) in sorted(drift[doc_id].items()):
+                print(f"    {counter:<22} stored={stored:<16} expected={expected}")
+        print(f"\n{len(drift)} document(s) drifted")
+        print("✅ Rollups rebuilt\n" if apply else "Run with --apply to rebuild\n")
+
+    close_database()
+    return 1 if drift and not apply else 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Verify and rebuild platform_stats rollups')
+    parser.add_argument('--apply', action='store_true', help='Overwrite rollups with recomputed values')
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.apply)))
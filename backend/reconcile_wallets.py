@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+KarnaliX - Wallet reconciliation
+
+Compares every wallets.balance with the balance the ledger says it should
+have, at a cut-off slightly behind the clock, and prints each mismatch.
+Incremental runs only check accounts touched since the last completed
+run; the run summary and mismatch report are kept in reconciliation_runs.
+
+Usage:
+    python reconcile_wallets.py                  # full run from the newest snapshot epoch
+    python reconcile_wallets.py --incremental    # from the last completed run
+    python reconcile_wallets.py --from-zero      # full run folding the entire ledger
+"""
+
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from config.database import close_database
+from utils.reconciliation import reconcile_wallets
+
+async def main(args) -> int:
+    print("\n" + "="*60)
+    print("🎰 KarnaliX - Wallet Reconciliation")
+    print("="*60 + "\n")
+
+    summary = {}
+    async for item in reconcile_wallets(
+        incremental=args.incremental, from_zero=args.from_zero, batch_size=args.batch_size
+    ):
+        if item['type'] == 'summary':
+            summary = item
+            continue
+        have = 'missing' if item['wallet_balance'] is None else f"{item['wallet_balance']:.2f}"
+        print(f"⚠️  {item['account']:<56} wallet={have:<14} ledger={item['ledger_balance']:.2f}")
+
+    checkpoint = summary['checkpoint'].isoformat() if summary['checkpoint'] else 'none'
+    print(f"\nMode: {summary['mode']}  Checkpoint: {checkpoint}  As of: {summary['as_of'].isoformat()}")
+    print(f"Checked: {summary['checked']}  Rechecked (active): {summary['rechecked']}  "
+          f"Elapsed: {summary['elapsed_ms']:.0f}ms")
+    print(f"Run: {summary['run_id']}")
+    print("✅ Wallets match the ledger\n" if not summary['mismatches'] else f"{summary['mismatches']} mismatch(es)\n")
+
+    close_database()
+    return 1 if summary['mismatches'] else 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Reconcile wallet balances against the ledger')
+    parser.add_argument('--incremental', action='store_true', help='Only accounts touched since the last completed run')
+    parser.add_argument('--from-zero', action='store_true', help='Fold the whole ledger instead of starting from snapshots')
+    parser.add_argument('--batch-size', type=int, default=1000, help='Cursor batch size')
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+KarnaliX - Ledger replay
+
+Rebuilds wallet balances from ledger_entries as of any point in time,
+starting from the newest snapshot epoch before it. With --verify the
+whole ledger is also folded from zero to check the snapshots, and the
+current result is compared against wallets.balance.
+
+Usage:
+    python replay_ledger.py                                 # every account, now
+    python replay_ledger.py --user <user_id> --at 2024-06-01T00:00:00
+    python replay_ledger.py --snapshot                      # take a snapshot epoch first
+    python replay_ledger.py --verify
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from config.database import db, close_database
+from models.money import ZERO
+from utils.ledger import WALLET_TYPES, replay, take_snapshot, wallet_account
+
+async def main(args) -> int:
+    print("\n" + "="*60)
+    print("🎰 KarnaliX - Ledger Replay")
+    print("="*60 + "\n")
+
+    if args.snapshot:
+        epoch = await take_snapshot()
+        print(f"Snapshot: {epoch if epoch else 'nothing new since the last epoch'}\n")
+
+    accounts = None
+    if args.user:
+        wallet_types = [args.wallet_type] if args.wallet_type else WALLET_TYPES
+        accounts = [wallet_account(args.user, wallet_type) for wallet_type in wallet_types]
+
+    start = time.perf_counter()
+    balances = await replay(until=args.at, accounts=accounts)
+    elapsed = time.perf_counter() - start
+
+    print(f"As of: {args.at.isoformat() if args.at else 'now'}  Accounts: {len(balances)}  ({elapsed * 1000:.0f}ms)\n")
+    if accounts is not None or len(balances) <= args.show:
+        for account in sorted(balances):
+            print(f"  {account:<56}{balances[account]:>16.2f}")
+        print()
+
+    failures = 0
+    if args.verify:
+        start = time.perf_counter()
+        full = await replay(until=args.at, accounts=accounts, from_snapshots=False)
+        print(f"Full replay from zero: {(time.perf_counter() - start) * 1000:.0f}ms")
+        for account in sorted(set(balances) | set(full)):
+            if abs(balances.get(account, ZERO) - full.get(account, ZERO)) > 1e-6:
+                failures += 1
+                print(f"⚠️  snapshot drift {account}: snapshots={balances.get(account, ZERO)} full={full.get(account, ZERO)}")
+
+        if args.at is None:
+            query = {'user_id': args.user} if args.user else {}
+            async for wallet in db.wallets.find(query, {'_id': 0, 'user_id': 1, 'wallet_type': 1, 'balance': 1}):
+                account = wallet_account(wallet['user_id'], wallet['wallet_type'])
+                if abs(wallet.get('balance', ZERO) - full.get(account, ZERO)) > 1e-6:
+                    failures += 1
+                    print(f"⚠️  wallet drift {account}: wallets={wallet.get('balance', ZERO)} ledger={full.get(account, ZERO)}")
+
+        print("✅ Ledger verified\n" if not failures else f"\n{failures} mismatch(es)\n")
+
+    close_database()
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Rebuild wallet balances from the ledger')
+    parser.add_argument('--user', help='Only this user\'s wallets')
+    parser.add_argument('--wallet-type', choices=['main_coin', 'bonus', 'locked'], help='Only this wallet (with --user)')
+    parser.add_argument('--at', type=datetime.fromisoformat, help='Point in time (UTC, ISO 8601); default now')
+    parser.add_argument('--snapshot', action='store_true', help='Take a snapshot epoch before replaying')
+    parser.add_argument('--verify', action='store_true', help='Also replay from zero and compare with wallets')
+    parser.add_argument('--show', type=int, default=50, help='Print balances when at most this many accounts')
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -1,18 +1,18 @@
 from config.database import db
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, Request, status, Query
 
-from models.auth import Token, Login2FARequest, Setup2FAResponse, LoginRequest
+from models.auth import Token, Login2FARequest, Setup2FAResponse, LoginRequest, RefreshRequest
 from models.user import UserCreate, UserInDB, UserResponse
 from utils.security import (
-    verify_password,
-    get_password_hash,
-    create_access_token,
-    create_refresh_token,
     generate_totp_secret,
-    generate_qr_code,
+    render_qr_code,
+    discard_qr_code,
     verify_totp
 )
 from middleware.auth import get_current_user
+from utils.wallet import get_main_balance
+from utils.hashing import hash_password, check_password, rehash_in_background
+from utils.sessions import SessionError, create_session, refresh_session, revoke_session
 from datetime import datetime
 import logging
 
@@ -42,7 +42,7 @@ async def register(user_data: UserCreate):
         
         user_in_db = UserInDB(
             **user_dict,
-            hashed_password=get_password_hash(password)
+            hashed_password=await hash_password(password)
         )
         
         # Insert into database
@@ -71,7 +71,7 @@ async def register(user_data: UserCreate):
         )
 
 @router.post('/login', response_model=Token)
-async def login(login_data: Login2FARequest):
+async def login(login_data: Login2FARequest, request: Request):
     """Login with email and password (with optional 2FA)"""
     try:
         # Find user
@@ -84,7 +84,7 @@ async def login(login_data: Login2FARequest):
             )
         
         # Verify password
-        if not verify_password(login_data.password, user['hashed_password']):
+        if not await check_password(login_data.password, user['hashed_password']):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail='Invalid email or password'
@@ -113,16 +113,18 @@ async def login(login_data: Login2FARequest):
                     detail='Invalid 2FA code'
                 )
         
+        # Every check passed: upgrade outdated hash parameters without
+        # delaying the response (never for suspended or failed 2FA logins)
+        rehash_in_background(user['id'], login_data.password, user['hashed_password'])
+        
         # Update last login
         await db.users.update_one(
             {'id': user['id']},
             {'$set': {'last_login': datetime.utcnow()}}
         )
         
-        # Create tokens
-        token_data = {'sub': user['id'], 'role': user['role'], 'email': user['email']}
-        access_token = create_access_token(token_data)
-        refresh_token = create_refresh_token(token_data)
+        # Open a server-side session; both tokens carry its id
+        access_token, refresh_token = await create_session(user, request.headers.get('user-agent'))
         
         logger.info(f'User logged in: {user["email"]} (role: {user["role"]})')
         
@@ -146,9 +148,41 @@ async def login(login_data: Login2FARequest):
             detail='Login failed'
         )
 
+@router.post('/refresh', response_model=Token)
+async def refresh(refresh_data: RefreshRequest):
+    """Exchange a refresh token for a new access/refresh pair (the old refresh token stops working)"""
+    try:
+        access_token, refresh_token, user = await refresh_session(refresh_data.refresh_token)
+        
+        # Remove sensitive data
+        user.pop('hashed_password', None)
+        user.pop('totp_secret', None)
+        user.pop('_id', None)
+        
+        return Token(
+            access_token=access_token,
+            refresh_token=refresh_token,
+            user=user
+        )
+    
+    except SessionError as e:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.error(f'Token refresh error: {str(e)}')
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail='Token refresh failed'
+        )
+
 @router.post('/logout')
 async def logout(current_user: dict = Depends(get_current_user)):
-    """Logout (client should discard tokens)"""
+    """Logout: revokes the session, so its access and refresh tokens stop working"""
+    # Tokens issued before server-side sessions carry no sid
+    if current_user.get('sid'):
+        await revoke_session(current_user['sid'])
     logger.info(f'User logged out: {current_user["user_id"]}')
     return {'message': 'Logged out successfully'}
 
@@ -165,8 +199,7 @@ async def get_me(current_user: dict = Depends(get_current_user)):
             )
         
         # Get wallet balance
-        wallets = await db.wallets.find({'user_id': user['id']}).to_list(10)
-        total_balance = sum([w.get('balance', 0) for w in wallets if w.get('wallet_type') == 'main_coin'])
+        total_balance = await get_main_balance(user['id'])
         
         user.pop('hashed_password', None)
         user.pop('totp_secret', None)
@@ -183,6 +216,7 @@ async def get_me(current_user: dict = Depends(get_current_user)):
 
 @router.post('/2fa/setup', response_model=Setup2FAResponse)
 async def setup_2fa(
+    qr_format: str = Query('png', pattern='^(png|svg)$'),
     current_user: dict = Depends(get_current_user),
     
 ):
@@ -203,15 +237,19 @@ async def setup_2fa(
                 detail='User not found'
             )
         
-        # Generate TOTP secret
-        secret = generate_totp_secret()
-        qr_code = generate_qr_code(secret, user['email'])
+        # Reuse a pending (not yet verified) secret so repeated setup calls
+        # show the same QR code; otherwise generate a fresh one
+        secret = user.get('totp_secret') if not user.get('is_2fa_enabled') else None
+        if not secret:
+            secret = generate_totp_secret()
+            
+            # Save secret (but don't enable yet)
+            await db.users.update_one(
+                {'id': user['id']},
+                {'$set': {'totp_secret': secret}}
+            )
         
-        # Save secret (but don't enable yet)
-        await db.users.update_one(
-            {'id': user['id']},
-            {'$set': {'totp_secret': secret}}
-        )
+        qr_code = await render_qr_code(secret, user['email'], qr_format)
         
         logger.info(f'2FA setup initiated for user: {user["email"]}')
         
@@ -258,6 +296,7 @@ async def verify_2fa(
             {'id': user['id']},
             {'$set': {'is_2fa_enabled': True}}
         )
+        discard_qr_code(user['totp_secret'])
         
         logger.info(f'2FA enabled for user: {user["email"]}')
         
@@ -289,7 +328,7 @@ async def disable_2fa(
             )
         
         # Verify password
-        if not verify_password(password, user['hashed_password']):
+        if not await check_password(password, user['hashed_password']):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail='Invalid password'
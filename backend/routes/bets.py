@@ -1,98 +1,103 @@
-from fastapi import APIRouter, HTTPException, Depends, status, Query
+from fastapi import APIRouter, HTTPException, Depends, status, Query, Response, Header
 from config.database import db
-from models.bet import Bet, BetCreate
+from models.bet import Bet, BetCreate, BetSettleBatch
+from models.money import to_money
 from middleware.auth import get_current_user, require_admin
+from models.wallet import Transaction
+from utils.wallet import move_balance, apply_postings, InsufficientBalanceError
+from utils.ledger import Posting
+from utils.transactions import run_in_transaction
+from utils.platform_stats import record_stats
+from utils.hierarchy import get_scope_ids, visibility_filter
+from utils.pagination import Cursor, date_range, fetch_page, page_cursor
+from utils.game_catalog import get_catalog
+from utils.idempotency import run_idempotent
+from config.settings import settings
+from pymongo import UpdateOne
+from collections import defaultdict
+from decimal import Decimal
 from typing import List, Optional
 from datetime import datetime
 import logging
+import time
+import uuid
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix='/bets', tags=['Betting'])
 
-async def update_wallet_balance(user_id: str, wallet_type: str, amount: float, operation: str):
-    """Update wallet balance atomically"""
-    wallet = await db.wallets.find_one({
-        'user_id': user_id,
-        'wallet_type': wallet_type
-    })
-    
-    if not wallet:
-        raise ValueError(f'Wallet not found for user {user_id}, type {wallet_type}')
-    
-    current_balance = wallet.get('balance', 0.0)
-    
-    if operation == 'add':
-        new_balance = current_balance + amount
-    elif operation == 'subtract':
-        if current_balance < amount:
-            raise ValueError(f'Insufficient balance. Have: {current_balance}, Need: {amount}')
-        new_balance = current_balance - amount
-    else:
-        raise ValueError(f'Invalid operation: {operation}')
-    
-    await db.wallets.update_one(
-        {'user_id': user_id, 'wallet_type': wallet_type},
-        {'$set': {'balance': new_balance, 'updated_at': datetime.utcnow()}}
-    )
-    
-    return new_balance
-
 @router.post('', response_model=Bet, status_code=status.HTTP_201_CREATED)
 async def place_bet(
     bet_data: BetCreate,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None, alias='Idempotency-Key')
 ):
-    """Place a bet (user)"""
+    """Place a bet (user). Retries with the same Idempotency-Key replay the first response."""
+    return await run_idempotent(
+        idempotency_key, current_user['user_id'], 'bets.place', bet_data,
+        lambda: _place_bet(bet_data, current_user),
+        status_code=status.HTTP_201_CREATED
+    )
+
+async def _place_bet(bet_data: BetCreate, current_user: dict) -> Bet:
     try:
         # Verify game exists and is active
-        game = await db.games.find_one({'id': bet_data.game_id, 'is_active': True})
+        game = (await get_catalog()).games.get(bet_data.game_id)
         if not game:
             raise HTTPException(status_code=404, detail='Game not found or inactive')
         
         # Check bet amount within limits
-        if bet_data.amount < game['min_bet']:
+        if bet_data.amount < game.min_bet:
             raise HTTPException(
                 status_code=400,
-                detail=f'Bet amount below minimum: {game["min_bet"]}'
+                detail=f'Bet amount below minimum: {game.min_bet}'
             )
-        if bet_data.amount > game['max_bet']:
+        if bet_data.amount > game.max_bet:
             raise HTTPException(
                 status_code=400,
-                detail=f'Bet amount exceeds maximum: {game["max_bet"]}'
+                detail=f'Bet amount exceeds maximum: {game.max_bet}'
             )
         
-        # Check user balance
-        wallet = await db.wallets.find_one({
-            'user_id': current_user['user_id'],
-            'wallet_type': 'main_coin'
-        })
-        
-        if not wallet or wallet.get('balance', 0) < bet_data.amount:
-            raise HTTPException(status_code=400, detail='Insufficient balance')
-        
         # Create bet
         bet = Bet(**bet_data.dict(), user_id=current_user['user_id'])
         
-        # Lock coins from main_coin to locked wallet
-        await update_wallet_balance(current_user['user_id'], 'main_coin', bet_data.amount, 'subtract')
-        await update_wallet_balance(current_user['user_id'], 'locked', bet_data.amount, 'add')
-        
-        # Save bet
-        await db.bets.insert_one(bet.dict())
-        
         # Create transaction record
-        from models.wallet import Transaction
         txn = Transaction(
             from_user_id=current_user['user_id'],
             to_user_id=current_user['user_id'],
             amount=bet_data.amount,
             transaction_type='bet',
             wallet_type='locked',
-            description=f'Bet placed on game {game["name"]}',
+            description=f'Bet placed on game {game.name}',
             metadata={'bet_id': bet.id, 'game_id': bet_data.game_id}
         )
-        await db.transactions.insert_one(txn.dict())
+        
+        scope_ids = await get_scope_ids([current_user['user_id']])
+        
+        async def lock_and_record(session):
+            # Lock coins from main_coin to locked wallet (balance guard is part of the update)
+            await move_balance(
+                current_user['user_id'], 'main_coin',
+                current_user['user_id'], 'locked',
+                bet_data.amount,
+                session=session,
+                entry_type='bet_placed',
+                ref={'bet_id': bet.id}
+            )
+            await db.bets.insert_one({**bet.dict(), 'scope_ids': scope_ids}, session=session)
+            await db.transactions.insert_one({**txn.dict(), 'scope_ids': scope_ids}, session=session)
+            await record_stats({
+                'coin_supply': -bet_data.amount,
+                'locked_coins': bet_data.amount,
+                'bet_count': 1,
+                'bets_pending': 1,
+                'bet_volume': bet_data.amount
+            }, session=session)
+        
+        try:
+            await run_in_transaction(lock_and_record)
+        except InsufficientBalanceError:
+            raise HTTPException(status_code=400, detail='Insufficient balance')
         
         logger.info(f'Bet placed: {bet.id} by user {current_user["user_id"]}, amount: {bet_data.amount}')
         
@@ -105,32 +110,26 @@ async def place_bet(
 
 @router.get('', response_model=List[Bet])
 async def get_bets(
+    response: Response,
     status: Optional[str] = Query(None),
     game_id: Optional[str] = Query(None),
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=100),
+    cursor: Optional[Cursor] = Depends(page_cursor),
+    created: dict = Depends(date_range),
     current_user: dict = Depends(get_current_user)
 ):
     """Get user's bets"""
     try:
-        filter_query = {}
-        
-        # Role-based filtering
-        if current_user['role'] == 'user':
-            filter_query['user_id'] = current_user['user_id']
-        elif current_user['role'] == 'agent':
-            # Get users created by this agent
-            users = await db.users.find({'created_by': current_user['user_id']}).to_list(1000)
-            user_ids = [u['id'] for u in users] + [current_user['user_id']]
-            filter_query['user_id'] = {'$in': user_ids}
-        # Admins and master admins see all bets
+        # Users see their own bets, agents their whole downline; admins and master admins see all
+        filter_query = {**visibility_filter(current_user), **created}
         
         if status:
             filter_query['status'] = status
         if game_id:
             filter_query['game_id'] = game_id
         
-        bets = await db.bets.find(filter_query).sort('created_at', -1).skip(skip).limit(limit).to_list(limit)
+        bets = await fetch_page(db.bets, filter_query, response, cursor=cursor, skip=skip, limit=limit)
         
         return [Bet(**b) for b in bets]
     except Exception as e:
@@ -164,11 +163,12 @@ async def get_bet(
 async def settle_bet(
     bet_id: str,
     result: str,  # 'won' or 'lost'
-    actual_win: float = 0.0,
+    actual_win: Decimal = Decimal('0'),
     current_user: dict = Depends(require_admin())
 ):
     """Settle bet (Admin only)"""
     try:
+        actual_win = to_money(actual_win)
         bet = await db.bets.find_one({'id': bet_id})
         
         if not bet:
@@ -177,43 +177,70 @@ async def settle_bet(
         if bet['status'] != 'pending':
             raise HTTPException(status_code=400, detail='Bet already settled')
         
+        if result not in ('won', 'lost'):
+            raise HTTPException(status_code=400, detail='Invalid result. Use "won" or "lost"')
+        
         user_id = bet['user_id']
         bet_amount = bet['amount']
         
-        if result == 'won':
-            # Win: Unlock locked coins + add winnings to main_coin
-            await update_wallet_balance(user_id, 'locked', bet_amount, 'subtract')
-            await update_wallet_balance(user_id, 'main_coin', bet_amount + actual_win, 'add')
-            
-            # Create win transaction
-            from models.wallet import Transaction
-            txn = Transaction(
-                from_user_id=None,  # System
-                to_user_id=user_id,
-                amount=actual_win,
-                transaction_type='win',
-                wallet_type='main_coin',
-                description=f'Bet won: {bet_id}',
-                metadata={'bet_id': bet_id}
+        async def settle(session):
+            # Claim the bet first so concurrent settlements cannot both pay out
+            claimed = await db.bets.find_one_and_update(
+                {'id': bet_id, 'status': 'pending'},
+                {'$set': {
+                    'status': result,
+                    'actual_win': actual_win,
+                    'settled_at': datetime.utcnow()
+                }},
+                session=session
             )
-            await db.transactions.insert_one(txn.dict())
+            if not claimed:
+                raise HTTPException(status_code=400, detail='Bet already settled')
             
-        elif result == 'lost':
-            # Loss: Remove locked coins (they're lost)
-            await update_wallet_balance(user_id, 'locked', bet_amount, 'subtract')
-            
-        else:
-            raise HTTPException(status_code=400, detail='Invalid result. Use "won" or "lost"')
+            if result == 'won':
+                # Win: Unlock locked coins + add winnings to main_coin; the house pays the winnings
+                await apply_postings([
+                    Posting('bet_won', {'bet_id': bet_id})
+                    .wallet(user_id, 'locked', -bet_amount)
+                    .wallet(user_id, 'main_coin', bet_amount + actual_win)
+                    .balance_against('house')
+                ], session=session)
+                
+                # Create win transaction
+                txn = Transaction(
+                    from_user_id=None,  # System
+                    to_user_id=user_id,
+                    amount=actual_win,
+                    transaction_type='win',
+                    wallet_type='main_coin',
+                    description=f'Bet won: {bet_id}',
+                    metadata={'bet_id': bet_id}
+                )
+                await db.transactions.insert_one(
+                    {**txn.dict(), 'scope_ids': claimed.get('scope_ids') or [user_id]},
+                    session=session
+                )
+                await record_stats({
+                    'locked_coins': -bet_amount,
+                    'coin_supply': bet_amount + actual_win,
+                    'bets_pending': -1,
+                    'bets_won': 1,
+                    'total_winnings': actual_win
+                }, session=session)
+            else:
+                # Loss: Remove locked coins (they go to the house)
+                await apply_postings([
+                    Posting('bet_lost', {'bet_id': bet_id})
+                    .wallet(user_id, 'locked', -bet_amount)
+                    .balance_against('house')
+                ], session=session)
+                await record_stats({
+                    'locked_coins': -bet_amount,
+                    'bets_pending': -1,
+                    'bets_lost': 1
+                }, session=session)
         
-        # Update bet status
-        await db.bets.update_one(
-            {'id': bet_id},
-            {'$set': {
-                'status': result,
-                'actual_win': actual_win,
-                'settled_at': datetime.utcnow()
-            }}
-        )
+        await run_in_transaction(settle)
         
         logger.info(f'Bet settled: {bet_id} - Result: {result}, Win: {actual_win}')
         
@@ -229,6 +256,168 @@ async def settle_bet(
         logger.error(f'Settle bet error: {str(e)}')
         raise HTTPException(status_code=500, detail=f'Failed to settle bet: {str(e)}')
 
+@router.post('/settle-batch')
+async def settle_bets_batch(
+    batch: BetSettleBatch,
+    current_user: dict = Depends(require_admin())
+):
+    """Settle many bets at once, e.g. every bet of a closed provider round (Admin only)
+
+    A fixed number of round trips regardless of batch size: one read, one
+    conditional bulk_write claiming the bets, one bulk_write of per-user
+    wallet deltas plus one insert_many of their ledger entries, one
+    insert_many of win transactions and one stats update.
+    """
+    try:
+        started = time.perf_counter()
+        settlements = batch.settlements
+        
+        if not settlements:
+            raise HTTPException(status_code=400, detail='No settlements given')
+        if len(settlements) > settings.BET_SETTLE_BATCH_MAX:
+            raise HTTPException(
+                status_code=400,
+                detail=f'Too many settlements: max {settings.BET_SETTLE_BATCH_MAX} per batch'
+            )
+        if any(s.result not in ('won', 'lost') for s in settlements):
+            raise HTTPException(status_code=400, detail='Invalid result. Use "won" or "lost"')
+        
+        # Per-bet outcome in request order; the first entry for a bet_id wins
+        report = []
+        requested = {}
+        for s in settlements:
+            entry = {'bet_id': s.bet_id, 'result': s.result, 'actual_win': s.actual_win}
+            if s.bet_id in requested:
+                entry['status'] = 'duplicate'
+            else:
+                requested[s.bet_id] = entry
+            report.append(entry)
+        
+        async def settle(session):
+            round_trips = 0
+            settlement_id = str(uuid.uuid4())
+            now = datetime.utcnow()
+            
+            bets = {
+                b['id']: b async for b in db.bets.find(
+                    {'id': {'$in': list(requested)}},
+                    {'_id': 0, 'id': 1, 'user_id': 1, 'amount': 1, 'status': 1, 'scope_ids': 1},
+                    session=session
+                )
+            }
+            round_trips += 1
+            
+            pending = []
+            for bet_id, entry in requested.items():
+                bet = bets.get(bet_id)
+                if not bet:
+                    entry['status'] = 'not_found'
+                elif bet['status'] != 'pending':
+                    entry['status'] = 'already_settled'
+                else:
+                    pending.append(bet_id)
+            
+            claimed = []
+            if pending:
+                # Claim first so a concurrent settlement cannot pay the same bet twice
+                result = await db.bets.bulk_write([
+                    UpdateOne(
+                        {'id': bet_id, 'status': 'pending'},
+                        {'$set': {
+                            'status': requested[bet_id]['result'],
+                            'actual_win': requested[bet_id]['actual_win'],
+                            'settled_at': now,
+                            'settlement_id': settlement_id
+                        }}
+                    )
+                    for bet_id in pending
+                ], ordered=False, session=session)
+                round_trips += 1
+                
+                claimed = pending
+                if result.modified_count != len(pending):
+                    # Lost a race on some bets; find out which ones are ours
+                    claimed = await db.bets.distinct(
+                        'id', {'id': {'$in': pending}, 'settlement_id': settlement_id}, session=session
+                    )
+                    round_trips += 1
+            
+            postings = []
+            win_txns = []
+            stats = defaultdict(int)
+            for bet_id in claimed:
+                bet, entry = bets[bet_id], requested[bet_id]
+                user_id, bet_amount, actual_win = bet['user_id'], bet['amount'], entry['actual_win']
+                
+                posting = Posting(f'bet_{entry["result"]}', {'bet_id': bet_id, 'settlement_id': settlement_id})
+                posting.wallet(user_id, 'locked', -bet_amount)
+                postings.append(posting)
+                stats['locked_coins'] -= bet_amount
+                stats['bets_pending'] -= 1
+                
+                if entry['result'] == 'won':
+                    posting.wallet(user_id, 'main_coin', bet_amount + actual_win)
+                    txn = Transaction(
+                        from_user_id=None,  # System
+                        to_user_id=user_id,
+                        amount=actual_win,
+                        transaction_type='win',
+                        wallet_type='main_coin',
+                        description=f'Bet won: {bet_id}',
+                        metadata={'bet_id': bet_id, 'settlement_id': settlement_id}
+                    )
+                    win_txns.append({**txn.dict(), 'scope_ids': bet.get('scope_ids') or [user_id]})
+                    stats['coin_supply'] += bet_amount + actual_win
+                    stats['bets_won'] += 1
+                    stats['total_winnings'] += actual_win
+                else:
+                    stats['bets_lost'] += 1
+                posting.balance_against('house')
+            
+            if claimed:
+                await apply_postings(postings, session=session)
+                round_trips += 2
+                if win_txns:
+                    await db.transactions.insert_many(win_txns, ordered=False, session=session)
+                    round_trips += 1
+                await record_stats(dict(stats), session=session)
+                round_trips += 1
+            
+            return set(claimed), set(pending) - set(claimed), round_trips
+        
+        claimed, lost_race, round_trips = await run_in_transaction(settle)
+        
+        for bet_id in claimed:
+            requested[bet_id]['status'] = 'settled'
+        for bet_id in lost_race:
+            requested[bet_id]['status'] = 'already_settled'
+        
+        elapsed = time.perf_counter() - started
+        summary = defaultdict(int)
+        for entry in report:
+            summary[entry['status']] += 1
+        
+        logger.info(
+            f'Bet batch settled by {current_user["user_id"]}: {len(claimed)}/{len(settlements)} '
+            f'in {elapsed * 1000:.1f}ms ({round_trips} round trips)'
+        )
+        
+        return {
+            'message': 'Batch settled',
+            'results': report,
+            'summary': {'requested': len(settlements), **summary},
+            'metrics': {
+                'elapsed_ms': round(elapsed * 1000, 2),
+                'bets_per_second': round(len(claimed) / elapsed, 1) if elapsed else None,
+                'round_trips': round_trips
+            }
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f'Batch settle error: {str(e)}')
+        raise HTTPException(status_code=500, detail=f'Failed to settle batch: {str(e)}')
+
 @router.post('/{bet_id}/cancel')
 async def cancel_bet(
     bet_id: str,
@@ -248,18 +437,32 @@ async def cancel_bet(
         user_id = bet['user_id']
         bet_amount = bet['amount']
         
-        # Refund: Unlock coins back to main_coin
-        await update_wallet_balance(user_id, 'locked', bet_amount, 'subtract')
-        await update_wallet_balance(user_id, 'main_coin', bet_amount, 'add')
-        
-        # Update bet status
-        await db.bets.update_one(
-            {'id': bet_id},
-            {'$set': {
-                'status': 'cancelled',
-                'settled_at': datetime.utcnow()
-            }}
-        )
+        async def refund(session):
+            # Flip status first so a bet can only ever be refunded once
+            claimed = await db.bets.find_one_and_update(
+                {'id': bet_id, 'status': 'pending'},
+                {'$set': {
+                    'status': 'cancelled',
+                    'settled_at': datetime.utcnow()
+                }},
+                session=session
+            )
+            if not claimed:
+                raise HTTPException(status_code=400, detail='Can only cancel pending bets')
+            
+            # Refund: Unlock coins back to main_coin
+            await move_balance(
+                user_id, 'locked', user_id, 'main_coin', bet_amount,
+                session=session, entry_type='bet_cancelled', ref={'bet_id': bet_id}
+            )
+            await record_stats({
+                'locked_coins': -bet_amount,
+                'coin_supply': bet_amount,
+                'bets_pending': -1,
+                'bets_cancelled': 1
+            }, session=session)
+        
+        await run_in_transaction(refund)
         
         logger.info(f'Bet cancelled: {bet_id} - Reason: {reason}')
         
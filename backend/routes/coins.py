@@ -1,9 +1,16 @@
 from config.database import db
-from fastapi import APIRouter, HTTPException, Depends, status, Query
+from fastapi import APIRouter, HTTPException, Depends, status, Query, Response, Header
 
 from pydantic import BaseModel, Field
 from models.wallet import Transaction, TransactionCreate
+from models.money import Money
 from middleware.auth import get_current_user, require_master_admin
+from utils.wallet import update_wallet_balance, move_balance, InsufficientBalanceError, WalletNotFoundError
+from utils.transactions import run_in_transaction
+from utils.platform_stats import record_stats
+from utils.hierarchy import TRANSACTION_OWNERS, get_scope_ids, visibility_filter
+from utils.idempotency import run_idempotent
+from utils.pagination import Cursor, date_range, fetch_page, page_cursor
 from config.settings import settings
 from typing import List, Optional
 from datetime import datetime
@@ -15,43 +22,15 @@ router = APIRouter(prefix='/coins', tags=['Coin Management'])
 
 class MintCoinsRequest(BaseModel):
     to_user_id: str
-    amount: float = Field(gt=0)
+    amount: Money = Field(gt=0)
     description: Optional[str] = 'Coin minting by Master Admin'
 
 class TransferCoinsRequest(BaseModel):
     to_user_id: str
-    amount: float = Field(gt=0)
+    amount: Money = Field(gt=0)
     wallet_type: str = 'main_coin'
     description: Optional[str] = None
 
-async def update_wallet_balance(db, user_id: str, wallet_type: str, amount: float, operation: str = 'add'):
-    """Update wallet balance atomically"""
-    wallet = await db.wallets.find_one({
-        'user_id': user_id,
-        'wallet_type': wallet_type
-    })
-    
-    if not wallet:
-        raise ValueError(f'Wallet not found for user {user_id}, type {wallet_type}')
-    
-    current_balance = wallet.get('balance', 0.0)
-    
-    if operation == 'add':
-        new_balance = current_balance + amount
-    elif operation == 'subtract':
-        if current_balance < amount:
-            raise ValueError(f'Insufficient balance. Have: {current_balance}, Need: {amount}')
-        new_balance = current_balance - amount
-    else:
-        raise ValueError(f'Invalid operation: {operation}')
-    
-    await db.wallets.update_one(
-        {'user_id': user_id, 'wallet_type': wallet_type},
-        {'$set': {'balance': new_balance, 'updated_at': datetime.utcnow()}}
-    )
-    
-    return new_balance
-
 @router.post('/mint', response_model=Transaction)
 async def mint_coins(
     request: MintCoinsRequest,
@@ -80,17 +59,28 @@ async def mint_coins(
             created_by=current_user['user_id']
         )
         
-        # Update wallet
-        new_balance = await update_wallet_balance(
-            db, 
-            request.to_user_id, 
-            'main_coin', 
-            request.amount, 
-            'add'
-        )
+        scope_ids = await get_scope_ids([request.to_user_id])
         
-        # Save transaction
-        await db.transactions.insert_one(transaction.dict())
+        async def mint(session):
+            # Update wallet
+            await update_wallet_balance(
+                request.to_user_id, 
+                'main_coin', 
+                request.amount, 
+                'add',
+                session=session,
+                entry_type='mint',
+                ref={'transaction_id': transaction.id}
+            )
+            
+            # Save transaction
+            await db.transactions.insert_one({**transaction.dict(), 'scope_ids': scope_ids}, session=session)
+            await record_stats({
+                'coin_supply': request.amount,
+                'total_minted': request.amount
+            }, session=session)
+        
+        await run_in_transaction(mint)
         
         logger.info(f'Coins minted: {request.amount} to user {request.to_user_id} by {current_user["user_id"]}')
         
@@ -109,9 +99,16 @@ async def mint_coins(
 async def transfer_coins(
     request: TransferCoinsRequest,
     current_user: dict = Depends(get_current_user),
-    
+    idempotency_key: Optional[str] = Header(None, alias='Idempotency-Key')
 ):
-    """Transfer coins (respects hierarchy: Master Admin → Admin → Agent → User)"""
+    """Transfer coins (respects hierarchy: Master Admin → Admin → Agent → User).
+    Retries with the same Idempotency-Key replay the first response."""
+    return await run_idempotent(
+        idempotency_key, current_user['user_id'], 'coins.transfer', request,
+        lambda: _transfer_coins(request, current_user)
+    )
+
+async def _transfer_coins(request: TransferCoinsRequest, current_user: dict) -> Transaction:
     try:
         # Get sender and receiver
         sender = await db.users.find_one({'id': current_user['user_id']})
@@ -141,18 +138,6 @@ async def transfer_coins(
                 detail='Users cannot transfer coins'
             )
         
-        # Check sender balance
-        sender_wallet = await db.wallets.find_one({
-            'user_id': current_user['user_id'],
-            'wallet_type': request.wallet_type
-        })
-        
-        if not sender_wallet or sender_wallet.get('balance', 0) < request.amount:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail='Insufficient balance'
-            )
-        
         # Create transaction
         transaction = Transaction(
             from_user_id=current_user['user_id'],
@@ -165,27 +150,37 @@ async def transfer_coins(
             created_by=current_user['user_id']
         )
         
-        # Perform transfer (atomic)
-        # Subtract from sender
-        await update_wallet_balance(
-            db,
-            current_user['user_id'],
-            request.wallet_type,
-            request.amount,
-            'subtract'
-        )
+        scope_ids = await get_scope_ids([current_user['user_id'], request.to_user_id])
         
-        # Add to receiver
-        await update_wallet_balance(
-            db,
-            request.to_user_id,
-            request.wallet_type,
-            request.amount,
-            'add'
-        )
+        async def transfer(session):
+            # Perform transfer (guarded debit from sender, then credit to receiver)
+            await move_balance(
+                current_user['user_id'],
+                request.wallet_type,
+                request.to_user_id,
+                request.wallet_type,
+                request.amount,
+                session=session,
+                entry_type='transfer',
+                ref={'transaction_id': transaction.id}
+            )
+            
+            # Save transaction
+            await db.transactions.insert_one({**transaction.dict(), 'scope_ids': scope_ids}, session=session)
         
-        # Save transaction
-        await db.transactions.insert_one(transaction.dict())
+        try:
+            await run_in_transaction(transfer)
+        except InsufficientBalanceError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail='Insufficient balance'
+            )
+        except WalletNotFoundError as e:
+            # Either side has no wallet of this type
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
         
         logger.info(f'Coins transferred: {request.amount} from {current_user["user_id"]} to {request.to_user_id}')
         
@@ -202,41 +197,26 @@ async def transfer_coins(
 
 @router.get('/transactions', response_model=List[Transaction])
 async def get_transactions(
+    response: Response,
     transaction_type: Optional[str] = Query(None),
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=100),
+    cursor: Optional[Cursor] = Depends(page_cursor),
+    created: dict = Depends(date_range),
     current_user: dict = Depends(get_current_user),
     
 ):
     """Get transaction history (role-based filtering)"""
     try:
-        # Build filter
-        filter_query = {}
-        
-        # Role-based filtering
-        if current_user['role'] == 'user':
-            # Users see their own transactions
-            filter_query['$or'] = [
-                {'from_user_id': current_user['user_id']},
-                {'to_user_id': current_user['user_id']}
-            ]
-        elif current_user['role'] == 'agent':
-            # Agents see their own and their users' transactions
-            user_ids = [current_user['user_id']]
-            users = await db.users.find({'created_by': current_user['user_id']}).to_list(1000)
-            user_ids.extend([u['id'] for u in users])
-            
-            filter_query['$or'] = [
-                {'from_user_id': {'$in': user_ids}},
-                {'to_user_id': {'$in': user_ids}}
-            ]
-        # Admins and master admins see all
+        # Users see transactions on either side of them; agents every
+        # transaction touching their downline; admins see all
+        filter_query = {**visibility_filter(current_user, TRANSACTION_OWNERS), **created}
         
         if transaction_type:
             filter_query['transaction_type'] = transaction_type
         
         # Get transactions
-        transactions = await db.transactions.find(filter_query).sort('created_at', -1).skip(skip).limit(limit).to_list(limit)
+        transactions = await fetch_page(db.transactions, filter_query, response, cursor=cursor, skip=skip, limit=limit)
         
         return [Transaction(**txn) for txn in transactions]
     
@@ -4,6 +4,8 @@ from models.config import (
     SystemConfig, PaymentMethod, BonusRule, FAQ, Banner, Limit
 )
 from middleware.auth import get_current_user, require_master_admin, require_admin
+from utils.cache import config_cache
+from utils.money import coerce_money
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 import logging
@@ -34,20 +36,18 @@ async def get_system_config(
     from fastapi.responses import JSONResponse
     
     try:
-        filter_query = {'is_active': True}
-        if category:
-            filter_query['category'] = category
+        async def load():
+            filter_query = {'is_active': True}
+            if category:
+                filter_query['category'] = category
+            
+            configs = await db.system_configs.find(filter_query).to_list(1000)
+            logger.info(f"Found {len(configs)} configs for category={category}")
+            
+            # Convert to key-value dict
+            return {config['config_key']: config['config_value'] for config in configs}
         
-        configs = await db.system_configs.find(filter_query).to_list(1000)
-        logger.info(f"Found {len(configs)} configs for category={category}")
-        
-        # Convert to key-value dict
-        result = {}
-        for config in configs:
-            config.pop('_id', None)
-            result[config['config_key']] = config['config_value']
-        
-        logger.info(f"Returning {len(result)} config items")
+        result = await config_cache.get_or_load('system_configs', category, load)
         
         # Use explicit JSONResponse
         return JSONResponse(content=result)
@@ -82,6 +82,7 @@ async def create_or_update_config(
                     'updated_by': current_user['user_id']
                 }}
             )
+            await config_cache.invalidate('system_configs')
             return {'message': 'Configuration updated', 'key': config_key}
         else:
             config = SystemConfig(
@@ -93,6 +94,7 @@ async def create_or_update_config(
                 updated_by=current_user['user_id']
             )
             await db.system_configs.insert_one(config.dict())
+            await config_cache.invalidate('system_configs')
             return {'message': 'Configuration created', 'key': config_key}
     except Exception as e:
         logger.error(f'Create/update config error: {str(e)}')
@@ -108,14 +110,17 @@ async def get_payment_methods(
 ):
     """Get all active payment methods"""
     try:
-        filter_query = {'is_active': True}
-        if method_type:
-            filter_query['method_type'] = method_type
-        if for_deposit is not None:
-            filter_query['available_for_deposit' if for_deposit else 'available_for_withdrawal'] = True
+        async def load():
+            filter_query = {'is_active': True}
+            if method_type:
+                filter_query['method_type'] = method_type
+            if for_deposit is not None:
+                filter_query['available_for_deposit' if for_deposit else 'available_for_withdrawal'] = True
+            
+            methods = await db.payment_methods.find(filter_query).sort('sort_order', 1).to_list(100)
+            return [PaymentMethod(**m) for m in methods]
         
-        methods = await db.payment_methods.find(filter_query).sort('sort_order', 1).to_list(100)
-        return [PaymentMethod(**m) for m in methods]
+        return await config_cache.get_or_load('payment_methods', (method_type, for_deposit), load)
     except Exception as e:
         logger.error(f'Get payment methods error: {str(e)}')
         raise HTTPException(status_code=500, detail='Failed to get payment methods')
@@ -128,6 +133,7 @@ async def create_payment_method(
     """Create new payment method"""
     try:
         await db.payment_methods.insert_one(method.dict())
+        await config_cache.invalidate('payment_methods')
         logger.info(f'Payment method created: {method.name}')
         return {'message': 'Payment method created', 'id': method.id}
     except Exception as e:
@@ -144,8 +150,9 @@ async def update_payment_method(
     try:
         await db.payment_methods.update_one(
             {'id': method_id},
-            {'$set': update_data}
+            {'$set': coerce_money('payment_methods', update_data)}
         )
+        await config_cache.invalidate('payment_methods')
         return {'message': 'Payment method updated'}
     except Exception as e:
         logger.error(f'Update payment method error: {str(e)}')
@@ -161,14 +168,17 @@ async def get_bonus_rules(
 ):
     """Get all bonus rules"""
     try:
-        filter_query = {}
-        if active_only:
-            filter_query['is_active'] = True
-        if bonus_type:
-            filter_query['bonus_type'] = bonus_type
+        async def load():
+            filter_query = {}
+            if active_only:
+                filter_query['is_active'] = True
+            if bonus_type:
+                filter_query['bonus_type'] = bonus_type
+            
+            rules = await db.bonus_rules.find(filter_query).to_list(100)
+            return [BonusRule(**r) for r in rules]
         
-        rules = await db.bonus_rules.find(filter_query).to_list(100)
-        return [BonusRule(**r) for r in rules]
+        return await config_cache.get_or_load('bonus_rules', (bonus_type, active_only), load)
     except Exception as e:
         logger.error(f'Get bonus rules error: {str(e)}')
         raise HTTPException(status_code=500, detail='Failed to get bonus rules')
@@ -181,6 +191,7 @@ async def create_bonus_rule(
     """Create bonus rule"""
     try:
         await db.bonus_rules.insert_one(rule.dict())
+        await config_cache.invalidate('bonus_rules')
         logger.info(f'Bonus rule created: {rule.name}')
         return {'message': 'Bonus rule created', 'id': rule.id}
     except Exception as e:
@@ -195,12 +206,15 @@ async def get_faqs(
 ):
     """Get all FAQs (public endpoint)"""
     try:
-        filter_query = {'is_active': True}
-        if category:
-            filter_query['category'] = category
+        async def load():
+            filter_query = {'is_active': True}
+            if category:
+                filter_query['category'] = category
+            
+            faqs = await db.faqs.find(filter_query).sort('sort_order', 1).to_list(100)
+            return [FAQ(**f) for f in faqs]
         
-        faqs = await db.faqs.find(filter_query).sort('sort_order', 1).to_list(100)
-        return [FAQ(**f) for f in faqs]
+        return await config_cache.get_or_load('faqs', category, load)
     except Exception as e:
         logger.error(f'Get FAQs error: {str(e)}')
         raise HTTPException(status_code=500, detail='Failed to get FAQs')
@@ -213,6 +227,7 @@ async def create_faq(
     """Create FAQ"""
     try:
         await db.faqs.insert_one(faq.dict())
+        await config_cache.invalidate('faqs')
         return {'message': 'FAQ created', 'id': faq.id}
     except Exception as e:
         logger.error(f'Create FAQ error: {str(e)}')
@@ -227,20 +242,22 @@ async def get_banners(
 ):
     """Get active banners"""
     try:
-        now = datetime.utcnow()
-        filter_query = {
-            'is_active': True,
-            '$or': [
-                {'start_date': None, 'end_date': None},
-                {'start_date': {'$lte': now}, 'end_date': {'$gte': now}},
-                {'start_date': {'$lte': now}, 'end_date': None}
-            ]
-        }
-        if position:
-            filter_query['position'] = {'$in': [position, 'all']}
+        async def load():
+            filter_query = {'is_active': True}
+            if position:
+                filter_query['position'] = {'$in': [position, 'all']}
+            
+            banners = await db.banners.find(filter_query).sort('priority', -1).to_list(100)
+            return [Banner(**b) for b in banners]
         
-        banners = await db.banners.find(filter_query).sort('priority', -1).to_list(100)
-        return [Banner(**b) for b in banners]
+        # The schedule window is checked per request so cached banners
+        # still appear and expire on time
+        now = datetime.utcnow()
+        return [
+            b for b in await config_cache.get_or_load('banners', position, load)
+            if (b.start_date is None and b.end_date is None)
+            or (b.start_date is not None and b.start_date <= now and (b.end_date is None or b.end_date >= now))
+        ]
     except Exception as e:
         logger.error(f'Get banners error: {str(e)}')
         raise HTTPException(status_code=500, detail='Failed to get banners')
@@ -253,6 +270,7 @@ async def create_banner(
     """Create banner"""
     try:
         await db.banners.insert_one(banner.dict())
+        await config_cache.invalidate('banners')
         logger.info(f'Banner created: {banner.title}')
         return {'message': 'Banner created', 'id': banner.id}
     except Exception as e:
@@ -268,19 +286,25 @@ async def get_limits(
 ):
     """Get all limits"""
     try:
-        filter_query = {'is_active': True}
-        if limit_type:
-            filter_query['limit_type'] = limit_type
+        # Master admins see every limit; everyone else only global and own-role ones
+        role = None if current_user['role'] == 'master_admin' else current_user['role']
         
-        # Apply role-based filtering
-        if current_user['role'] != 'master_admin':
-            filter_query['$or'] = [
-                {'role': None},
-                {'role': current_user['role']}
-            ]
+        async def load():
+            filter_query = {'is_active': True}
+            if limit_type:
+                filter_query['limit_type'] = limit_type
+            
+            # Apply role-based filtering
+            if role:
+                filter_query['$or'] = [
+                    {'role': None},
+                    {'role': role}
+                ]
+            
+            limits = await db.limits.find(filter_query).to_list(100)
+            return [Limit(**l) for l in limits]
         
-        limits = await db.limits.find(filter_query).to_list(100)
-        return [Limit(**l) for l in limits]
+        return await config_cache.get_or_load('limits', (limit_type, role), load)
     except Exception as e:
         logger.error(f'Get limits error: {str(e)}')
         raise HTTPException(status_code=500, detail='Failed to get limits')
@@ -293,6 +317,7 @@ async def create_limit(
     """Create limit"""
     try:
         await db.limits.insert_one(limit.dict())
+        await config_cache.invalidate('limits')
         return {'message': 'Limit created', 'id': limit.id}
     except Exception as e:
         logger.error(f'Create limit error: {str(e)}')
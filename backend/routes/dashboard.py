@@ -1,14 +1,85 @@
 from fastapi import APIRouter, HTTPException, Depends, status, Query
+from fastapi.responses import StreamingResponse
 from config.database import db
 from middleware.auth import get_current_user, require_admin, require_master_admin
+from utils.platform_stats import get_platform_stats
+from utils.cache import config_cache
+from utils.security import token_cache
+from utils.hashing import hashing_pool
+from utils.reconciliation import reconcile_wallets
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timedelta
+from decimal import Decimal
+import asyncio
+import json
 import logging
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix='/dashboard', tags=['Dashboard'])
 
+def _count_if(condition: dict) -> dict:
+    """$group accumulator counting documents that match an expression"""
+    return {'$sum': {'$cond': [condition, 1, 0]}}
+
+async def _active_bonus_rules(auto_apply: Optional[bool] = None) -> List[Dict[str, Any]]:
+    """Active bonus rules, optionally filtered on auto_apply (served from the config cache)"""
+    async def load():
+        filter_query = {'is_active': True}
+        if auto_apply is not None:
+            filter_query['auto_apply'] = auto_apply
+        return await db.bonus_rules.find(filter_query, {'_id': 0}).to_list(100)
+    return await config_cache.get_or_load('bonus_rules', ('active', auto_apply), load)
+
+async def _platform_name() -> str:
+    async def load():
+        config = await db.system_configs.find_one({'config_key': 'platform_name'})
+        return config.get('config_value', 'KarnaliX') if config else 'KarnaliX'
+    return await config_cache.get_or_load('system_configs', ('key', 'platform_name'), load)
+
+async def _aggregate_one(collection, pipeline: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Run a single-row aggregation and return its row (empty dict for empty collections)"""
+    rows = await collection.aggregate(pipeline).to_list(1)
+    return rows[0] if rows else {}
+
+@router.get('/cache-stats')
+async def get_cache_stats(
+    current_user: dict = Depends(require_admin())
+):
+    """Hit/miss counters for this worker's in-process caches"""
+    return {
+        'token_cache': token_cache.stats(),
+        'config_cache': {'hits': config_cache.hits, 'misses': config_cache.misses},
+        'password_hashing': hashing_pool.stats()
+    }
+
+def _json_default(value):
+    return float(value) if isinstance(value, Decimal) else str(value)
+
+@router.get('/reconciliation')
+async def run_reconciliation(
+    incremental: bool = Query(True, description='Only accounts touched since the last completed run'),
+    current_user: dict = Depends(require_master_admin())
+):
+    """Reconcile wallets against the ledger, streamed as NDJSON (Master Admin only)
+
+    One line per mismatch as it is found, then a summary line.
+    """
+    async def lines():
+        items = reconcile_wallets(incremental=incremental)
+        try:
+            async for item in items:
+                yield json.dumps(item, default=_json_default) + '\n'
+        except Exception as e:
+            logger.error(f'Reconciliation error: {str(e)}')
+            yield json.dumps({'type': 'error', 'detail': 'Reconciliation failed'}) + '\n'
+        finally:
+            # Closed with the response, so a disconnect marks the run aborted
+            await items.aclose()
+    
+    logger.info(f'Wallet reconciliation started by {current_user["user_id"]} (incremental={incremental})')
+    return StreamingResponse(lines(), media_type='application/x-ndjson')
+
 @router.get('/admin-stats')
 async def get_admin_dashboard_stats(
     current_user: dict = Depends(require_admin())
@@ -18,126 +89,118 @@ async def get_admin_dashboard_stats(
         # Today's date
         today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
         week_ago = today_start - timedelta(days=7)
-        month_ago = today_start - timedelta(days=30)
-        
-        # User counts by role
-        total_users = await db.users.count_documents({})
-        admins_count = await db.users.count_documents({'role': 'admin'})
-        agents_count = await db.users.count_documents({'role': 'agent'})
-        users_count = await db.users.count_documents({'role': 'user'})
-        active_users = await db.users.count_documents({'is_active': True})
-        new_users_today = await db.users.count_documents({'created_at': {'$gte': today_start}})
-        new_users_week = await db.users.count_documents({'created_at': {'$gte': week_ago}})
-        
-        # Total coin supply (sum of all main wallets)
-        wallets = await db.wallets.find({'wallet_type': 'main_coin'}).to_list(10000)
-        total_coin_supply = sum([w.get('balance', 0) for w in wallets])
-        
-        bonus_wallets = await db.wallets.find({'wallet_type': 'bonus'}).to_list(10000)
-        total_bonus_coins = sum([w.get('balance', 0) for w in bonus_wallets])
-        
-        locked_wallets = await db.wallets.find({'wallet_type': 'locked'}).to_list(10000)
-        total_locked_coins = sum([w.get('balance', 0) for w in locked_wallets])
-        
-        # Mint stats
-        mints = await db.transactions.find({'transaction_type': 'mint'}).to_list(10000)
-        total_minted = sum([m.get('amount', 0) for m in mints])
-        
-        # Bet statistics
-        total_bets = await db.bets.count_documents({})
-        pending_bets = await db.bets.count_documents({'status': 'pending'})
-        won_bets = await db.bets.count_documents({'status': 'won'})
-        lost_bets = await db.bets.count_documents({'status': 'lost'})
-        
-        all_bets = await db.bets.find({}).to_list(100000)
-        total_bet_volume = sum([b.get('amount', 0) for b in all_bets])
-        
-        todays_bets = await db.bets.find({'created_at': {'$gte': today_start}}).to_list(10000)
-        todays_bet_volume = sum([b.get('amount', 0) for b in todays_bets])
-        
-        # Deposit stats
-        total_deposits = await db.deposits.count_documents({})
-        pending_deposits = await db.deposits.count_documents({'status': 'pending'})
-        approved_deposits = await db.deposits.find({'status': 'approved'}).to_list(100000)
-        total_deposit_amount = sum([d.get('amount', 0) for d in approved_deposits])
-        
-        # Withdrawal stats  
-        total_withdrawals = await db.withdrawals.count_documents({})
-        pending_withdrawals = await db.withdrawals.count_documents({'status': 'pending'})
-        approved_withdrawals = await db.withdrawals.find({'status': 'approved'}).to_list(100000)
-        total_withdrawal_amount = sum([w.get('amount', 0) for w in approved_withdrawals])
-        
-        # KYC stats
-        total_kyc = await db.kyc_documents.count_documents({})
-        pending_kyc = await db.kyc_documents.count_documents({'status': 'pending'})
-        approved_kyc = await db.kyc_documents.count_documents({'status': 'approved'})
-        rejected_kyc = await db.kyc_documents.count_documents({'status': 'rejected'})
-        
-        # Support stats
-        total_tickets = await db.tickets.count_documents({})
-        open_tickets = await db.tickets.count_documents({'status': 'open'})
-        in_progress_tickets = await db.tickets.count_documents({'status': 'in_progress'})
-        
-        # Game stats
-        total_games = await db.games.count_documents({})
-        active_games = await db.games.count_documents({'is_active': True})
-        total_providers = await db.game_providers.count_documents({})
-        active_providers = await db.game_providers.count_documents({'is_active': True})
-        
-        # Recent activity
-        recent_transactions = await db.transactions.find({}).sort('created_at', -1).limit(10).to_list(10)
-        recent_bets = await db.bets.find({}).sort('created_at', -1).limit(10).to_list(10)
+        
+        # Ledger totals come from the incrementally maintained rollup; the
+        # remaining counts are one server-side pipeline per collection,
+        # all in flight at once
+        (
+            platform_stats,
+            user_stats,
+            kyc_stats,
+            ticket_stats,
+            game_stats,
+            provider_stats,
+            recent_transactions,
+            recent_bets
+        ) = await asyncio.gather(
+            get_platform_stats(),
+            _aggregate_one(db.users, [{'$group': {
+                '_id': None,
+                'total': {'$sum': 1},
+                'admins': _count_if({'$eq': ['$role', 'admin']}),
+                'agents': _count_if({'$eq': ['$role', 'agent']}),
+                'users': _count_if({'$eq': ['$role', 'user']}),
+                'active': _count_if({'$eq': ['$is_active', True]}),
+                'new_today': _count_if({'$gte': ['$created_at', today_start]}),
+                'new_this_week': _count_if({'$gte': ['$created_at', week_ago]})
+            }}]),
+            _aggregate_one(db.kyc_documents, [{'$group': {
+                '_id': None,
+                'total': {'$sum': 1},
+                'pending': _count_if({'$eq': ['$status', 'pending']}),
+                'approved': _count_if({'$eq': ['$status', 'approved']}),
+                'rejected': _count_if({'$eq': ['$status', 'rejected']})
+            }}]),
+            _aggregate_one(db.tickets, [{'$group': {
+                '_id': None,
+                'total': {'$sum': 1},
+                'open': _count_if({'$eq': ['$status', 'open']}),
+                'in_progress': _count_if({'$eq': ['$status', 'in_progress']})
+            }}]),
+            _aggregate_one(db.games, [{'$group': {
+                '_id': None,
+                'total': {'$sum': 1},
+                'active': _count_if({'$eq': ['$is_active', True]})
+            }}]),
+            _aggregate_one(db.game_providers, [{'$group': {
+                '_id': None,
+                'total': {'$sum': 1},
+                'active': _count_if({'$eq': ['$is_active', True]})
+            }}]),
+            # Recent activity
+            db.transactions.find(
+                {},
+                {'_id': 0, 'id': 1, 'transaction_type': 1, 'amount': 1, 'from_user_id': 1, 'to_user_id': 1, 'created_at': 1}
+            ).sort('created_at', -1).limit(10).to_list(10),
+            db.bets.find(
+                {},
+                {'_id': 0, 'id': 1, 'user_id': 1, 'amount': 1, 'status': 1, 'created_at': 1}
+            ).sort('created_at', -1).limit(10).to_list(10)
+        )
+        
+        totals = platform_stats['global']
+        today = platform_stats['today']
         
         return {
             'users': {
-                'total': total_users,
-                'admins': admins_count,
-                'agents': agents_count,
-                'users': users_count,
-                'active': active_users,
-                'new_today': new_users_today,
-                'new_this_week': new_users_week
+                'total': user_stats.get('total', 0),
+                'admins': user_stats.get('admins', 0),
+                'agents': user_stats.get('agents', 0),
+                'users': user_stats.get('users', 0),
+                'active': user_stats.get('active', 0),
+                'new_today': user_stats.get('new_today', 0),
+                'new_this_week': user_stats.get('new_this_week', 0)
             },
             'coins': {
-                'total_supply': total_coin_supply,
-                'bonus_pool': total_bonus_coins,
-                'locked': total_locked_coins,
-                'total_minted': total_minted
+                'total_supply': totals.get('coin_supply', 0),
+                'bonus_pool': totals.get('bonus_pool', 0),
+                'locked': totals.get('locked_coins', 0),
+                'total_minted': totals.get('total_minted', 0)
             },
             'bets': {
-                'total': total_bets,
-                'pending': pending_bets,
-                'won': won_bets,
-                'lost': lost_bets,
-                'total_volume': total_bet_volume,
-                'today_volume': todays_bet_volume
+                'total': totals.get('bet_count', 0),
+                'pending': totals.get('bets_pending', 0),
+                'won': totals.get('bets_won', 0),
+                'lost': totals.get('bets_lost', 0),
+                'total_volume': totals.get('bet_volume', 0),
+                'today_volume': today.get('bet_volume', 0)
             },
             'deposits': {
-                'total': total_deposits,
-                'pending': pending_deposits,
-                'total_amount': total_deposit_amount
+                'total': totals.get('deposit_count', 0),
+                'pending': totals.get('deposits_pending', 0),
+                'total_amount': totals.get('deposit_amount', 0)
             },
             'withdrawals': {
-                'total': total_withdrawals,
-                'pending': pending_withdrawals,
-                'total_amount': total_withdrawal_amount
+                'total': totals.get('withdrawal_count', 0),
+                'pending': totals.get('withdrawals_pending', 0),
+                'total_amount': totals.get('withdrawal_amount', 0)
             },
             'kyc': {
-                'total': total_kyc,
-                'pending': pending_kyc,
-                'approved': approved_kyc,
-                'rejected': rejected_kyc
+                'total': kyc_stats.get('total', 0),
+                'pending': kyc_stats.get('pending', 0),
+                'approved': kyc_stats.get('approved', 0),
+                'rejected': kyc_stats.get('rejected', 0)
             },
             'support': {
-                'total': total_tickets,
-                'open': open_tickets,
-                'in_progress': in_progress_tickets
+                'total': ticket_stats.get('total', 0),
+                'open': ticket_stats.get('open', 0),
+                'in_progress': ticket_stats.get('in_progress', 0)
             },
             'games': {
-                'total': total_games,
-                'active': active_games,
-                'providers': total_providers,
-                'active_providers': active_providers
+                'total': game_stats.get('total', 0),
+                'active': game_stats.get('active', 0),
+                'providers': provider_stats.get('total', 0),
+                'active_providers': provider_stats.get('active', 0)
             },
             'recent_transactions': [{
                 'id': t['id'],
@@ -201,13 +264,10 @@ async def get_dashboard_overview(
         }).sort('created_at', -1).limit(10).to_list(10)
         
         # Available bonuses
-        available_bonuses = await db.bonus_rules.find({
-            'is_active': True,
-            'auto_apply': True
-        }).to_list(100)
+        available_bonuses = await _active_bonus_rules(auto_apply=True)
         
         # Get system config for welcome message
-        platform_name = await db.system_configs.find_one({'config_key': 'platform_name'})
+        platform_name = await _platform_name()
         
         return {
             'user': {
@@ -253,7 +313,7 @@ async def get_dashboard_overview(
                 'max_bonus': bonus.get('max_bonus', 0)
             } for bonus in available_bonuses],
             'welcome_message': f"Welcome back, {user.get('full_name', user['username'])}!",
-            'platform_name': platform_name.get('config_value', 'KarnaliX') if platform_name else 'KarnaliX'
+            'platform_name': platform_name
         }
     except Exception as e:
         logger.error(f'Get dashboard overview error: {str(e)}')
@@ -350,9 +410,7 @@ async def get_quick_stats(
         })
         
         # Available bonuses count
-        available_bonuses = await db.bonus_rules.count_documents({
-            'is_active': True
-        })
+        available_bonuses = len(await _active_bonus_rules())
         
         # Referral stats
         referrals = await db.referrals.count_documents({
@@ -436,10 +494,7 @@ async def get_notifications(
             })
         
         # Available bonuses
-        active_bonuses = await db.bonus_rules.count_documents({
-            'is_active': True,
-            'auto_apply': False
-        })
+        active_bonuses = len(await _active_bonus_rules(auto_apply=False))
         if active_bonuses > 0:
             notifications.append({
                 'type': 'bonus_available',
@@ -1,9 +1,22 @@
-from fastapi import APIRouter, HTTPException, Depends, status, Query
+from fastapi import APIRouter, HTTPException, Depends, status, Query, Request, Response, Header, File, Form, UploadFile
 from config.database import db
-from models.deposit import Deposit, DepositCreate, Withdrawal, WithdrawalCreate
+from models.blob import BlobRef
+from models.deposit import Deposit, DepositCreate, DepositResponse, DepositSummary, Withdrawal, WithdrawalCreate
+from models.money import Money
 from models.wallet import Transaction
 from middleware.auth import get_current_user, require_admin
-from typing import List, Optional
+from utils.wallet import update_wallet_balance, InsufficientBalanceError, WalletNotFoundError
+from utils import ledger
+from utils.ledger import Posting
+from utils.transactions import run_in_transaction
+from utils.platform_stats import record_stats
+from utils.hierarchy import get_scope_ids, owned_filter
+from utils.idempotency import run_idempotent
+from utils.blobstore import BlobNotFoundError, InvalidBlobError, blob_response
+from utils.uploads import resolve_variant, store_base64, store_upload
+from utils.pagination import Cursor, date_range, fetch_page, page_cursor
+from utils.projection import FieldSet
+from typing import Dict, List, Literal, Optional, Tuple
 from datetime import datetime
 import logging
 
@@ -13,59 +26,143 @@ router = APIRouter(prefix='/transactions', tags=['Deposits & Withdrawals'])
 
 # ============= DEPOSITS =============
 
-@router.post('/deposits', response_model=Deposit, status_code=status.HTTP_201_CREATED)
+# Enough of the screenshot to link it from a list
+DEPOSIT_FIELDS = FieldSet(
+    DepositSummary,
+    stored=['screenshot.content_type', 'screenshot_variants.thumbnail.key'],
+    computed=['screenshot_url', 'screenshot_thumbnail_url']
+)
+
+def _screenshot_links(request: Request, doc: dict) -> dict:
+    screenshot = doc.get('screenshot')
+    if not screenshot:
+        return {}
+    url = request.app.url_path_for('get_deposit_screenshot', deposit_id=doc['id'])
+    links = {'screenshot_url': url}
+    if doc.get('screenshot_variants') or str(screenshot.get('content_type', '')).startswith('image/'):
+        links['screenshot_thumbnail_url'] = f'{url}?variant=thumbnail'
+    return links
+
+def deposit_response(request: Request, doc: dict) -> DepositResponse:
+    """Deposit with links to its screenshot instead of the image itself"""
+    return DepositResponse(**{**doc, **_screenshot_links(request, doc)})
+
+@router.post('/deposits', response_model=DepositResponse, status_code=status.HTTP_201_CREATED)
 async def create_deposit_request(
     deposit_data: DepositCreate,
-    current_user: dict = Depends(get_current_user)
+    request: Request,
+    current_user: dict = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None, alias='Idempotency-Key')
 ):
-    """Create deposit request"""
+    """Create deposit request (screenshot as base64; see /deposits/upload for multipart).
+    Retries with the same Idempotency-Key replay the first response."""
+    return await run_idempotent(
+        idempotency_key, current_user['user_id'], 'transactions.deposit', deposit_data,
+        lambda: _create_deposit_request(request, deposit_data, current_user),
+        status_code=status.HTTP_201_CREATED
+    )
+
+@router.post('/deposits/upload', response_model=DepositResponse, status_code=status.HTTP_201_CREATED)
+async def upload_deposit_request(
+    request: Request,
+    amount: Money = Form(...),
+    payment_method: str = Form(...),
+    transaction_code: Optional[str] = Form(None),
+    notes: Optional[str] = Form(None),
+    screenshot: Optional[UploadFile] = File(None),
+    current_user: dict = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None, alias='Idempotency-Key')
+):
+    """Create deposit request as multipart/form-data; the screenshot is streamed to disk.
+    Retries with the same Idempotency-Key replay the first response."""
+    deposit_data = DepositCreate(
+        amount=amount, payment_method=payment_method, transaction_code=transaction_code, notes=notes
+    )
+    stored = None
+    if screenshot is not None:
+        try:
+            stored = await store_upload(screenshot)
+        except InvalidBlobError as e:
+            raise HTTPException(status_code=400, detail=f'screenshot: {str(e)}')
+    # Content-addressed, so a retried upload of the same file fingerprints the same
+    body = {**deposit_data.dict(), 'screenshot': stored[0].key if stored else None}
+    return await run_idempotent(
+        idempotency_key, current_user['user_id'], 'transactions.deposit', body,
+        lambda: _create_deposit_request(request, deposit_data, current_user, stored),
+        status_code=status.HTTP_201_CREATED
+    )
+
+async def _create_deposit_request(
+    request: Request,
+    deposit_data: DepositCreate,
+    current_user: dict,
+    stored: Optional[Tuple[BlobRef, Dict[str, BlobRef]]] = None
+) -> DepositResponse:
     try:
-        deposit = Deposit(**deposit_data.dict(), user_id=current_user['user_id'])
-        await db.deposits.insert_one(deposit.dict())
+        if stored is None and deposit_data.screenshot:
+            try:
+                stored = await store_base64(deposit_data.screenshot)
+            except InvalidBlobError as e:
+                raise HTTPException(status_code=400, detail=f'screenshot: {str(e)}')
+        
+        deposit = Deposit(
+            **deposit_data.dict(exclude={'screenshot'}),
+            screenshot=stored[0] if stored else None,
+            screenshot_variants=stored[1] if stored else {},
+            user_id=current_user['user_id']
+        )
+        
+        scope_ids = await get_scope_ids([current_user['user_id']])
+        
+        async def record(session):
+            await db.deposits.insert_one({**deposit.dict(), 'scope_ids': scope_ids}, session=session)
+            await record_stats({'deposit_count': 1, 'deposits_pending': 1}, session=session)
+        
+        await run_in_transaction(record)
         
         logger.info(f'Deposit request created: {deposit.id} by {current_user["user_id"]}, amount: {deposit.amount}')
         
-        return deposit
+        return deposit_response(request, deposit.dict())
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f'Create deposit error: {str(e)}')
         raise HTTPException(status_code=500, detail='Failed to create deposit request')
 
-@router.get('/deposits', response_model=List[Deposit])
+@router.get('/deposits', response_model=List[DepositSummary])
 async def get_deposits(
+    request: Request,
+    response: Response,
     status: Optional[str] = Query(None),
     user_id: Optional[str] = Query(None),
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=100),
+    cursor: Optional[Cursor] = Depends(page_cursor),
+    created: dict = Depends(date_range),
+    fields: Optional[List[str]] = Depends(DEPOSIT_FIELDS),
     current_user: dict = Depends(get_current_user)
 ):
-    """Get deposits (role-based filtering)"""
+    """Get deposits (role-based filtering, with screenshot thumbnail URLs).
+    The screenshot itself is never loaded here; use ?fields= for a sparse list."""
     try:
-        filter_query = {}
+        filter_query = owned_filter(current_user, status, user_id, created)
         
-        # Role-based filtering
-        if current_user['role'] == 'user':
-            filter_query['user_id'] = current_user['user_id']
-        elif current_user['role'] == 'agent':
-            users = await db.users.find({'created_by': current_user['user_id']}).to_list(1000)
-            user_ids = [u['id'] for u in users] + [current_user['user_id']]
-            filter_query['user_id'] = {'$in': user_ids}
-        # Admins see all
-        
-        if status:
-            filter_query['status'] = status
-        if user_id and current_user['role'] in ['admin', 'master_admin']:
-            filter_query['user_id'] = user_id
-        
-        deposits = await db.deposits.find(filter_query).sort('created_at', -1).skip(skip).limit(limit).to_list(limit)
+        deposits = await fetch_page(
+            db.deposits, filter_query, response, cursor=cursor, skip=skip, limit=limit,
+            projection=DEPOSIT_FIELDS.projection(fields, required=('id', 'created_at'))
+        )
         
-        return [Deposit(**d) for d in deposits]
+        return DEPOSIT_FIELDS.respond(
+            deposits, fields, computed=lambda d: _screenshot_links(request, d), response=response
+        )
     except Exception as e:
         logger.error(f'Get deposits error: {str(e)}')
         raise HTTPException(status_code=500, detail='Failed to get deposits')
 
-@router.get('/deposits/{deposit_id}', response_model=Deposit)
+@router.get('/deposits/{deposit_id}', response_model=DepositResponse)
 async def get_deposit(
     deposit_id: str,
+    request: Request,
     current_user: dict = Depends(get_current_user)
 ):
     """Get deposit details"""
@@ -79,13 +176,53 @@ async def get_deposit(
         if current_user['role'] == 'user' and deposit['user_id'] != current_user['user_id']:
             raise HTTPException(status_code=403, detail='Access denied')
         
-        return Deposit(**deposit)
+        return deposit_response(request, deposit)
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f'Get deposit error: {str(e)}')
         raise HTTPException(status_code=500, detail='Failed to get deposit')
 
+@router.get('/deposits/{deposit_id}/screenshot')
+async def get_deposit_screenshot(
+    deposit_id: str,
+    request: Request,
+    variant: Literal['original', 'preview', 'thumbnail'] = Query('original'),
+    current_user: dict = Depends(get_current_user)
+):
+    """Stream a deposit screenshot or its preview/thumbnail; supports Range requests"""
+    try:
+        deposit = await db.deposits.find_one(
+            {'id': deposit_id}, {'_id': 0, 'user_id': 1, 'screenshot': 1, 'screenshot_variants': 1}
+        )
+        
+        if not deposit:
+            raise HTTPException(status_code=404, detail='Deposit not found')
+        
+        # Check access
+        if current_user['role'] == 'user' and deposit['user_id'] != current_user['user_id']:
+            raise HTTPException(status_code=403, detail='Access denied')
+        
+        if not deposit.get('screenshot'):
+            raise HTTPException(status_code=404, detail='Screenshot not found')
+        
+        ref = await resolve_variant(
+            db.deposits, deposit_id, 'screenshot_variants', BlobRef(**deposit['screenshot']),
+            deposit.get('screenshot_variants', {}), variant
+        )
+        if ref is None:
+            raise HTTPException(status_code=404, detail=f'No {variant} for this screenshot')
+        
+        return await blob_response(ref, request, filename=f'{deposit_id}-screenshot')
+    except HTTPException:
+        raise
+    except BlobNotFoundError:
+        logger.error(f'Deposit screenshot missing from blob store: {deposit_id}')
+        raise HTTPException(status_code=404, detail='Screenshot not found')
+    except Exception as e:
+        logger.error(f'Get deposit screenshot error: {str(e)}')
+        raise HTTPException(status_code=500, detail='Failed to get screenshot')
+
 @router.patch('/deposits/{deposit_id}/approve')
 async def approve_deposit(
     deposit_id: str,
@@ -105,21 +242,6 @@ async def approve_deposit(
         user_id = deposit['user_id']
         amount = deposit['amount']
         
-        # Credit coins to user's main wallet
-        wallet = await db.wallets.find_one({
-            'user_id': user_id,
-            'wallet_type': 'main_coin'
-        })
-        
-        if not wallet:
-            raise HTTPException(status_code=404, detail='User wallet not found')
-        
-        new_balance = wallet.get('balance', 0) + amount
-        await db.wallets.update_one(
-            {'user_id': user_id, 'wallet_type': 'main_coin'},
-            {'$set': {'balance': new_balance, 'updated_at': datetime.utcnow()}}
-        )
-        
         # Create transaction
         txn = Transaction(
             from_user_id=None,  # System
@@ -130,18 +252,44 @@ async def approve_deposit(
             description=f'Deposit approved: {deposit_id}',
             metadata={'deposit_id': deposit_id, 'payment_method': deposit['payment_method']}
         )
-        await db.transactions.insert_one(txn.dict())
-        
-        # Update deposit status
-        await db.deposits.update_one(
-            {'id': deposit_id},
-            {'$set': {
-                'status': 'approved',
-                'reviewed_by': current_user['user_id'],
-                'review_notes': review_notes,
-                'reviewed_at': datetime.utcnow()
-            }}
-        )
+        
+        async def approve(session):
+            # Flip status first so a deposit can only ever be credited once
+            claimed = await db.deposits.find_one_and_update(
+                {'id': deposit_id, 'status': 'pending'},
+                {'$set': {
+                    'status': 'approved',
+                    'reviewed_by': current_user['user_id'],
+                    'review_notes': review_notes,
+                    'reviewed_at': datetime.utcnow()
+                }},
+                session=session
+            )
+            if not claimed:
+                raise HTTPException(status_code=400, detail='Deposit already processed')
+            
+            # Credit coins to user's main wallet
+            try:
+                balance = await update_wallet_balance(
+                    user_id, 'main_coin', amount, 'add', session=session,
+                    entry_type='deposit', ref={'deposit_id': deposit_id}
+                )
+            except WalletNotFoundError:
+                raise HTTPException(status_code=404, detail='User wallet not found')
+            
+            await db.transactions.insert_one(
+                {**txn.dict(), 'scope_ids': claimed.get('scope_ids') or [user_id]},
+                session=session
+            )
+            await record_stats({
+                'coin_supply': amount,
+                'deposit_amount': amount,
+                'deposits_pending': -1,
+                'deposits_approved': 1
+            }, session=session)
+            return balance
+        
+        new_balance = await run_in_transaction(approve)
         
         logger.info(f'Deposit approved: {deposit_id}, amount: {amount}, user: {user_id}')
         
@@ -173,15 +321,23 @@ async def reject_deposit(
         if deposit['status'] != 'pending':
             raise HTTPException(status_code=400, detail='Deposit already processed')
         
-        await db.deposits.update_one(
-            {'id': deposit_id},
-            {'$set': {
-                'status': 'rejected',
-                'reviewed_by': current_user['user_id'],
-                'review_notes': review_notes,
-                'reviewed_at': datetime.utcnow()
-            }}
-        )
+        async def reject(session):
+            claimed = await db.deposits.find_one_and_update(
+                {'id': deposit_id, 'status': 'pending'},
+                {'$set': {
+                    'status': 'rejected',
+                    'reviewed_by': current_user['user_id'],
+                    'review_notes': review_notes,
+                    'reviewed_at': datetime.utcnow()
+                }},
+                session=session
+            )
+            if not claimed:
+                raise HTTPException(status_code=400, detail='Deposit already processed')
+            
+            await record_stats({'deposits_pending': -1}, session=session)
+        
+        await run_in_transaction(reject)
         
         logger.info(f'Deposit rejected: {deposit_id}')
         
@@ -197,9 +353,17 @@ async def reject_deposit(
 @router.post('/withdrawals', response_model=Withdrawal, status_code=status.HTTP_201_CREATED)
 async def create_withdrawal_request(
     withdrawal_data: WithdrawalCreate,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None, alias='Idempotency-Key')
 ):
-    """Create withdrawal request (KYC required)"""
+    """Create withdrawal request (KYC required). Retries with the same Idempotency-Key replay the first response."""
+    return await run_idempotent(
+        idempotency_key, current_user['user_id'], 'transactions.withdrawal', withdrawal_data,
+        lambda: _create_withdrawal_request(withdrawal_data, current_user),
+        status_code=status.HTTP_201_CREATED
+    )
+
+async def _create_withdrawal_request(withdrawal_data: WithdrawalCreate, current_user: dict) -> Withdrawal:
     try:
         # Check KYC status
         user = await db.users.find_one({'id': current_user['user_id']})
@@ -209,25 +373,29 @@ async def create_withdrawal_request(
                 detail='KYC verification required for withdrawals'
             )
         
-        # Check balance
-        wallet = await db.wallets.find_one({
-            'user_id': current_user['user_id'],
-            'wallet_type': 'main_coin'
-        })
-        
-        if not wallet or wallet.get('balance', 0) < withdrawal_data.amount:
-            raise HTTPException(status_code=400, detail='Insufficient balance')
-        
-        # Deduct coins immediately (hold in pending)
-        new_balance = wallet['balance'] - withdrawal_data.amount
-        await db.wallets.update_one(
-            {'user_id': current_user['user_id'], 'wallet_type': 'main_coin'},
-            {'$set': {'balance': new_balance, 'updated_at': datetime.utcnow()}}
-        )
-        
         # Create withdrawal
         withdrawal = Withdrawal(**withdrawal_data.dict(), user_id=current_user['user_id'])
-        await db.withdrawals.insert_one(withdrawal.dict())
+        
+        scope_ids = await get_scope_ids([current_user['user_id']])
+        
+        async def hold_and_record(session):
+            # Deduct coins immediately (hold in pending), guarded against overdraw
+            await update_wallet_balance(
+                current_user['user_id'], 'main_coin', withdrawal_data.amount, 'subtract', session=session,
+                entry_type='withdrawal_hold', ref={'withdrawal_id': withdrawal.id}, counterparty='withdrawals_held'
+            )
+            await db.withdrawals.insert_one({**withdrawal.dict(), 'scope_ids': scope_ids}, session=session)
+            await record_stats({
+                'coin_supply': -withdrawal_data.amount,
+                'withdrawals_held': withdrawal_data.amount,
+                'withdrawal_count': 1,
+                'withdrawals_pending': 1
+            }, session=session)
+        
+        try:
+            await run_in_transaction(hold_and_record)
+        except (InsufficientBalanceError, WalletNotFoundError):
+            raise HTTPException(status_code=400, detail='Insufficient balance')
         
         logger.info(f'Withdrawal request created: {withdrawal.id} by {current_user["user_id"]}, amount: {withdrawal.amount}')
         
@@ -240,29 +408,20 @@ async def create_withdrawal_request(
 
 @router.get('/withdrawals', response_model=List[Withdrawal])
 async def get_withdrawals(
+    response: Response,
     status: Optional[str] = Query(None),
     user_id: Optional[str] = Query(None),
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=100),
+    cursor: Optional[Cursor] = Depends(page_cursor),
+    created: dict = Depends(date_range),
     current_user: dict = Depends(get_current_user)
 ):
     """Get withdrawals (role-based filtering)"""
     try:
-        filter_query = {}
-        
-        if current_user['role'] == 'user':
-            filter_query['user_id'] = current_user['user_id']
-        elif current_user['role'] == 'agent':
-            users = await db.users.find({'created_by': current_user['user_id']}).to_list(1000)
-            user_ids = [u['id'] for u in users] + [current_user['user_id']]
-            filter_query['user_id'] = {'$in': user_ids}
-        
-        if status:
-            filter_query['status'] = status
-        if user_id and current_user['role'] in ['admin', 'master_admin']:
-            filter_query['user_id'] = user_id
+        filter_query = owned_filter(current_user, status, user_id, created)
         
-        withdrawals = await db.withdrawals.find(filter_query).sort('created_at', -1).skip(skip).limit(limit).to_list(limit)
+        withdrawals = await fetch_page(db.withdrawals, filter_query, response, cursor=cursor, skip=skip, limit=limit)
         
         return [Withdrawal(**w) for w in withdrawals]
     except Exception as e:
@@ -295,18 +454,39 @@ async def approve_withdrawal(
             description=f'Withdrawal approved: {withdrawal_id}',
             metadata={'withdrawal_id': withdrawal_id, 'payment_method': withdrawal['payment_method']}
         )
-        await db.transactions.insert_one(txn.dict())
-        
-        # Update withdrawal status
-        await db.withdrawals.update_one(
-            {'id': withdrawal_id},
-            {'$set': {
-                'status': 'approved',
-                'reviewed_by': current_user['user_id'],
-                'review_notes': review_notes,
-                'reviewed_at': datetime.utcnow()
-            }}
-        )
+        
+        async def approve(session):
+            claimed = await db.withdrawals.find_one_and_update(
+                {'id': withdrawal_id, 'status': 'pending'},
+                {'$set': {
+                    'status': 'approved',
+                    'reviewed_by': current_user['user_id'],
+                    'review_notes': review_notes,
+                    'reviewed_at': datetime.utcnow()
+                }},
+                session=session
+            )
+            if not claimed:
+                raise HTTPException(status_code=400, detail='Withdrawal already processed')
+            
+            await db.transactions.insert_one(
+                {**txn.dict(), 'scope_ids': claimed.get('scope_ids') or [withdrawal['user_id']]},
+                session=session
+            )
+            # The held coins leave the platform: no wallet moves, only the system accounts
+            await ledger.post([
+                Posting('withdrawal_paid', {'withdrawal_id': withdrawal_id})
+                .system('withdrawals_held', -withdrawal['amount'])
+                .system('payouts', withdrawal['amount'])
+            ], session=session)
+            await record_stats({
+                'withdrawals_held': -withdrawal['amount'],
+                'withdrawal_amount': withdrawal['amount'],
+                'withdrawals_pending': -1,
+                'withdrawals_approved': 1
+            }, session=session)
+        
+        await run_in_transaction(approve)
         
         logger.info(f'Withdrawal approved: {withdrawal_id}, amount: {withdrawal["amount"]}')
         
@@ -337,27 +517,32 @@ async def reject_withdrawal(
         user_id = withdrawal['user_id']
         amount = withdrawal['amount']
         
-        wallet = await db.wallets.find_one({
-            'user_id': user_id,
-            'wallet_type': 'main_coin'
-        })
-        
-        new_balance = wallet.get('balance', 0) + amount
-        await db.wallets.update_one(
-            {'user_id': user_id, 'wallet_type': 'main_coin'},
-            {'$set': {'balance': new_balance, 'updated_at': datetime.utcnow()}}
-        )
+        async def refund(session):
+            # Flip status first so a withdrawal can only ever be refunded once
+            claimed = await db.withdrawals.find_one_and_update(
+                {'id': withdrawal_id, 'status': 'pending'},
+                {'$set': {
+                    'status': 'rejected',
+                    'reviewed_by': current_user['user_id'],
+                    'review_notes': review_notes,
+                    'reviewed_at': datetime.utcnow()
+                }},
+                session=session
+            )
+            if not claimed:
+                raise HTTPException(status_code=400, detail='Withdrawal already processed')
+            
+            await update_wallet_balance(
+                user_id, 'main_coin', amount, 'add', session=session,
+                entry_type='withdrawal_refund', ref={'withdrawal_id': withdrawal_id}, counterparty='withdrawals_held'
+            )
+            await record_stats({
+                'coin_supply': amount,
+                'withdrawals_held': -amount,
+                'withdrawals_pending': -1
+            }, session=session)
         
-        # Update withdrawal status
-        await db.withdrawals.update_one(
-            {'id': withdrawal_id},
-            {'$set': {
-                'status': 'rejected',
-                'reviewed_by': current_user['user_id'],
-                'review_notes': review_notes,
-                'reviewed_at': datetime.utcnow()
-            }}
-        )
+        await run_in_transaction(refund)
         
         logger.info(f'Withdrawal rejected and refunded: {withdrawal_id}')
         
@@ -0,0 +1,165 @@
+from fastapi import APIRouter, Depends, Query, Request
+from fastapi.responses import StreamingResponse
+from config.database import db
+from config.settings import settings
+from middleware.auth import get_current_user
+from models.bet import Bet
+from models.deposit import Deposit, Withdrawal
+from models.wallet import Transaction
+from utils.hierarchy import TRANSACTION_OWNERS, owned_filter, visibility_filter
+from utils.pagination import date_range
+from pydantic import BaseModel
+from typing import AsyncIterator, Callable, Dict, Iterable, List, Literal, Optional, Type
+from datetime import datetime
+from decimal import Decimal
+import csv
+import io
+import json
+import logging
+import zlib
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix='/exports', tags=['Exports'])
+
+# Bulk history exports. Rows come off a batched cursor in created_at order
+# and are written out in chunks of about EXPORT_CHUNK_BYTES, gzipped on the
+# fly when the client accepts it, so memory stays flat whatever the size
+# of the export. Filters are the ones the paginated list routes use.
+
+class ExportSpec:
+    def __init__(self, name: str, model: Type[BaseModel], build_filter: Callable[..., dict],
+                 exclude: Iterable[str] = ()):
+        self.name = name
+        self.build_filter = build_filter
+        fields = [f for f in model.model_fields if f not in set(exclude)]
+        # id first, the way finance reads a sheet
+        self.columns: List[str] = ['id'] + [f for f in fields if f != 'id']
+
+def _transactions_filter(current_user: dict, created: dict, status: Optional[str],
+                         user_id: Optional[str], transaction_type: Optional[str]) -> dict:
+    filter_query = {**visibility_filter(current_user, TRANSACTION_OWNERS), **created}
+    if transaction_type:
+        filter_query['transaction_type'] = transaction_type
+    if status:
+        filter_query['status'] = status
+    return filter_query
+
+def _owned_filter(current_user: dict, created: dict, status: Optional[str],
+                  user_id: Optional[str], transaction_type: Optional[str]) -> dict:
+    return owned_filter(current_user, status, user_id, created)
+
+EXPORTS: Dict[str, ExportSpec] = {
+    'transactions': ExportSpec('transactions', Transaction, _transactions_filter),
+    'bets': ExportSpec('bets', Bet, _owned_filter),
+    # Screenshots are payloads, not history
+    'deposits': ExportSpec('deposits', Deposit, _owned_filter, exclude=['screenshot', 'screenshot_variants']),
+    'withdrawals': ExportSpec('withdrawals', Withdrawal, _owned_filter),
+}
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=_json_default, separators=(',', ':'))
+    # Decimal keeps its exact two-place form here
+    return value
+
+async def _rows(spec: ExportSpec, filter_query: dict) -> AsyncIterator[dict]:
+    projection = {'_id': 0, **{column: 1 for column in spec.columns}}
+    cursor = db[spec.name].find(filter_query, projection) \
+        .sort([('created_at', 1), ('id', 1)]) \
+        .batch_size(settings.EXPORT_BATCH_SIZE)
+    async for doc in cursor:
+        yield doc
+
+async def _encode(spec: ExportSpec, rows: AsyncIterator[dict], fmt: str) -> AsyncIterator[str]:
+    if fmt == 'ndjson':
+        async for doc in rows:
+            yield json.dumps(doc, default=_json_default) + '\n'
+        return
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(spec.columns)
+    async for doc in rows:
+        writer.writerow([_csv_value(doc.get(column)) for column in spec.columns])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+async def _chunks(lines: AsyncIterator[str], compress: bool, label: str) -> AsyncIterator[bytes]:
+    # wbits=31 makes zlib write a gzip header and trailer
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    pending: List[bytes] = []
+    size = 0
+    rows = 0
+    try:
+        async for line in lines:
+            data = line.encode('utf-8')
+            pending.append(data)
+            size += len(data)
+            rows += 1
+            if size >= settings.EXPORT_CHUNK_BYTES:
+                chunk = b''.join(pending)
+                pending, size = [], 0
+                chunk = compressor.compress(chunk) if compressor else chunk
+                if chunk:
+                    yield chunk
+    except Exception as e:
+        # Headers are gone by now; cutting the stream short is the only
+        # way left to tell the client the export is incomplete
+        logger.error(f'Export {label} failed after {rows} row(s): {str(e)}')
+        raise
+
+    chunk = b''.join(pending)
+    if compressor:
+        chunk = compressor.compress(chunk) + compressor.flush()
+    if chunk:
+        yield chunk
+    logger.info(f'Export {label} finished: {rows} row(s)')
+
+@router.get('/{collection}')
+async def export_collection(
+    request: Request,
+    collection: Literal['transactions', 'bets', 'deposits', 'withdrawals'],
+    format: Literal['ndjson', 'csv'] = Query('ndjson'),
+    status: Optional[str] = Query(None),
+    user_id: Optional[str] = Query(None, description='Admins only: one owner (bets, deposits, withdrawals)'),
+    transaction_type: Optional[str] = Query(None, description='Transactions only'),
+    created: dict = Depends(date_range),
+    current_user: dict = Depends(get_current_user)
+):
+    """Stream history as NDJSON or CSV (role-based filtering, no row limit)
+
+    Rows are ordered oldest first. The response is gzip-encoded when the
+    client sends ``Accept-Encoding: gzip``.
+    """
+    spec = EXPORTS[collection]
+    filter_query = spec.build_filter(current_user, created, status, user_id, transaction_type)
+
+    compress = 'gzip' in request.headers.get('accept-encoding', '').lower()
+    stamp = datetime.utcnow().strftime('%Y%m%dT%H%M%S')
+    headers = {'Content-Disposition': f'attachment; filename="{collection}-{stamp}.{format}"'}
+    if compress:
+        headers['Content-Encoding'] = 'gzip'
+        headers['Vary'] = 'Accept-Encoding'
+
+    logger.info(f'Export {collection} ({format}) started by {current_user["user_id"]}')
+    lines = _encode(spec, _rows(spec, filter_query), format)
+    return StreamingResponse(
+        _chunks(lines, compress, collection),
+        media_type='application/x-ndjson' if format == 'ndjson' else 'text/csv; charset=utf-8',
+        headers=headers
+    )
@@ -1,7 +1,10 @@
-from fastapi import APIRouter, HTTPException, Depends, status, Query
+from fastapi import APIRouter, HTTPException, Depends, status, Query, Response
 from config.database import db
-from models.game import GameProvider, Game, GameSession
+from models.game import GameProvider, Game, GameSession, GameSummary
 from middleware.auth import get_current_user, require_master_admin
+from utils.game_catalog import get_catalog, refresh_catalog
+from utils.money import coerce_money
+from utils.projection import FieldSet
 from typing import List, Optional
 from datetime import datetime, timedelta
 import logging
@@ -11,6 +14,8 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix='/games', tags=['Game Management'])
 
+GAME_FIELDS = FieldSet(GameSummary)
+
 # ============= GAME PROVIDER MANAGEMENT (MASTER ADMIN) =============
 
 @router.get('/providers', response_model=List[GameProvider])
@@ -39,6 +44,7 @@ async def create_game_provider(
     try:
         provider.created_by = current_user['user_id']
         await db.game_providers.insert_one(provider.dict())
+        await refresh_catalog()
         logger.info(f'Game provider created: {provider.name} by {current_user["user_id"]}')
         return provider
     except Exception as e:
@@ -62,6 +68,7 @@ async def update_game_provider(
             {'id': provider_id},
             {'$set': update_data}
         )
+        await refresh_catalog()
         logger.info(f'Provider updated: {provider_id} by {current_user["user_id"]}')
         return {'message': 'Provider updated successfully'}
     except HTTPException:
@@ -72,13 +79,14 @@ async def update_game_provider(
 
 # ============= GAME MANAGEMENT (MASTER ADMIN) =============
 
-@router.get('/admin/all', response_model=List[Game])
+@router.get('/admin/all', response_model=List[GameSummary])
 async def list_all_games(
     category: Optional[str] = Query(None),
     is_active: Optional[bool] = Query(None),
+    fields: Optional[List[str]] = Depends(GAME_FIELDS),
     current_user: dict = Depends(require_master_admin())
 ):
-    """List all games (Master Admin only)"""
+    """List all games (Master Admin only); config is on /admin/games/{game_id}"""
     try:
         filter_query = {}
         if category:
@@ -86,12 +94,29 @@ async def list_all_games(
         if is_active is not None:
             filter_query['is_active'] = is_active
         
-        games = await db.games.find(filter_query).to_list(1000)
-        return [Game(**g) for g in games]
+        games = await db.games.find(filter_query, GAME_FIELDS.projection(fields)).to_list(1000)
+        return GAME_FIELDS.respond(games, fields)
     except Exception as e:
         logger.error(f'List games error: {str(e)}')
         raise HTTPException(status_code=500, detail='Failed to list games')
 
+@router.get('/admin/games/{game_id}', response_model=Game)
+async def get_game_admin(
+    game_id: str,
+    current_user: dict = Depends(require_master_admin())
+):
+    """Get game with its config, active or not (Master Admin only)"""
+    try:
+        game = await db.games.find_one({'id': game_id}, {'_id': 0})
+        if not game:
+            raise HTTPException(status_code=404, detail='Game not found')
+        return Game(**game)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f'Get game error: {str(e)}')
+        raise HTTPException(status_code=500, detail='Failed to get game')
+
 @router.post('/admin/games', response_model=Game, status_code=status.HTTP_201_CREATED)
 async def create_game(
     game: Game,
@@ -105,6 +130,7 @@ async def create_game(
             raise HTTPException(status_code=404, detail='Provider not found')
         
         await db.games.insert_one(game.dict())
+        await refresh_catalog()
         logger.info(f'Game created: {game.name} by {current_user["user_id"]}')
         return game
     except HTTPException:
@@ -125,11 +151,13 @@ async def update_game(
         if not game:
             raise HTTPException(status_code=404, detail='Game not found')
         
+        coerce_money('games', update_data)
         update_data['updated_at'] = datetime.utcnow()
         await db.games.update_one(
             {'id': game_id},
             {'$set': update_data}
         )
+        await refresh_catalog()
         logger.info(f'Game updated: {game_id} by {current_user["user_id"]}')
         return {'message': 'Game updated successfully'}
     except HTTPException:
@@ -147,16 +175,8 @@ async def list_available_games(
 ):
     """List available games for users (only active games)"""
     try:
-        filter_query = {'is_active': True}
-        if category:
-            filter_query['category'] = category
-        
-        games = await db.games.find(filter_query).to_list(1000)
-        games_list = []
-        for g in games:
-            g.pop('_id', None)
-            games_list.append(Game(**g))
-        return games_list
+        catalog = await get_catalog()
+        return Response(content=catalog.listing(category), media_type='application/json')
     except Exception as e:
         logger.error(f'List available games error: {str(e)}')
         raise HTTPException(status_code=500, detail='Failed to list games')
@@ -168,12 +188,12 @@ async def get_game_details(
 ):
     """Get game details"""
     try:
-        game = await db.games.find_one({'id': game_id, 'is_active': True})
-        if not game:
+        catalog = await get_catalog()
+        game_json = catalog.details.get(game_id)
+        if not game_json:
             raise HTTPException(status_code=404, detail='Game not found')
         
-        game.pop('_id', None)
-        return Game(**game)
+        return Response(content=game_json, media_type='application/json')
     except HTTPException:
         raise
     except Exception as e:
@@ -188,13 +208,13 @@ async def launch_game(
     """Launch game session"""
     try:
         # Verify game exists and is active
-        game = await db.games.find_one({'id': game_id, 'is_active': True})
+        catalog = await get_catalog()
+        game = catalog.games.get(game_id)
         if not game:
             raise HTTPException(status_code=404, detail='Game not found or inactive')
         
         # Verify provider is active
-        provider = await db.game_providers.find_one({'id': game['provider_id'], 'is_active': True})
-        if not provider:
+        if game.provider_id not in catalog.active_provider_ids:
             raise HTTPException(status_code=400, detail='Game provider is inactive')
         
         # Check user has sufficient balance
@@ -202,7 +222,7 @@ async def launch_game(
             'user_id': current_user['user_id'],
             'wallet_type': 'main_coin'
         })
-        if not wallet or wallet.get('balance', 0) < game['min_bet']:
+        if not wallet or wallet.get('balance', 0) < game.min_bet:
             raise HTTPException(status_code=400, detail='Insufficient balance')
         
         # Create game session
@@ -210,7 +230,7 @@ async def launch_game(
         session = GameSession(
             user_id=current_user['user_id'],
             game_id=game_id,
-            provider_id=game['provider_id'],
+            provider_id=game.provider_id,
             session_token=session_token,
             game_url=f"/play/{game_id}?token={session_token}",  # Mock URL
             status='active',
@@ -1,8 +1,13 @@
-from fastapi import APIRouter, HTTPException, Depends, status, Query
+from fastapi import APIRouter, HTTPException, Depends, status, Query, Request, Response, File, Form, UploadFile
 from config.database import db
-from models.kyc import KYCDocument, KYCDocumentCreate
+from models.blob import BlobRef
+from models.kyc import KYCDocument, KYCDocumentCreate, KYCDocumentResponse
 from middleware.auth import get_current_user, require_admin
-from typing import List, Optional
+from utils.blobstore import BlobNotFoundError, InvalidBlobError, blob_response
+from utils.uploads import resolve_variant, store_base64, store_upload
+from utils.pagination import Cursor, fetch_page, page_cursor
+from pymongo import ASCENDING
+from typing import Awaitable, Callable, Dict, List, Literal, Optional
 from datetime import datetime
 import logging
 
@@ -10,39 +15,108 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix='/kyc', tags=['KYC Verification'])
 
-@router.post('/upload', response_model=KYCDocument, status_code=status.HTTP_201_CREATED)
+FILE_FIELDS = ('document_front', 'document_back', 'selfie')
+
+def kyc_response(request: Request, doc: dict) -> KYCDocumentResponse:
+    """KYC document with links to its files instead of the files themselves"""
+    kyc = KYCDocumentResponse(**doc)
+    for field in FILE_FIELDS:
+        ref = getattr(kyc, field)
+        if ref is None:
+            continue
+        url = request.app.url_path_for('get_kyc_file', kyc_id=kyc.id, field=field)
+        kyc.file_urls[field] = url
+        if field in kyc.variants or ref.content_type.startswith('image/'):
+            kyc.thumbnail_urls[field] = f'{url}?variant=thumbnail'
+    return kyc
+
+async def _submit_kyc(
+    request: Request,
+    current_user: dict,
+    document_type: str,
+    files: Dict[str, Callable[[], Awaitable]]
+) -> KYCDocumentResponse:
+    """Store the files (each a callable returning (ref, variants)) and record the submission"""
+    # Check if user already has pending/approved KYC
+    existing = await db.kyc_documents.find_one({
+        'user_id': current_user['user_id'],
+        'status': {'$in': ['pending', 'approved']}
+    })
+    
+    if existing:
+        raise HTTPException(
+            status_code=400,
+            detail='KYC already submitted. Please wait for review.'
+        )
+    
+    # Files go to the blob store; the document only keeps references
+    refs = {}
+    variants = {}
+    for field, store in files.items():
+        try:
+            refs[field], field_variants = await store()
+        except InvalidBlobError as e:
+            raise HTTPException(status_code=400, detail=f'{field}: {str(e)}')
+        if field_variants:
+            variants[field] = field_variants
+    
+    kyc_doc = KYCDocument(
+        **refs,
+        variants=variants,
+        document_type=document_type,
+        user_id=current_user['user_id']
+    )
+    await db.kyc_documents.insert_one(kyc_doc.dict())
+    
+    logger.info(f'KYC uploaded: {kyc_doc.id} by {current_user["user_id"]}')
+    
+    return kyc_response(request, kyc_doc.dict())
+
+@router.post('/upload', response_model=KYCDocumentResponse, status_code=status.HTTP_201_CREATED)
 async def upload_kyc_document(
     kyc_data: KYCDocumentCreate,
+    request: Request,
     current_user: dict = Depends(get_current_user)
 ):
-    """Upload KYC documents"""
+    """Upload KYC documents as base64 JSON (see /kyc/upload/files for multipart)"""
     try:
-        # Check if user already has pending/approved KYC
-        existing = await db.kyc_documents.find_one({
-            'user_id': current_user['user_id'],
-            'status': {'$in': ['pending', 'approved']}
-        })
-        
-        if existing:
-            raise HTTPException(
-                status_code=400,
-                detail='KYC already submitted. Please wait for review.'
-            )
-        
-        kyc_doc = KYCDocument(**kyc_data.dict(), user_id=current_user['user_id'])
-        await db.kyc_documents.insert_one(kyc_doc.dict())
-        
-        logger.info(f'KYC uploaded: {kyc_doc.id} by {current_user["user_id"]}')
-        
-        return kyc_doc
+        files = {
+            field: (lambda payload=getattr(kyc_data, field): store_base64(payload))
+            for field in FILE_FIELDS if getattr(kyc_data, field)
+        }
+        return await _submit_kyc(request, current_user, kyc_data.document_type, files)
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f'Upload KYC error: {str(e)}')
         raise HTTPException(status_code=500, detail='Failed to upload KYC')
 
-@router.get('/status', response_model=KYCDocument)
+@router.post('/upload/files', response_model=KYCDocumentResponse, status_code=status.HTTP_201_CREATED)
+async def upload_kyc_files(
+    request: Request,
+    document_type: str = Form(...),
+    document_front: UploadFile = File(...),
+    document_back: Optional[UploadFile] = File(None),
+    selfie: Optional[UploadFile] = File(None),
+    current_user: dict = Depends(get_current_user)
+):
+    """Upload KYC documents as multipart/form-data; files are streamed to disk"""
+    try:
+        uploads = {'document_front': document_front, 'document_back': document_back, 'selfie': selfie}
+        files = {
+            field: (lambda upload=upload: store_upload(upload))
+            for field, upload in uploads.items() if upload is not None
+        }
+        return await _submit_kyc(request, current_user, document_type, files)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f'Upload KYC files error: {str(e)}')
+        raise HTTPException(status_code=500, detail='Failed to upload KYC')
+
+@router.get('/status', response_model=KYCDocumentResponse)
 async def get_my_kyc_status(
+    request: Request,
     current_user: dict = Depends(get_current_user)
 ):
     """Get user's KYC status"""
@@ -55,30 +129,75 @@ async def get_my_kyc_status(
         if not kyc:
             raise HTTPException(status_code=404, detail='No KYC document found')
         
-        return KYCDocument(**kyc)
+        return kyc_response(request, kyc)
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f'Get KYC status error: {str(e)}')
         raise HTTPException(status_code=500, detail='Failed to get KYC status')
 
-@router.get('/pending', response_model=List[KYCDocument])
+@router.get('/pending', response_model=List[KYCDocumentResponse])
 async def get_pending_kyc(
+    request: Request,
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=100),
+    cursor: Optional[Cursor] = Depends(page_cursor),
     current_user: dict = Depends(require_admin())
 ):
-    """Get pending KYC documents (Admin review queue)"""
+    """Get pending KYC documents (Admin review queue, with thumbnail URLs)"""
     try:
-        kyc_docs = await db.kyc_documents.find(
-            {'status': 'pending'}
-        ).sort('created_at', 1).skip(skip).limit(limit).to_list(limit)
+        # Oldest first: the review queue is worked in submission order
+        kyc_docs = await fetch_page(
+            db.kyc_documents, {'status': 'pending'}, response,
+            cursor=cursor, skip=skip, limit=limit, direction=ASCENDING
+        )
         
-        return [KYCDocument(**doc) for doc in kyc_docs]
+        return [kyc_response(request, doc) for doc in kyc_docs]
     except Exception as e:
         logger.error(f'Get pending KYC error: {str(e)}')
         raise HTTPException(status_code=500, detail='Failed to get pending KYC')
 
+@router.get('/{kyc_id}/files/{field}')
+async def get_kyc_file(
+    kyc_id: str,
+    field: Literal['document_front', 'document_back', 'selfie'],
+    request: Request,
+    variant: Literal['original', 'preview', 'thumbnail'] = Query('original'),
+    current_user: dict = Depends(get_current_user)
+):
+    """Stream one KYC image or its preview/thumbnail (owner or admin); supports Range requests"""
+    try:
+        kyc = await db.kyc_documents.find_one(
+            {'id': kyc_id}, {'_id': 0, 'user_id': 1, field: 1, f'variants.{field}': 1}
+        )
+        
+        if not kyc:
+            raise HTTPException(status_code=404, detail='KYC document not found')
+        
+        if current_user['role'] not in ['admin', 'master_admin'] and kyc['user_id'] != current_user['user_id']:
+            raise HTTPException(status_code=403, detail='Access denied')
+        
+        if not kyc.get(field):
+            raise HTTPException(status_code=404, detail='File not found')
+        
+        ref = await resolve_variant(
+            db.kyc_documents, kyc_id, f'variants.{field}', BlobRef(**kyc[field]),
+            kyc.get('variants', {}).get(field, {}), variant
+        )
+        if ref is None:
+            raise HTTPException(status_code=404, detail=f'No {variant} for this file')
+        
+        return await blob_response(ref, request, filename=f'{kyc_id}-{field}')
+    except HTTPException:
+        raise
+    except BlobNotFoundError:
+        logger.error(f'KYC file missing from blob store: {kyc_id} {field}')
+        raise HTTPException(status_code=404, detail='File not found')
+    except Exception as e:
+        logger.error(f'Get KYC file error: {str(e)}')
+        raise HTTPException(status_code=500, detail='Failed to get KYC file')
+
 @router.patch('/{kyc_id}/approve')
 async def approve_kyc(
     kyc_id: str,
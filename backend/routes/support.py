@@ -1,7 +1,12 @@
-from fastapi import APIRouter, HTTPException, Depends, status, Query
+from fastapi import APIRouter, HTTPException, Depends, status, Query, Response
+from pymongo import ASCENDING
 from config.database import db
-from models.support import Ticket, TicketCreate, TicketMessage
+from models.support import Ticket, TicketCreate, TicketMessage, TicketSummary
 from middleware.auth import get_current_user, require_admin
+from utils.pagination import Cursor, fetch_page, page_cursor
+from utils.projection import FieldSet
+from utils.ticket_messages import add_message
+from utils.transactions import run_in_transaction
 from typing import List, Optional
 from datetime import datetime
 import logging
@@ -10,6 +15,8 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix='/support', tags=['Support'])
 
+TICKET_FIELDS = FieldSet(TicketSummary)
+
 @router.post('/tickets', response_model=Ticket, status_code=status.HTTP_201_CREATED)
 async def create_ticket(
     ticket_data: TicketCreate,
@@ -17,22 +24,28 @@ async def create_ticket(
 ):
     """Create support ticket"""
     try:
+        ticket = Ticket(
+            user_id=current_user['user_id'],
+            subject=ticket_data.subject,
+            category=ticket_data.category,
+            priority=ticket_data.priority
+        )
+        
         # Create initial message
         initial_message = TicketMessage(
+            ticket_id=ticket.id,
             message=ticket_data.message,
             sender_id=current_user['user_id'],
             is_admin=False
         )
+        ticket.message_count = 1
+        ticket.last_message = initial_message
         
-        ticket = Ticket(
-            user_id=current_user['user_id'],
-            subject=ticket_data.subject,
-            category=ticket_data.category,
-            priority=ticket_data.priority,
-            messages=[initial_message]
-        )
+        async def record(session):
+            await db.tickets.insert_one(ticket.dict(), session=session)
+            await db.ticket_messages.insert_one(initial_message.dict(), session=session)
         
-        await db.tickets.insert_one(ticket.dict())
+        await run_in_transaction(record)
         
         logger.info(f'Ticket created: {ticket.id} by {current_user["user_id"]}')
         
@@ -41,15 +54,18 @@ async def create_ticket(
         logger.error(f'Create ticket error: {str(e)}')
         raise HTTPException(status_code=500, detail='Failed to create ticket')
 
-@router.get('/tickets', response_model=List[Ticket])
+@router.get('/tickets', response_model=List[TicketSummary])
 async def get_tickets(
+    response: Response,
     status: Optional[str] = Query(None),
     category: Optional[str] = Query(None),
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=100),
+    cursor: Optional[Cursor] = Depends(page_cursor),
+    fields: Optional[List[str]] = Depends(TICKET_FIELDS),
     current_user: dict = Depends(get_current_user)
 ):
-    """Get tickets (role-based filtering)"""
+    """Get tickets (role-based filtering); threads are on /tickets/{id}/messages"""
     try:
         filter_query = {}
         
@@ -63,9 +79,14 @@ async def get_tickets(
         if category:
             filter_query['category'] = category
         
-        tickets = await db.tickets.find(filter_query).sort('updated_at', -1).skip(skip).limit(limit).to_list(limit)
+        # Most recently active first, so the keyset runs over (updated_at, id)
+        tickets = await fetch_page(
+            db.tickets, filter_query, response,
+            cursor=cursor, skip=skip, limit=limit, sort_field='updated_at',
+            projection=TICKET_FIELDS.projection(fields, required=('id', 'updated_at'))
+        )
         
-        return [Ticket(**t) for t in tickets]
+        return TICKET_FIELDS.respond(tickets, fields, response=response)
     except Exception as e:
         logger.error(f'Get tickets error: {str(e)}')
         raise HTTPException(status_code=500, detail='Failed to get tickets')
@@ -93,6 +114,38 @@ async def get_ticket(
         logger.error(f'Get ticket error: {str(e)}')
         raise HTTPException(status_code=500, detail='Failed to get ticket')
 
+@router.get('/tickets/{ticket_id}/messages', response_model=List[TicketMessage])
+async def get_ticket_messages(
+    ticket_id: str,
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=100),
+    cursor: Optional[Cursor] = Depends(page_cursor),
+    current_user: dict = Depends(get_current_user)
+):
+    """Get a ticket's thread, oldest first"""
+    try:
+        ticket = await db.tickets.find_one({'id': ticket_id}, {'_id': 0, 'user_id': 1})
+        
+        if not ticket:
+            raise HTTPException(status_code=404, detail='Ticket not found')
+        
+        # Check access
+        if current_user['role'] == 'user' and ticket['user_id'] != current_user['user_id']:
+            raise HTTPException(status_code=403, detail='Access denied')
+        
+        messages = await fetch_page(
+            db.ticket_messages, {'ticket_id': ticket_id}, response,
+            cursor=cursor, skip=skip, limit=limit, direction=ASCENDING, projection={'_id': 0}
+        )
+        
+        return [TicketMessage(**m) for m in messages]
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f'Get ticket messages error: {str(e)}')
+        raise HTTPException(status_code=500, detail='Failed to get ticket messages')
+
 @router.post('/tickets/{ticket_id}/reply')
 async def reply_to_ticket(
     ticket_id: str,
@@ -101,7 +154,7 @@ async def reply_to_ticket(
 ):
     """Reply to ticket"""
     try:
-        ticket = await db.tickets.find_one({'id': ticket_id})
+        ticket = await db.tickets.find_one({'id': ticket_id}, {'_id': 0, 'user_id': 1, 'status': 1})
         
         if not ticket:
             raise HTTPException(status_code=404, detail='Ticket not found')
@@ -113,30 +166,22 @@ async def reply_to_ticket(
         
         # Create message
         new_message = TicketMessage(
+            ticket_id=ticket_id,
             message=message,
             sender_id=current_user['user_id'],
             is_admin=is_admin
         )
         
-        # Update ticket
-        await db.tickets.update_one(
-            {'id': ticket_id},
-            {
-                '$push': {'messages': new_message.dict()},
-                '$set': {'updated_at': datetime.utcnow()}
-            }
-        )
-        
         # If admin replied, set status to in_progress
+        ticket_update = {}
         if is_admin and ticket['status'] == 'open':
-            await db.tickets.update_one(
-                {'id': ticket_id},
-                {'$set': {'status': 'in_progress', 'assigned_to': current_user['user_id']}}
-            )
+            ticket_update = {'status': 'in_progress', 'assigned_to': current_user['user_id']}
+        
+        await add_message(ticket_id, new_message, ticket_update)
         
         logger.info(f'Reply added to ticket: {ticket_id} by {current_user["user_id"]}')
         
-        return {'message': 'Reply added successfully', 'ticket_id': ticket_id}
+        return {'message': 'Reply added successfully', 'ticket_id': ticket_id, 'message_id': new_message.id}
     except HTTPException:
         raise
     except Exception as e:
@@ -3,7 +3,10 @@ from fastapi import APIRouter, HTTPException, Depends, status, Query
 
 from models.user import UserCreate, UserUpdate, UserResponse, UserInDB
 from models.wallet import Wallet
-from utils.security import get_password_hash
+from utils.hashing import hash_password
+from utils.wallet import get_main_balances, get_main_balance
+from utils.hierarchy import build_ancestors, downline_filter, in_downline
+from utils.sessions import revoke_user_sessions
 from middleware.auth import get_current_user, require_master_admin, require_admin, require_agent
 from config.settings import settings
 from typing import List, Optional
@@ -35,8 +38,8 @@ async def list_users(
         
         # Role-based filtering
         if current_user['role'] == 'agent':
-            # Agents can only see users they created
-            filter_query['created_by'] = current_user['user_id']
+            # Agents can only see their own downline
+            filter_query.update(downline_filter(current_user['user_id']))
         elif current_user['role'] == 'admin':
             # Admins can see agents and users
             filter_query['role'] = {'$in': ['agent', 'user']}
@@ -51,16 +54,15 @@ async def list_users(
         # Get users
         users = await db.users.find(filter_query).skip(skip).limit(limit).to_list(limit)
         
-        # Get wallet balances
+        # Get wallet balances for the whole page in one query
+        balances = await get_main_balances([u['id'] for u in users])
+        
         result = []
         for user in users:
             user.pop('hashed_password', None)
             user.pop('totp_secret', None)
             
-            wallets = await db.wallets.find({'user_id': user['id']}).to_list(10)
-            total_balance = sum([w.get('balance', 0) for w in wallets if w.get('wallet_type') == 'main_coin'])
-            
-            result.append(UserResponse(**user, wallet_balance=total_balance))
+            result.append(UserResponse(**user, wallet_balance=balances[user['id']]))
         
         return result
     
@@ -104,8 +106,9 @@ async def create_user(
         
         user_in_db = UserInDB(
             **user_dict,
-            hashed_password=get_password_hash(password),
-            created_by=current_user['user_id']
+            hashed_password=await hash_password(password),
+            created_by=current_user['user_id'],
+            ancestors=await build_ancestors(current_user['user_id'])
         )
         
         # Insert into database
@@ -152,7 +155,7 @@ async def get_user(
         
         # Check access permissions
         if current_user['role'] == 'agent':
-            if user['created_by'] != current_user['user_id'] and user['id'] != current_user['user_id']:
+            if not in_downline(current_user, user) and user['id'] != current_user['user_id']:
                 raise HTTPException(
                     status_code=status.HTTP_403_FORBIDDEN,
                     detail='Access denied'
@@ -165,8 +168,7 @@ async def get_user(
                 )
         
         # Get wallet balance
-        wallets = await db.wallets.find({'user_id': user['id']}).to_list(10)
-        total_balance = sum([w.get('balance', 0) for w in wallets if w.get('wallet_type') == 'main_coin'])
+        total_balance = await get_main_balance(user['id'])
         
         user.pop('hashed_password', None)
         user.pop('totp_secret', None)
@@ -201,7 +203,7 @@ async def update_user(
         
         # Check permissions
         if current_user['role'] == 'agent':
-            if user['created_by'] != current_user['user_id']:
+            if not in_downline(current_user, user):
                 raise HTTPException(
                     status_code=status.HTTP_403_FORBIDDEN,
                     detail='Access denied'
@@ -226,8 +228,7 @@ async def update_user(
         updated_user = await db.users.find_one({'id': user_id})
         
         # Get wallet balance
-        wallets = await db.wallets.find({'user_id': user_id}).to_list(10)
-        total_balance = sum([w.get('balance', 0) for w in wallets if w.get('wallet_type') == 'main_coin'])
+        total_balance = await get_main_balance(user_id)
         
         updated_user.pop('hashed_password', None)
         updated_user.pop('_id', None)
@@ -277,6 +278,10 @@ async def suspend_user(
             {'$set': {'is_active': new_status}}
         )
         
+        # A suspended user is signed out everywhere
+        if not new_status:
+            await revoke_user_sessions(user_id)
+        
         logger.info(f'User {"suspended" if not new_status else "activated"}: {user_id} by {current_user["user_id"]}')
         
         return {
@@ -317,7 +322,8 @@ async def change_user_role(
                 detail='User not found'
             )
         
-        # Update role
+        # Update role. The user keeps its place in the hierarchy (ancestors
+        # follow created_by, not role), so no paths or scope_ids change.
         await db.users.update_one(
             {'id': user_id},
             {'$set': {'role': new_role, 'updated_at': datetime.utcnow()}}
@@ -1,8 +1,12 @@
 from config.database import db
-from fastapi import APIRouter, HTTPException, Depends, status, Query
+from fastapi import APIRouter, HTTPException, Depends, status, Query, Response
 
-from models.wallet import WalletResponse, Transaction, TransactionCreate
-from middleware.auth import get_current_user, require_master_admin
+from models.wallet import WalletResponse, Transaction, TransactionCreate, LedgerEntry
+from models.money import ZERO
+from middleware.auth import get_current_user, require_master_admin, require_admin
+from utils.ledger import get_wallet_balances
+from utils.hierarchy import in_downline
+from utils.pagination import Cursor, fetch_page, page_cursor
 from config.settings import settings
 from typing import List, Optional
 from datetime import datetime
@@ -19,15 +23,12 @@ async def get_my_balance(
 ):
     """Get current user's wallet balance"""
     try:
-        wallets = await db.wallets.find({'user_id': current_user['user_id']}).to_list(10)
+        # Ledger is the source of truth: newest snapshot plus entries since
+        balance_map = await get_wallet_balances(current_user['user_id'])
         
-        balance_map = {}
-        for wallet in wallets:
-            balance_map[wallet['wallet_type']] = wallet.get('balance', 0.0)
-        
-        main_coin = balance_map.get('main_coin', 0.0)
-        bonus = balance_map.get('bonus', 0.0)
-        locked = balance_map.get('locked', 0.0)
+        main_coin = balance_map.get('main_coin', ZERO)
+        bonus = balance_map.get('bonus', ZERO)
+        locked = balance_map.get('locked', ZERO)
         
         return WalletResponse(
             user_id=current_user['user_id'],
@@ -47,10 +48,11 @@ async def get_my_balance(
 @router.get('/{user_id}', response_model=WalletResponse)
 async def get_user_balance(
     user_id: str,
+    at: Optional[datetime] = Query(None, description='Balance as of this time (default: now)'),
     current_user: dict = Depends(get_current_user),
     
 ):
-    """Get user balance (role-based access)"""
+    """Get user balance, optionally at a past point in time (role-based access)"""
     try:
         # Check permissions
         if current_user['role'] == 'user' and current_user['user_id'] != user_id:
@@ -60,23 +62,19 @@ async def get_user_balance(
             )
         
         if current_user['role'] == 'agent':
-            # Check if user was created by this agent
-            user = await db.users.find_one({'id': user_id})
-            if not user or user.get('created_by') != current_user['user_id']:
+            # Agents see balances anywhere in their downline
+            user = await db.users.find_one({'id': user_id}, {'_id': 0, 'ancestors': 1})
+            if not user or (user_id != current_user['user_id'] and not in_downline(current_user, user)):
                 raise HTTPException(
                     status_code=status.HTTP_403_FORBIDDEN,
                     detail='Access denied'
                 )
         
-        wallets = await db.wallets.find({'user_id': user_id}).to_list(10)
-        
-        balance_map = {}
-        for wallet in wallets:
-            balance_map[wallet['wallet_type']] = wallet.get('balance', 0.0)
+        balance_map = await get_wallet_balances(user_id, at)
         
-        main_coin = balance_map.get('main_coin', 0.0)
-        bonus = balance_map.get('bonus', 0.0)
-        locked = balance_map.get('locked', 0.0)
+        main_coin = balance_map.get('main_coin', ZERO)
+        bonus = balance_map.get('bonus', ZERO)
+        locked = balance_map.get('locked', ZERO)
         
         return WalletResponse(
             user_id=user_id,
@@ -94,3 +92,32 @@ async def get_user_balance(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail='Failed to get user balance'
         )
+
+@router.get('/{user_id}/ledger', response_model=List[LedgerEntry])
+async def get_ledger(
+    response: Response,
+    user_id: str,
+    wallet_type: Optional[str] = Query(None),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=100),
+    cursor: Optional[Cursor] = Depends(page_cursor),
+    current_user: dict = Depends(require_admin())
+):
+    """Ledger statement for a user's wallets, newest first (Admin only)"""
+    try:
+        filter_query = {'user_id': user_id}
+        if wallet_type:
+            filter_query['wallet_type'] = wallet_type
+        
+        entries = await fetch_page(
+            db.ledger_entries, filter_query, response,
+            cursor=cursor, skip=skip, limit=limit, projection={'_id': 0}
+        )
+        
+        return [LedgerEntry(**e) for e in entries]
+    except Exception as e:
+        logger.error(f'Get ledger error: {str(e)}')
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail='Failed to get ledger'
+        )
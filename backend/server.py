@@ -1,13 +1,28 @@
 from fastapi import FastAPI, APIRouter
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
+import asyncio
 import os
 import logging
 from pathlib import Path
 from config.database import db, close_database
+from utils.platform_stats import ensure_platform_stats
+from utils.hierarchy import ensure_hierarchy
+from utils.indexes import ensure_indexes
+from utils.cache import config_cache
+from utils.hashing import hashing_pool
+from utils.thumbnails import thumbnail_pool
+from utils.sessions import revoked_sessions
+from utils.ledger import ensure_ledger, run_snapshot_loop
+from utils.money import ensure_money
+from utils.blob_migration import ensure_blobs
+from utils.ticket_messages import ensure_ticket_messages
+from utils.transactions import transactions_supported
+from config.settings import settings
+from utils.pagination import NEXT_CURSOR_HEADER
 
 # Import routes
-from routes import auth, users, wallets, coins, games, bets, deposits, kyc, support, config, dashboard
+from routes import auth, users, wallets, coins, games, bets, deposits, kyc, support, config, dashboard, exports
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -39,6 +54,7 @@ api_router.include_router(kyc.router)
 api_router.include_router(support.router)
 api_router.include_router(config.router)
 api_router.include_router(dashboard.router)
+api_router.include_router(exports.router)
 
 # Include the router in the main app
 app.include_router(api_router)
@@ -49,6 +65,7 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 # Configure logging
@@ -63,32 +80,77 @@ async def startup_event():
     logger.info("KarnaliX API Server starting up...")
     logger.info(f"Database: {os.environ.get('DB_NAME', 'karnalix_db')}")
     
-    # Create indexes
+    # Create any registered indexes that are missing (see config/indexes.py)
     try:
-        await db.users.create_index("email", unique=True)
-        await db.users.create_index("username", unique=True)
-        await db.users.create_index("role")
-        await db.wallets.create_index([("user_id", 1), ("wallet_type", 1)])
-        await db.transactions.create_index("from_user_id")
-        await db.transactions.create_index("to_user_id")
-        await db.transactions.create_index("created_at")
-        await db.game_providers.create_index("name")
-        await db.games.create_index("category")
-        await db.games.create_index("is_active")
-        await db.bets.create_index("user_id")
-        await db.bets.create_index("status")
-        await db.deposits.create_index("user_id")
-        await db.deposits.create_index("status")
-        await db.withdrawals.create_index("user_id")
-        await db.withdrawals.create_index("status")
-        await db.kyc_documents.create_index("user_id")
-        await db.tickets.create_index("user_id")
-        logger.info("Database indexes created")
+        await ensure_indexes()
     except Exception as e:
         logger.warning(f"Index creation warning: {str(e)}")
+    
+    # Detect transaction support now so a standalone mongod is reported at
+    # startup rather than on the first refused ledger write
+    try:
+        await transactions_supported()
+    except Exception as e:
+        logger.warning(f"Transaction support check warning: {str(e)}")
+    
+    # Convert money fields stored as doubles before anything sums them
+    try:
+        await ensure_money()
+    except Exception as e:
+        logger.warning(f"Money migration warning: {str(e)}")
+    
+    # Backfill ancestors/scope_ids if this deployment predates them
+    try:
+        await ensure_hierarchy()
+    except Exception as e:
+        logger.warning(f"Hierarchy backfill warning: {str(e)}")
+    
+    # Build the ledger rollups if this deployment predates them
+    try:
+        await ensure_platform_stats()
+    except Exception as e:
+        logger.warning(f"Platform stats warning: {str(e)}")
+    
+    # Open the ledger from current wallet balances if this deployment predates it
+    try:
+        await ensure_ledger()
+    except Exception as e:
+        logger.warning(f"Ledger backfill warning: {str(e)}")
+    
+    # Move files stored inline as base64 into the blob store
+    try:
+        await ensure_blobs()
+    except Exception as e:
+        logger.warning(f"Blob migration warning: {str(e)}")
+    
+    # Move ticket threads out of their embedded messages arrays
+    try:
+        await ensure_ticket_messages()
+    except Exception as e:
+        logger.warning(f"Ticket message migration warning: {str(e)}")
+    
+    # Pick up config cache invalidations published by other workers
+    app.state.cache_sync = asyncio.create_task(
+        config_cache.run_sync_loop(settings.CONFIG_CACHE_SYNC_SECONDS)
+    )
+    
+    # Mirror session revocations from other workers into the in-memory set
+    app.state.session_sync = asyncio.create_task(
+        revoked_sessions.run_sync_loop(settings.SESSION_SYNC_SECONDS)
+    )
+    
+    # Periodic ledger balance snapshots
+    app.state.ledger_snapshots = asyncio.create_task(
+        run_snapshot_loop(settings.LEDGER_SNAPSHOT_INTERVAL_SECONDS)
+    )
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    app.state.cache_sync.cancel()
+    app.state.session_sync.cancel()
+    app.state.ledger_snapshots.cancel()
+    hashing_pool.shutdown()
+    thumbnail_pool.shutdown()
     close_database()
     logger.info("KarnaliX API Server shutting down...")
 
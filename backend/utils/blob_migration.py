@@ -0,0 +1,84 @@
+from pymongo import UpdateOne
+from config.database import db
+from utils.blobstore import InvalidBlobError, decode_base64_file, put_blob
+from utils.migrations import run_migration
+from datetime import datetime
+from typing import Dict, List
+import logging
+
+logger = logging.getLogger(__name__)
+
+# File fields that used to hold base64 strings inline, per collection.
+# migrate_blobs() moves each string into the blob store and leaves a
+# BlobRef in its place.
+BLOB_FIELDS: Dict[str, List[str]] = {
+    'kyc_documents': ['document_front', 'document_back', 'selfie'],
+    'deposits': ['screenshot'],
+}
+
+MIGRATION_ID = 'blobs_out_of_mongo'
+
+async def _to_ref(payload: str) -> dict:
+    try:
+        # Keep files of any type; blob_response serves unaccepted ones as downloads
+        data, content_type = decode_base64_file(payload, max_bytes=len(payload), check_type=False)
+    except InvalidBlobError:
+        # Keep whatever was stored rather than lose it
+        data, content_type = payload.encode('utf-8'), 'application/octet-stream'
+    return (await put_blob(data, content_type)).dict()
+
+async def migrate_blobs(batch_size: int = 50, dry_run: bool = False) -> Dict[str, int]:
+    """Move inline base64 file fields into the blob store.
+
+    Documents are read a small batch at a time (they can be megabytes
+    each) and each update is conditional on the field still being a
+    string. Safe to re-run; returns converted documents per collection.
+    """
+    counts = {}
+    for name, fields in BLOB_FIELDS.items():
+        collection = db[name]
+        counts[name] = 0
+        ops = []
+        query = {'$or': [{field: {'$type': 'string'}} for field in fields]}
+        projection = {'_id': 1, **{field: 1 for field in fields}}
+
+        async for doc in collection.find(query, projection).batch_size(batch_size):
+            strings = {f: doc[f] for f in fields if isinstance(doc.get(f), str)}
+            if not strings:
+                continue
+            if dry_run:
+                counts[name] += 1
+                continue
+            refs = {f: await _to_ref(v) for f, v in strings.items()}
+            ops.append(UpdateOne(
+                {'_id': doc['_id'], **{f: {'$type': 'string'} for f in strings}},
+                {'$set': refs}
+            ))
+            if len(ops) >= batch_size:
+                counts[name] += (await collection.bulk_write(ops, ordered=False)).modified_count
+                ops = []
+        if ops:
+            counts[name] += (await collection.bulk_write(ops, ordered=False)).modified_count
+
+    if not dry_run:
+        await db.migrations.update_one(
+            {'_id': MIGRATION_ID},
+            {'$set': {'completed_at': datetime.utcnow(), 'counts': counts}},
+            upsert=True
+        )
+    return counts
+
+async def _blobs_pending() -> bool:
+    done = await db.migrations.find_one({'_id': MIGRATION_ID}, {'counts': 1})
+    # Re-run when a collection was added to BLOB_FIELDS since the last run
+    return not (done and set(BLOB_FIELDS) <= set(done.get('counts', {})))
+
+async def _migrate():
+    logger.info('Inline files not migrated yet, moving them to the blob store')
+    counts = await migrate_blobs()
+    logger.info(f'Blob migration: {counts}')
+    return counts
+
+async def ensure_blobs():
+    """Run the blob migration once (on one worker) for deployments that stored files inline"""
+    await run_migration(MIGRATION_ID, _blobs_pending, _migrate)
@@ -0,0 +1,309 @@
+from fastapi import HTTPException, Request, status
+from fastapi.responses import Response, StreamingResponse
+from config.settings import settings
+from models.blob import BlobRef
+from pathlib import Path
+from typing import AsyncIterator, Optional, Tuple
+import asyncio
+import base64
+import binascii
+import hashlib
+import os
+import re
+import shutil
+import uuid
+
+# Content-addressed file storage. A blob's key is the SHA-256 of its bytes,
+# so storing the same file twice writes it once, and a key never changes
+# meaning: responses can be cached forever and the key doubles as the ETag.
+# Mongo documents only keep a BlobRef (key, size, content type).
+#
+# Backends are picked by BLOB_STORE: ``local`` (a sharded directory tree,
+# the default) or ``s3`` (any S3-compatible endpoint through boto3).
+
+CHUNK_SIZE = 64 * 1024
+
+class BlobNotFoundError(ValueError):
+    """No blob stored under the key"""
+
+class InvalidBlobError(ValueError):
+    """Upload payload is not decodable, too large or of a type we do not accept"""
+
+_MAGIC = [
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'GIF8', 'image/gif'),
+    (b'%PDF', 'application/pdf'),
+]
+
+def sniff_content_type(data: bytes) -> str:
+    for magic, content_type in _MAGIC:
+        if data.startswith(magic):
+            return content_type
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    return 'application/octet-stream'
+
+# Uploads are accepted only when their bytes sniff as one of these; the
+# type a client declares is never trusted (it could say text/html)
+ALLOWED_CONTENT_TYPES = frozenset({'image/jpeg', 'image/png', 'image/webp', 'application/pdf'})
+
+def allowed_content_type(data: bytes) -> str:
+    """Sniffed type of an upload's first bytes, if it is one we accept"""
+    content_type = sniff_content_type(data)
+    if content_type not in ALLOWED_CONTENT_TYPES:
+        raise InvalidBlobError('Unsupported file type: upload a JPEG, PNG, WebP or PDF file')
+    return content_type
+
+_DATA_URL = re.compile(r'^data:([\w.+-]+/[\w.+-]+)?(;[^,]*)?,', re.ASCII)
+
+def decode_base64_file(payload: str, max_bytes: int, check_type: bool = True) -> Tuple[bytes, str]:
+    """Decode a base64 string or data: URL into (bytes, sniffed content type).
+
+    The data: URL's media type is ignored. Unless ``check_type`` is off
+    (migrating files already stored), types outside ALLOWED_CONTENT_TYPES
+    are rejected.
+    """
+    match = _DATA_URL.match(payload)
+    if match:
+        payload = payload[match.end():]
+    # Cheap size check before decoding (4 base64 chars per 3 bytes)
+    if len(payload) * 3 // 4 > max_bytes + 3:
+        raise InvalidBlobError(f'File exceeds {max_bytes} bytes')
+    try:
+        data = base64.b64decode(payload, validate=True)
+    except (binascii.Error, ValueError):
+        raise InvalidBlobError('File is not valid base64')
+    if not data:
+        raise InvalidBlobError('File is empty')
+    if len(data) > max_bytes:
+        raise InvalidBlobError(f'File exceeds {max_bytes} bytes')
+    return data, allowed_content_type(data) if check_type else sniff_content_type(data)
+
+class LocalBlobStore:
+    """Blobs as files under ``root/ab/cd/<sha256>``"""
+    name = 'local'
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / key[2:4] / key
+
+    def _write(self, key: str, data: bytes) -> bool:
+        path = self._path(key)
+        if path.exists():
+            return False
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write aside and rename so readers never see a partial file
+        tmp = path.with_name(f'.{key}.{uuid.uuid4().hex}.tmp')
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+        return True
+
+    async def put(self, key: str, data: bytes) -> bool:
+        return await asyncio.to_thread(self._write, key, data)
+
+    def _move(self, key: str, source: Path) -> bool:
+        path = self._path(key)
+        if path.exists():
+            source.unlink(missing_ok=True)
+            return False
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f'.{key}.{uuid.uuid4().hex}.tmp')
+        shutil.move(str(source), tmp)
+        os.replace(tmp, path)
+        return True
+
+    async def put_path(self, key: str, source: Path) -> bool:
+        """Store a file already on disk, moving it into place (the source is consumed)"""
+        return await asyncio.to_thread(self._move, key, source)
+
+    async def size(self, key: str) -> int:
+        try:
+            return (await asyncio.to_thread(self._path(key).stat)).st_size
+        except FileNotFoundError:
+            raise BlobNotFoundError(key)
+
+    async def iter_range(self, key: str, start: int, end: int) -> AsyncIterator[bytes]:
+        """Bytes ``start``..``end`` inclusive, in chunks"""
+        try:
+            f = await asyncio.to_thread(open, self._path(key), 'rb')
+        except FileNotFoundError:
+            raise BlobNotFoundError(key)
+        try:
+            await asyncio.to_thread(f.seek, start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = await asyncio.to_thread(f.read, min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+        finally:
+            await asyncio.to_thread(f.close)
+
+class S3BlobStore:
+    """Blobs as objects ``<prefix><sha256>`` in an S3-compatible bucket"""
+    name = 's3'
+
+    def __init__(self, bucket: str, prefix: str = '', endpoint_url: Optional[str] = None,
+                 region: Optional[str] = None):
+        # boto3 is only needed when this backend is configured
+        import boto3
+        from botocore.exceptions import ClientError
+        self._client_error = ClientError
+        self.client = boto3.client('s3', endpoint_url=endpoint_url or None, region_name=region or None)
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def _missing(self, error) -> bool:
+        return error.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound')
+
+    async def size(self, key: str) -> int:
+        try:
+            head = await asyncio.to_thread(self.client.head_object, Bucket=self.bucket, Key=self.prefix + key)
+        except self._client_error as e:
+            if self._missing(e):
+                raise BlobNotFoundError(key)
+            raise
+        return head['ContentLength']
+
+    async def put(self, key: str, data: bytes) -> bool:
+        try:
+            await self.size(key)
+            return False
+        except BlobNotFoundError:
+            pass
+        await asyncio.to_thread(
+            self.client.put_object, Bucket=self.bucket, Key=self.prefix + key, Body=data,
+            ChecksumSHA256=base64.b64encode(bytes.fromhex(key)).decode('ascii')
+        )
+        return True
+
+    async def put_path(self, key: str, source: Path) -> bool:
+        try:
+            try:
+                await self.size(key)
+                return False
+            except BlobNotFoundError:
+                pass
+            # upload_file streams the file in parts instead of reading it whole
+            await asyncio.to_thread(self.client.upload_file, str(source), self.bucket, self.prefix + key)
+            return True
+        finally:
+            source.unlink(missing_ok=True)
+
+    async def iter_range(self, key: str, start: int, end: int) -> AsyncIterator[bytes]:
+        try:
+            obj = await asyncio.to_thread(
+                self.client.get_object, Bucket=self.bucket, Key=self.prefix + key, Range=f'bytes={start}-{end}'
+            )
+        except self._client_error as e:
+            if self._missing(e):
+                raise BlobNotFoundError(key)
+            raise
+        body = obj['Body']
+        try:
+            while True:
+                chunk = await asyncio.to_thread(body.read, CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            body.close()
+
+_store = None
+
+def get_blob_store():
+    """The configured blob store (one per process)"""
+    global _store
+    if _store is None:
+        if settings.BLOB_STORE == 's3':
+            _store = S3BlobStore(
+                settings.BLOB_S3_BUCKET, settings.BLOB_S3_PREFIX,
+                settings.BLOB_S3_ENDPOINT_URL, settings.BLOB_S3_REGION
+            )
+        elif settings.BLOB_STORE == 'local':
+            _store = LocalBlobStore(settings.BLOB_LOCAL_PATH)
+        else:
+            raise ValueError(f'Unknown blob store: {settings.BLOB_STORE}')
+    return _store
+
+async def put_blob(data: bytes, content_type: Optional[str] = None) -> BlobRef:
+    """Store ``data`` (once, however often it is uploaded) and return its reference"""
+    key = hashlib.sha256(data).hexdigest()
+    await get_blob_store().put(key, data)
+    return BlobRef(key=key, size=len(data), content_type=content_type or sniff_content_type(data))
+
+async def read_blob(ref: BlobRef) -> bytes:
+    """Whole blob in memory (uploads are capped at BLOB_MAX_BYTES)"""
+    if not ref.size:
+        return b''
+    return b''.join([chunk async for chunk in get_blob_store().iter_range(ref.key, 0, ref.size - 1)])
+
+_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Single byte range from a Range header; None to serve the whole blob"""
+    match = _RANGE.match(header.strip())
+    if not match or (not match.group(1) and not match.group(2)):
+        # Multiple or malformed ranges: ignoring the header is allowed
+        return None
+    if not match.group(1):
+        # Suffix range: the last N bytes
+        length = int(match.group(2))
+        if length == 0:
+            raise HTTPException(
+                status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                headers={'Content-Range': f'bytes */{size}'}
+            )
+        return max(size - length, 0), size - 1
+    start = int(match.group(1))
+    end = int(match.group(2)) if match.group(2) else size - 1
+    if start >= size or end < start:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            headers={'Content-Range': f'bytes */{size}'}
+        )
+    return start, min(end, size - 1)
+
+async def blob_response(ref: BlobRef, request: Request, filename: Optional[str] = None) -> Response:
+    """Stream a blob with Range, ETag and long-lived private caching.
+
+    Only accepted image types are shown inline. Anything else, including
+    files stored before uploads were checked, is served as a download
+    and, outside the allowlist, as application/octet-stream.
+    """
+    store = get_blob_store()
+    size = await store.size(ref.key)
+    etag = f'"{ref.key}"'
+    content_type = ref.content_type if ref.content_type in ALLOWED_CONTENT_TYPES else 'application/octet-stream'
+    disposition = 'inline' if content_type.startswith('image/') else 'attachment'
+    headers = {
+        'Accept-Ranges': 'bytes',
+        'ETag': etag,
+        # Content-addressed: the bytes behind a key never change
+        'Cache-Control': 'private, max-age=31536000, immutable',
+        'X-Content-Type-Options': 'nosniff',
+        'Content-Disposition': f'{disposition}; filename="{filename}"' if filename else disposition
+    }
+
+    if request.headers.get('if-none-match') == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    byte_range = None
+    if_range = request.headers.get('if-range')
+    if 'range' in request.headers and (if_range is None or if_range == etag):
+        byte_range = _parse_range(request.headers['range'], size)
+
+    if byte_range is None:
+        start, end, status_code = 0, size - 1, status.HTTP_200_OK
+    else:
+        (start, end), status_code = byte_range, status.HTTP_206_PARTIAL_CONTENT
+        headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+    headers['Content-Length'] = str(end - start + 1)
+
+    body = store.iter_range(ref.key, start, end) if size else iter(())
+    return StreamingResponse(body, status_code=status_code, media_type=content_type, headers=headers)
@@ -0,0 +1,113 @@
+from pymongo import ReturnDocument
+from config.database import db
+from config.settings import settings
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Per-worker TTL cache for admin-edited configuration. Entries are grouped
+# into namespaces (one per config collection) so a write only drops the
+# data it can affect. Invalidations are published by bumping a version
+# counter in ``cache_versions``; every worker polls those counters and
+# clears the namespaces that moved, so all uvicorn workers converge within
+# one sync interval instead of waiting out the TTL.
+
+class TTLCache:
+    def __init__(self, ttl: float, versions_collection: str = 'cache_versions'):
+        self.ttl = ttl
+        self.versions_collection = versions_collection
+        self._entries: Dict[str, Dict[Hashable, Tuple[float, Any]]] = {}
+        self._inflight: Dict[Tuple[str, Hashable], asyncio.Future] = {}
+        # Local generation per namespace; a load that started before an
+        # invalidation must not write its (possibly stale) result back
+        self._generations: Dict[str, int] = {}
+        self._seen_versions: Dict[str, int] = {}
+        self._synced = False
+        self.hits = 0
+        self.misses = 0
+
+    async def get_or_load(self, namespace: str, key: Hashable, loader: Callable[[], Awaitable[Any]],
+                          ttl: Optional[float] = None) -> Any:
+        """Return the cached value for ``(namespace, key)``, loading it on a miss.
+
+        Concurrent misses for the same key share a single ``loader`` call.
+        """
+        entry = self._entries.get(namespace, {}).get(key)
+        if entry and entry[0] > time.monotonic():
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        inflight = self._inflight.get((namespace, key))
+        if inflight:
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[(namespace, key)] = future
+        generation = self._generations.get(namespace, 0)
+        try:
+            value = await loader()
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so a miss with no waiters doesn't log a warning
+            future.exception()
+            raise
+        except BaseException:
+            future.cancel()
+            raise
+        finally:
+            self._inflight.pop((namespace, key), None)
+
+        if self._generations.get(namespace, 0) == generation:
+            expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+            self._entries.setdefault(namespace, {})[key] = (expires, value)
+        future.set_result(value)
+        return value
+
+    def clear_local(self, namespace: str):
+        self._entries.pop(namespace, None)
+        self._generations[namespace] = self._generations.get(namespace, 0) + 1
+
+    async def invalidate(self, *namespaces: str):
+        """Drop ``namespaces`` here and tell every other worker to do the same"""
+        for namespace in namespaces:
+            self.clear_local(namespace)
+            result = await db[self.versions_collection].find_one_and_update(
+                {'_id': namespace},
+                {'$inc': {'version': 1}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+            # Our own bump needn't trigger a second clear on the next poll
+            self._seen_versions[namespace] = result['version']
+
+    async def sync_invalidations(self):
+        """Clear namespaces whose published version moved since the last poll"""
+        docs = await db[self.versions_collection].find({}).to_list(None)
+        for doc in docs:
+            namespace, version = doc['_id'], doc.get('version', 0)
+            previous = self._seen_versions.get(namespace)
+            # The first poll only records a baseline; after that, a version
+            # we have never seen is as much a change as one that moved
+            if previous != version and (previous is not None or self._synced):
+                self.clear_local(namespace)
+            self._seen_versions[namespace] = version
+        self._synced = True
+
+    async def run_sync_loop(self, interval: float):
+        """Background task polling for invalidations from other workers"""
+        while True:
+            try:
+                await self.sync_invalidations()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f'Cache invalidation sync failed: {str(e)}')
+            await asyncio.sleep(interval)
+
+# Shared instance for configuration reads (system config, payment methods,
+# bonus rules, FAQs, banners, limits)
+config_cache = TTLCache(ttl=settings.CONFIG_CACHE_TTL_SECONDS)
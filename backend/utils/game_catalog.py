@@ -0,0 +1,59 @@
+from pydantic import TypeAdapter
+from config.database import db
+from models.game import Game
+from utils.cache import config_cache
+from typing import Dict, List, Optional
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# In-memory snapshot of the active game catalog. The snapshot lives in the
+# config cache under CATALOG_NAMESPACE, so game/provider writes invalidate
+# it on every worker through the same version counters; each snapshot
+# records the counter it was built from.
+CATALOG_NAMESPACE = 'game_catalog'
+
+_GAME_LIST = TypeAdapter(List[Game])
+_GAME = TypeAdapter(Game)
+
+class CatalogSnapshot:
+    def __init__(self, version: int, games: List[Game], providers: List[dict]):
+        self.version = version
+        self.games: Dict[str, Game] = {g.id: g for g in games}
+        self.active_provider_ids = {p['id'] for p in providers if p.get('is_active')}
+
+        by_category: Dict[str, List[Game]] = {}
+        for game in games:
+            by_category.setdefault(game.category, []).append(game)
+
+        # Response bodies are serialized once per snapshot, not per request
+        self.listings: Dict[Optional[str], bytes] = {None: _GAME_LIST.dump_json(games)}
+        for category, category_games in by_category.items():
+            self.listings[category] = _GAME_LIST.dump_json(category_games)
+        self.details: Dict[str, bytes] = {g.id: _GAME.dump_json(g) for g in games}
+
+    def listing(self, category: Optional[str] = None) -> bytes:
+        return self.listings.get(category, b'[]')
+
+async def _build_snapshot() -> CatalogSnapshot:
+    version_doc, games, providers = await asyncio.gather(
+        db.cache_versions.find_one({'_id': CATALOG_NAMESPACE}),
+        db.games.find({'is_active': True}, {'_id': 0}).to_list(None),
+        db.game_providers.find({}, {'_id': 0, 'id': 1, 'is_active': 1}).to_list(None)
+    )
+    snapshot = CatalogSnapshot(
+        version=(version_doc or {}).get('version', 0),
+        games=[Game(**g) for g in games],
+        providers=providers
+    )
+    logger.info(f'Game catalog snapshot v{snapshot.version}: {len(snapshot.games)} active games')
+    return snapshot
+
+async def get_catalog() -> CatalogSnapshot:
+    return await config_cache.get_or_load(CATALOG_NAMESPACE, 'snapshot', _build_snapshot)
+
+async def refresh_catalog() -> CatalogSnapshot:
+    """Invalidate the snapshot on every worker and rebuild it here right away"""
+    await config_cache.invalidate(CATALOG_NAMESPACE)
+    return await get_catalog()
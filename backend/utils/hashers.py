@@ -0,0 +1,151 @@
+import base64
+import bcrypt
+import hashlib
+import hmac
+import os
+from typing import Dict, Optional
+from config.settings import settings
+
+# Self-describing password hashes: ``<algorithm>$<params>$<salt>$<digest>``.
+# The algorithm and its cost parameters travel with every stored hash, so
+# verification never depends on current settings and raising the cost only
+# affects hashes written (or rehashed on login) from then on.
+#
+# Hashes written before this format are a bare 32-char salt followed by a
+# hex PBKDF2-SHA256 digest at 100000 iterations; they still verify and are
+# always reported as needing a rehash.
+
+def _b64(raw: bytes) -> str:
+    return base64.b64encode(raw).decode('ascii').rstrip('=')
+
+def _unb64(text: str) -> bytes:
+    return base64.b64decode(text + '=' * (-len(text) % 4))
+
+def _params(text: str) -> Dict[str, int]:
+    return {k: int(v) for k, v in (item.split('=', 1) for item in text.split(','))}
+
+class PBKDF2Hasher:
+    algorithm = 'pbkdf2_sha256'
+
+    @property
+    def iterations(self) -> int:
+        return settings.PBKDF2_ITERATIONS
+
+    def encode(self, password: str) -> str:
+        salt = os.urandom(16)
+        digest = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, self.iterations)
+        return f'{self.algorithm}$i={self.iterations}${_b64(salt)}${_b64(digest)}'
+
+    def verify(self, password: str, encoded: str) -> bool:
+        _, params, salt, digest = encoded.split('$')
+        expected = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), _unb64(salt), _params(params)['i'])
+        return hmac.compare_digest(expected, _unb64(digest))
+
+    def needs_update(self, encoded: str) -> bool:
+        return _params(encoded.split('$')[1])['i'] != self.iterations
+
+class BcryptHasher:
+    """bcrypt over a SHA-256 pre-hash, so passwords past bcrypt's 72-byte limit still count"""
+    algorithm = 'bcrypt_sha256'
+
+    @property
+    def rounds(self) -> int:
+        return settings.BCRYPT_ROUNDS
+
+    @staticmethod
+    def _prehash(password: str) -> bytes:
+        return hashlib.sha256(password.encode('utf-8')).hexdigest().encode('ascii')
+
+    def encode(self, password: str) -> str:
+        hashed = bcrypt.hashpw(self._prehash(password), bcrypt.gensalt(rounds=self.rounds)).decode('ascii')
+        # bcrypt's own string already carries cost and salt: $2b$<rounds>$<salt+digest>
+        return f'{self.algorithm}$r={self.rounds}${hashed}'
+
+    def verify(self, password: str, encoded: str) -> bool:
+        hashed = encoded.split('$', 2)[2]
+        return bcrypt.checkpw(self._prehash(password), hashed.encode('ascii'))
+
+    def needs_update(self, encoded: str) -> bool:
+        return _params(encoded.split('$')[1])['r'] != self.rounds
+
+class ScryptHasher:
+    algorithm = 'scrypt'
+
+    @property
+    def cost(self) -> Dict[str, int]:
+        return {'n': settings.SCRYPT_N, 'r': settings.SCRYPT_R, 'p': settings.SCRYPT_P}
+
+    @staticmethod
+    def _derive(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+        # maxmem must cover 128 * n * r bytes plus headroom
+        return hashlib.scrypt(password.encode('utf-8'), salt=salt, n=n, r=r, p=p,
+                              maxmem=256 * n * r + 1024 * 1024, dklen=32)
+
+    def encode(self, password: str) -> str:
+        cost = self.cost
+        salt = os.urandom(16)
+        digest = self._derive(password, salt, **cost)
+        params = ','.join(f'{k}={v}' for k, v in cost.items())
+        return f'{self.algorithm}${params}${_b64(salt)}${_b64(digest)}'
+
+    def verify(self, password: str, encoded: str) -> bool:
+        _, params, salt, digest = encoded.split('$')
+        expected = self._derive(password, _unb64(salt), **_params(params))
+        return hmac.compare_digest(expected, _unb64(digest))
+
+    def needs_update(self, encoded: str) -> bool:
+        return _params(encoded.split('$')[1]) != self.cost
+
+class LegacyPBKDF2Hasher:
+    """Pre-registry format: 32-char salt + hex PBKDF2-SHA256 digest, 100000 iterations"""
+    algorithm = 'legacy_pbkdf2'
+
+    def encode(self, password: str) -> str:
+        raise ValueError('Legacy hashes are verify-only')
+
+    def verify(self, password: str, encoded: str) -> bool:
+        salt, stored_hash = encoded[:32], encoded[32:]
+        new_hash = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt.encode('utf-8'), 100000).hex()
+        return hmac.compare_digest(new_hash, stored_hash)
+
+    def needs_update(self, encoded: str) -> bool:
+        return True
+
+HASHERS = {h.algorithm: h for h in (PBKDF2Hasher(), BcryptHasher(), ScryptHasher())}
+_LEGACY = LegacyPBKDF2Hasher()
+
+def register_hasher(hasher):
+    """Add (or replace) a hasher; it must expose algorithm, encode, verify and needs_update"""
+    HASHERS[hasher.algorithm] = hasher
+
+def identify_hasher(encoded: str):
+    algorithm = encoded.split('$', 1)[0] if '$' in encoded else None
+    if algorithm is None:
+        return _LEGACY
+    hasher = HASHERS.get(algorithm)
+    if hasher is None:
+        raise ValueError(f'Unknown password hash algorithm: {algorithm}')
+    return hasher
+
+def make_password(password: str, algorithm: Optional[str] = None) -> str:
+    return HASHERS[algorithm or settings.PASSWORD_HASHER].encode(password)
+
+def verify_hash(password: str, encoded: str) -> bool:
+    try:
+        return identify_hasher(encoded).verify(password, encoded)
+    except (ValueError, KeyError, IndexError):
+        # Unknown algorithm or a mangled hash never verifies
+        return False
+
+def needs_rehash(encoded: str) -> bool:
+    """True when ``encoded`` uses another algorithm or other cost parameters than configured"""
+    try:
+        hasher = identify_hasher(encoded)
+    except ValueError:
+        return False
+    if hasher.algorithm != settings.PASSWORD_HASHER:
+        return True
+    try:
+        return hasher.needs_update(encoded)
+    except (ValueError, KeyError, IndexError):
+        return True
@@ -0,0 +1,121 @@
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from config.database import db
+from config.settings import settings
+from utils.security import verify_password, get_password_hash
+from utils.hashers import needs_rehash
+from datetime import datetime
+from typing import Optional, Set
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Password hashing is CPU-bound (100k+ PBKDF2 rounds), so it never runs on
+# the event loop. Calls go to a dedicated executor - threads by default,
+# since hashlib releases the GIL, or processes via PASSWORD_HASH_EXECUTOR -
+# and a semaphore caps how many run at once. Callers beyond the cap wait
+# in line; queue depth and timings are reported at /dashboard/cache-stats.
+
+class HashingPool:
+    def __init__(self, kind: str, workers: int, max_concurrency: int):
+        self.kind = kind
+        self.workers = workers
+        self.max_concurrency = max_concurrency
+        self._executor: Optional[Executor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.in_flight = 0
+        self.waiting = 0
+        self.max_waiting = 0
+        self.completed = 0
+        self.total_wait = 0.0
+        self.total_run = 0.0
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == 'process':
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='pwhash')
+            logger.info(f'Password hashing pool: {self.kind} x{self.workers}, max {self.max_concurrency} in flight')
+        return self._executor
+
+    async def run(self, fn, *args):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        queued_at = time.perf_counter()
+        self.waiting += 1
+        self.max_waiting = max(self.max_waiting, self.waiting)
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+        started_at = time.perf_counter()
+        self.in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+            self.total_wait += started_at - queued_at
+            self.total_run += time.perf_counter() - started_at
+            self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            'executor': self.kind,
+            'workers': self.workers,
+            'max_concurrency': self.max_concurrency,
+            'in_flight': self.in_flight,
+            'queue_depth': self.waiting,
+            'max_queue_depth': self.max_waiting,
+            'completed': self.completed,
+            'avg_wait_ms': round(self.total_wait / self.completed * 1000, 2) if self.completed else 0.0,
+            'avg_run_ms': round(self.total_run / self.completed * 1000, 2) if self.completed else 0.0
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+hashing_pool = HashingPool(
+    kind=settings.PASSWORD_HASH_EXECUTOR,
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_concurrency=settings.PASSWORD_HASH_MAX_CONCURRENCY
+)
+
+async def hash_password(password: str) -> str:
+    """get_password_hash, off the event loop"""
+    return await hashing_pool.run(get_password_hash, password)
+
+async def check_password(plain_password: str, hashed_password: str) -> bool:
+    """verify_password, off the event loop"""
+    return await hashing_pool.run(verify_password, plain_password, hashed_password)
+
+# Strong references so pending rehash tasks aren't garbage-collected mid-flight
+_rehash_tasks: Set[asyncio.Task] = set()
+
+async def _rehash(user_id: str, password: str, old_hash: str):
+    try:
+        new_hash = await hash_password(password)
+        # Only replace the hash we verified; a concurrent password change wins
+        result = await db.users.update_one(
+            {'id': user_id, 'hashed_password': old_hash},
+            {'$set': {'hashed_password': new_hash, 'updated_at': datetime.utcnow()}}
+        )
+        if result.modified_count:
+            logger.info(f'Password hash upgraded for user {user_id}')
+    except Exception as e:
+        logger.warning(f'Password rehash failed for user {user_id}: {str(e)}')
+
+def rehash_in_background(user_id: str, password: str, old_hash: str):
+    """After a successful verify, upgrade ``old_hash`` to the configured algorithm/cost if it is outdated"""
+    if not needs_rehash(old_hash):
+        return
+    task = asyncio.create_task(_rehash(user_id, password, old_hash))
+    _rehash_tasks.add(task)
+    task.add_done_callback(_rehash_tasks.discard)
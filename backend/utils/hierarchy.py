@@ -0,0 +1,166 @@
+from pymongo import UpdateOne
+from config.database import db
+from utils.migrations import run_migration
+from typing import Dict, Iterable, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Users carry ``ancestors``: the root-first chain of creator ids above them
+# (Master Admin → Admin → Agent). Ledger records (bets, deposits,
+# withdrawals, transactions) carry ``scope_ids``: the owners' ancestors plus
+# the owners themselves. Any record visible to a manager therefore contains
+# that manager's id in ``scope_ids``, which a multikey index answers directly.
+
+async def build_ancestors(creator_id: Optional[str], session=None) -> List[str]:
+    """Ancestor path for a user created by ``creator_id``"""
+    if not creator_id:
+        return []
+
+    creator = await db.users.find_one({'id': creator_id}, {'ancestors': 1}, session=session)
+    parent_path = (creator or {}).get('ancestors') or []
+    return parent_path + [creator_id]
+
+async def get_scope_ids(user_ids: Iterable[Optional[str]], session=None) -> List[str]:
+    """Scope stamp for a record owned by (or moving coins between) ``user_ids``"""
+    owners = [u for u in dict.fromkeys(user_ids) if u]
+    if not owners:
+        return []
+
+    users = await db.users.find(
+        {'id': {'$in': owners}},
+        {'_id': 0, 'id': 1, 'ancestors': 1}
+    ).to_list(len(owners))
+
+    scope: Dict[str, None] = {}
+    for user in users:
+        for ancestor_id in user.get('ancestors') or []:
+            scope[ancestor_id] = None
+    for owner in owners:
+        scope[owner] = None
+    return list(scope)
+
+def scope_filter(current_user: dict) -> dict:
+    """Hierarchy filter for ledger collections stamped with ``scope_ids``.
+
+    Agents see their own records and everything below them at any depth;
+    admins and master admins are unscoped. Plain users are filtered on
+    their own id by the caller.
+    """
+    if current_user['role'] == 'agent':
+        return {'scope_ids': current_user['user_id']}
+    return {}
+
+# Transactions belong to both sides
+TRANSACTION_OWNERS = ('from_user_id', 'to_user_id')
+
+def visibility_filter(current_user: dict, owner_fields: Iterable[str] = ('user_id',)) -> dict:
+    """Role filter for ledger listings and exports.
+
+    Plain users see records they own through any of ``owner_fields``;
+    everyone else gets ``scope_filter``.
+    """
+    if current_user['role'] != 'user':
+        return scope_filter(current_user)
+    clauses = [{field: current_user['user_id']} for field in owner_fields]
+    return clauses[0] if len(clauses) == 1 else {'$or': clauses}
+
+def owned_filter(current_user: dict, status: Optional[str] = None, user_id: Optional[str] = None,
+                 created: Optional[dict] = None) -> dict:
+    """Listing filter for records with one owner; admins may narrow it to ``user_id``"""
+    filter_query = {**visibility_filter(current_user), **(created or {})}
+    if status:
+        filter_query['status'] = status
+    if user_id and current_user['role'] in ['admin', 'master_admin']:
+        filter_query['user_id'] = user_id
+    return filter_query
+
+def downline_filter(ancestor_id: str) -> dict:
+    """Filter on ``users`` matching everyone below ``ancestor_id``"""
+    return {'ancestors': ancestor_id}
+
+def in_downline(current_user: dict, user: dict) -> bool:
+    """Whether ``user`` is anywhere below ``current_user`` (``downline_filter`` for one document)"""
+    return current_user['user_id'] in (user.get('ancestors') or [])
+
+# Ledger collections stamped with scope_ids, and the fields naming their owners
+SCOPED_COLLECTIONS = {
+    'bets': ('user_id',),
+    'deposits': ('user_id',),
+    'withdrawals': ('user_id',),
+    'transactions': ('from_user_id', 'to_user_id')
+}
+
+async def backfill_hierarchy(batch_size: int = 1000) -> Dict[str, int]:
+    """Derive ``ancestors`` for every user from ``created_by`` and stamp
+    ``scope_ids`` on ledger records that predate the hierarchy index.
+
+    Returns the number of documents rewritten per collection.
+    """
+    parents = {
+        u['id']: u.get('created_by')
+        async for u in db.users.find({}, {'_id': 0, 'id': 1, 'created_by': 1})
+    }
+
+    paths: Dict[str, List[str]] = {}
+
+    def path_for(user_id: str) -> List[str]:
+        # Walk up the creator chain once per user; the seen set guards
+        # against bad data forming a cycle
+        chain, seen, current = [], {user_id}, parents.get(user_id)
+        while current and current not in seen and current in parents:
+            if current in paths:
+                chain = paths[current] + [current] + chain
+                break
+            chain.insert(0, current)
+            seen.add(current)
+            current = parents.get(current)
+        return chain
+
+    for user_id in parents:
+        paths[user_id] = path_for(user_id)
+
+    counts = {'users': 0}
+    ops = [UpdateOne({'id': uid}, {'$set': {'ancestors': path}}) for uid, path in paths.items()]
+    for i in range(0, len(ops), batch_size):
+        result = await db.users.bulk_write(ops[i:i + batch_size], ordered=False)
+        counts['users'] += result.modified_count
+
+    for name, owner_fields in SCOPED_COLLECTIONS.items():
+        collection = db[name]
+        counts[name] = 0
+        ops = []
+        projection = {'_id': 1, **{f: 1 for f in owner_fields}}
+        async for doc in collection.find({'scope_ids': {'$exists': False}}, projection):
+            scope: Dict[str, None] = {}
+            for field in owner_fields:
+                owner = doc.get(field)
+                if owner:
+                    scope.update(dict.fromkeys(paths.get(owner, [])))
+                    scope[owner] = None
+            ops.append(UpdateOne({'_id': doc['_id']}, {'$set': {'scope_ids': list(scope)}}))
+            if len(ops) >= batch_size:
+                counts[name] += (await collection.bulk_write(ops, ordered=False)).modified_count
+                ops = []
+        if ops:
+            counts[name] += (await collection.bulk_write(ops, ordered=False)).modified_count
+
+    return counts
+
+async def _hierarchy_pending() -> bool:
+    if await db.users.find_one({'ancestors': {'$exists': False}}, {'_id': 1}):
+        return True
+    for name in SCOPED_COLLECTIONS:
+        if await db[name].find_one({'scope_ids': {'$exists': False}}, {'_id': 1}):
+            return True
+    return False
+
+async def _backfill():
+    logger.info('Hierarchy index incomplete, backfilling ancestors and scope_ids')
+    counts = await backfill_hierarchy()
+    logger.info(f'Hierarchy backfill: {counts}')
+    return counts
+
+async def ensure_hierarchy():
+    """Backfill the hierarchy index once for deployments that predate it"""
+    await run_migration('hierarchy_backfill', _hierarchy_pending, _backfill)
@@ -0,0 +1,212 @@
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from config.database import db
+from config.settings import settings
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional
+import asyncio
+import hashlib
+import json
+import logging
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Idempotency-Key support for POSTs that move money. The first request with
+# a key claims an ``idempotency_keys`` document (_id ``<user_id>:<key>``)
+# and runs; its response is stored on that document and replayed verbatim
+# to any retry, so a retry costs one _id lookup instead of another wallet
+# mutation. Documents expire through a TTL index on ``expires_at``.
+#
+# Duplicates that arrive while the first request is still running wait for
+# it: on the same worker they share its future, on other workers they poll
+# the document. The owner renews its lease (``locked_until``) while the
+# handler runs, so a claim is only taken over once its owner died or
+# stalled; every write to the claim is conditional on the owner's token.
+
+MAX_KEY_LENGTH = 255
+REPLAY_HEADER = 'Idempotent-Replayed'
+
+_inflight: Dict[str, asyncio.Future] = {}
+
+def fingerprint(scope: str, body: Any) -> str:
+    """Hash of the route and request body a key was first used with"""
+    payload = json.dumps([scope, jsonable_encoder(body)], sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def _replay(doc: dict) -> JSONResponse:
+    return JSONResponse(
+        content=doc['response'],
+        status_code=doc['status_code'],
+        headers={REPLAY_HEADER: 'true'}
+    )
+
+def _check_match(doc: dict, scope: str, digest: str):
+    if doc.get('scope') != scope or doc.get('fingerprint') != digest:
+        raise HTTPException(
+            status_code=422,
+            detail='Idempotency-Key was already used with a different request'
+        )
+
+async def _claim(doc_id: str, user_id: str, key: str, scope: str, digest: str) -> Optional[dict]:
+    """Insert or take over the key document; returns None if someone else holds it"""
+    now = datetime.utcnow()
+    claim = {
+        'owner': str(uuid.uuid4()),
+        'status': 'in_progress',
+        'locked_until': now + timedelta(seconds=settings.IDEMPOTENCY_LOCK_SECONDS),
+        'expires_at': now + timedelta(hours=settings.IDEMPOTENCY_TTL_HOURS)
+    }
+    try:
+        await db.idempotency_keys.insert_one({
+            '_id': doc_id,
+            'user_id': user_id,
+            'key': key,
+            'scope': scope,
+            'fingerprint': digest,
+            'created_at': now,
+            **claim
+        })
+        return claim
+    except DuplicateKeyError:
+        pass
+
+    taken = await db.idempotency_keys.find_one_and_update(
+        {'_id': doc_id, 'status': 'in_progress', 'scope': scope,
+         'fingerprint': digest, 'locked_until': {'$lt': now}},
+        {'$set': claim},
+        return_document=ReturnDocument.AFTER
+    )
+    if taken:
+        logger.warning(f'Idempotency key {doc_id} taken over after its lease expired')
+        return claim
+    return None
+
+async def _wait_for(doc_id: str, scope: str, digest: str) -> dict:
+    """Poll a key held by another worker until it completes or is released"""
+    deadline = asyncio.get_running_loop().time() + settings.IDEMPOTENCY_WAIT_SECONDS
+    delay = 0.05
+    while True:
+        doc = await db.idempotency_keys.find_one({'_id': doc_id})
+        if doc is None or doc['status'] == 'completed':
+            return doc
+        _check_match(doc, scope, digest)
+        if doc['locked_until'] < datetime.utcnow():
+            return doc
+        if asyncio.get_running_loop().time() >= deadline:
+            raise HTTPException(
+                status_code=409,
+                detail='A request with this Idempotency-Key is still in progress'
+            )
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 0.5)
+
+async def _renew(doc_id: str, owner: str):
+    """Keep pushing the lease forward while the handler runs"""
+    while True:
+        await asyncio.sleep(settings.IDEMPOTENCY_LOCK_SECONDS / 3)
+        result = await db.idempotency_keys.update_one(
+            {'_id': doc_id, 'owner': owner, 'status': 'in_progress'},
+            {'$set': {'locked_until': datetime.utcnow() + timedelta(seconds=settings.IDEMPOTENCY_LOCK_SECONDS)}}
+        )
+        if not result.matched_count:
+            logger.error(f'Idempotency key {doc_id} was taken over while its handler was still running')
+            return
+
+async def _finish(doc_id: str, owner: str, status_code: int, response: Any):
+    result = await db.idempotency_keys.update_one(
+        {'_id': doc_id, 'owner': owner},
+        {'$set': {
+            'status': 'completed',
+            'status_code': status_code,
+            'response': response,
+            'completed_at': datetime.utcnow()
+        }, '$unset': {'locked_until': ''}}
+    )
+    if not result.matched_count:
+        logger.error(f'Idempotency key {doc_id} is no longer held by this request; response not stored')
+
+async def run_idempotent(
+    key: Optional[str],
+    user_id: str,
+    scope: str,
+    body: Any,
+    handler: Callable[[], Awaitable[Any]],
+    status_code: int = 200
+) -> Any:
+    """Run ``handler`` at most once per (user, Idempotency-Key).
+
+    Without a key the handler just runs. A repeated key with the same route
+    and body gets the stored response (marked with an Idempotent-Replayed
+    header); with a different one it gets a 422. Client errors (4xx) are
+    stored like successes, since a retry would fail the same way; server
+    errors release the key so the retry runs again.
+    """
+    if key is None:
+        return await handler()
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail=f'Idempotency-Key must be 1-{MAX_KEY_LENGTH} characters')
+
+    doc_id = f'{user_id}:{key}'
+    digest = fingerprint(scope, body)
+
+    while True:
+        inflight = _inflight.get(doc_id)
+        if inflight:
+            doc = await asyncio.shield(inflight)
+            if doc is None:
+                continue
+            _check_match(doc, scope, digest)
+            return _replay(doc)
+
+        claim = await _claim(doc_id, user_id, key, scope, digest)
+        if claim:
+            break
+        doc = await db.idempotency_keys.find_one({'_id': doc_id})
+        if doc is not None:
+            _check_match(doc, scope, digest)
+            if doc['status'] != 'completed':
+                doc = await _wait_for(doc_id, scope, digest)
+            if doc is not None and doc['status'] == 'completed':
+                return _replay(doc)
+        # Released or lease expired: try to claim it again
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight[doc_id] = future
+    heartbeat = asyncio.create_task(_renew(doc_id, claim['owner']))
+    try:
+        try:
+            try:
+                result = await handler()
+            finally:
+                # Stop renewing before the claim is completed or released
+                heartbeat.cancel()
+        except HTTPException as e:
+            if e.status_code >= 500:
+                raise
+            doc = {'scope': scope, 'fingerprint': digest, 'status_code': e.status_code,
+                   'response': {'detail': jsonable_encoder(e.detail)}}
+            await _finish(doc_id, claim['owner'], doc['status_code'], doc['response'])
+            future.set_result(doc)
+            raise
+
+        doc = {'scope': scope, 'fingerprint': digest, 'status_code': status_code,
+               'response': jsonable_encoder(result)}
+        try:
+            await _finish(doc_id, claim['owner'], status_code, doc['response'])
+        except Exception as e:
+            # The mutation is done; keep the claim so retries wait out the lease
+            logger.error(f'Failed to store idempotent response for {doc_id}: {str(e)}')
+        future.set_result(doc)
+        return result
+    except BaseException:
+        if not future.done():
+            # Release the key; local waiters wake up and try to claim it themselves
+            await asyncio.shield(db.idempotency_keys.delete_one({'_id': doc_id, 'owner': claim['owner']}))
+            future.set_result(None)
+        raise
+    finally:
+        _inflight.pop(doc_id, None)
@@ -0,0 +1,120 @@
+from pymongo.errors import OperationFailure
+from config.database import db
+from config.indexes import INDEXES, QUERY_SHAPES
+from typing import Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+def _key(spec) -> tuple:
+    """Normalise an index key (SON, dict or list of pairs) to a tuple of pairs"""
+    items = spec.items() if hasattr(spec, 'items') else spec
+    return tuple((field, int(direction) if isinstance(direction, (int, float)) else direction)
+                 for field, direction in items)
+
+def _is_prefix(short: tuple, long: tuple) -> bool:
+    return len(short) < len(long) and long[:len(short)] == short
+
+async def _access_counts(collection) -> Optional[Dict[str, int]]:
+    """Per-index operation counts since the last server restart, if available"""
+    try:
+        stats = await collection.aggregate([{'$indexStats': {}}]).to_list(None)
+    except OperationFailure:
+        return None
+    return {s['name']: s['accesses']['ops'] for s in stats}
+
+async def reconcile_indexes(create: bool = True) -> Dict[str, List[dict]]:
+    """Bring the server in line with ``config.indexes.INDEXES`` and report leftovers.
+
+    Missing registered indexes are created (unless ``create`` is False).
+    Nothing is ever dropped; instead the report lists:
+
+    - ``unregistered``: indexes on the server that are not in the registry
+    - ``redundant``: non-unique indexes whose key is a prefix of another index
+    - ``unused``: indexes with no recorded accesses since the server started
+    - ``conflicts``: registered keys that exist with different options
+    """
+    report = {'created': [], 'unregistered': [], 'redundant': [], 'unused': [], 'conflicts': []}
+
+    for name, models in INDEXES.items():
+        collection = db[name]
+        existing = await collection.index_information()
+        existing_by_key = {_key(info['key']): (index_name, info) for index_name, info in existing.items()}
+
+        missing = []
+        registered_keys = set()
+        for model in models:
+            doc = model.document
+            key = _key(doc['key'])
+            registered_keys.add(key)
+            if key not in existing_by_key:
+                missing.append(model)
+                continue
+            index_name, info = existing_by_key[key]
+            if bool(info.get('unique')) != bool(doc.get('unique')):
+                report['conflicts'].append({
+                    'collection': name, 'index': index_name,
+                    'detail': f"unique={bool(info.get('unique'))}, registry wants unique={bool(doc.get('unique'))}"
+                })
+
+        if missing and create:
+            try:
+                created = await collection.create_indexes(missing)
+                report['created'].extend({'collection': name, 'index': n} for n in created)
+            except OperationFailure as e:
+                # Typically a unique index over data that already has duplicates
+                report['conflicts'].append({'collection': name, 'index': '*', 'detail': str(e)})
+        elif missing:
+            report['created'].extend(
+                {'collection': name, 'index': m.document['name'], 'dry_run': True} for m in missing
+            )
+
+        all_keys = set(existing_by_key) | registered_keys
+        for key, (index_name, info) in existing_by_key.items():
+            if index_name == '_id_':
+                continue
+            if key not in registered_keys:
+                report['unregistered'].append({'collection': name, 'index': index_name})
+            if not info.get('unique') and any(_is_prefix(key, other) for other in all_keys):
+                report['redundant'].append({'collection': name, 'index': index_name})
+
+        counts = await _access_counts(collection)
+        if counts:
+            report['unused'].extend(
+                {'collection': name, 'index': index_name}
+                for index_name, ops in counts.items()
+                if ops == 0 and index_name != '_id_'
+            )
+
+    return report
+
+def _has_collscan(plan) -> bool:
+    if isinstance(plan, dict):
+        if plan.get('stage') == 'COLLSCAN':
+            return True
+        return any(_has_collscan(v) for v in plan.values())
+    if isinstance(plan, list):
+        return any(_has_collscan(v) for v in plan)
+    return False
+
+async def explain_query_shapes() -> List[dict]:
+    """Explain every registered route query and flag the ones planned as a COLLSCAN"""
+    results = []
+    for shape in QUERY_SHAPES:
+        command = {'find': shape['collection'], 'filter': shape['filter'], 'limit': 50}
+        if shape.get('sort'):
+            command['sort'] = dict(shape['sort'])
+        explain = await db.command({'explain': command, 'verbosity': 'queryPlanner'})
+        winning = explain.get('queryPlanner', {}).get('winningPlan', {})
+        results.append({**shape, 'collscan': _has_collscan(winning)})
+    return results
+
+async def ensure_indexes():
+    """Startup hook: create missing indexes and log anything worth a look"""
+    report = await reconcile_indexes(create=True)
+    if report['created']:
+        logger.info(f"Created indexes: {', '.join(i['collection'] + '.' + i['index'] for i in report['created'])}")
+    for kind in ('conflicts', 'redundant', 'unregistered'):
+        if report[kind]:
+            logger.warning(f"Index {kind}: {', '.join(i['collection'] + '.' + i['index'] for i in report[kind])}")
+    return report
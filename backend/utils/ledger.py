@@ -0,0 +1,354 @@
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from config.database import client, db
+from config.settings import settings
+from datetime import datetime, timedelta
+from decimal import Decimal
+from models.money import ZERO, to_money
+from utils.migrations import run_migration
+from utils.transactions import transactions_supported
+from typing import Dict, Iterable, List, Optional, Tuple
+import asyncio
+import logging
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Append-only double-entry ledger. Every balance movement is one posting:
+# two or more ``ledger_entries`` rows sharing a posting_id whose signed
+# amounts sum to zero. Wallet legs use the account ``<user_id>:<wallet_type>``;
+# money entering or leaving the platform is booked against a system account
+# (``system:<name>``), so system balances are the platform's view of mint,
+# deposits, bet results and so on.
+#
+# ``wallets.balance`` stays as the guarded hot-path counter for overdraft
+# checks. Balance reads and audits go to the ledger: the newest
+# ``ledger_snapshots`` row per account plus the entries after it. Snapshots
+# are taken periodically (one epoch per run, recorded in ``ledger_epochs``),
+# always a little behind the clock so in-flight transactions have landed.
+
+SYSTEM_PREFIX = 'system:'
+WALLET_TYPES = ['main_coin', 'bonus', 'locked']
+
+class LedgerError(ValueError):
+    """Raised for postings whose legs do not balance"""
+
+def wallet_account(user_id: str, wallet_type: str) -> str:
+    return f'{user_id}:{wallet_type}'
+
+def system_account(name: str) -> str:
+    return f'{SYSTEM_PREFIX}{name}'
+
+class Posting:
+    """One balanced set of ledger legs, built up leg by leg"""
+
+    def __init__(self, entry_type: str, ref: Optional[dict] = None, posting_id: Optional[str] = None):
+        self.entry_type = entry_type
+        self.ref = ref or {}
+        # A fixed posting_id makes re-posting the same posting a duplicate key
+        self.posting_id = posting_id
+        self.legs: List[Tuple[str, Optional[str], Optional[str], Decimal]] = []
+
+    def wallet(self, user_id: str, wallet_type: str, amount: Decimal) -> 'Posting':
+        self.legs.append((wallet_account(user_id, wallet_type), user_id, wallet_type, amount))
+        return self
+
+    def system(self, name: str, amount: Decimal) -> 'Posting':
+        self.legs.append((system_account(name), None, None, amount))
+        return self
+
+    def balance_against(self, name: str) -> 'Posting':
+        """Book whatever the legs so far leave open against a system account"""
+        rest = -sum(leg[3] for leg in self.legs)
+        if rest:
+            self.system(name, rest)
+        return self
+
+    def documents(self, now: datetime) -> List[dict]:
+        # Legs are Decimal, so a balanced posting sums to exactly zero
+        if sum(leg[3] for leg in self.legs) != ZERO:
+            raise LedgerError(f'Unbalanced {self.entry_type} posting: {self.legs}')
+        posting_id = self.posting_id or str(uuid.uuid4())
+        return [
+            {
+                'id': f'{posting_id}:{index}' if self.posting_id else str(uuid.uuid4()),
+                'posting_id': posting_id,
+                'account': account,
+                'user_id': user_id,
+                'wallet_type': wallet_type,
+                'amount': amount,
+                'entry_type': self.entry_type,
+                'ref': self.ref,
+                'created_at': now
+            }
+            for index, (account, user_id, wallet_type, amount) in enumerate(self.legs)
+            if amount
+        ]
+
+async def post(postings: Iterable[Posting], session=None, skip_existing: bool = False):
+    """Append postings to the ledger in one insert_many.
+
+    With ``skip_existing``, entries already in the ledger (postings with a
+    fixed posting_id that were posted before) are left alone.
+    """
+    now = datetime.utcnow()
+    docs = [doc for p in postings for doc in p.documents(now)]
+    if not docs:
+        return
+    if not skip_existing:
+        await db.ledger_entries.insert_many(docs, ordered=True, session=session)
+        return
+    try:
+        await db.ledger_entries.insert_many(docs, ordered=False, session=session)
+    except BulkWriteError as e:
+        if any(err.get('code') != 11000 for err in e.details.get('writeErrors', [])):
+            raise
+
+# --- Balance reads: snapshot + tail ---------------------------------------
+
+async def _latest_snapshots(accounts: List[str], at: Optional[datetime] = None) -> Dict[str, dict]:
+    match = {'account': {'$in': accounts}}
+    if at is not None:
+        match['as_of'] = {'$lte': at}
+    rows = await db.ledger_snapshots.aggregate([
+        {'$match': match},
+        {'$sort': {'account': ASCENDING, 'as_of': DESCENDING}},
+        {'$group': {'_id': '$account', 'balance': {'$first': '$balance'}, 'as_of': {'$first': '$as_of'}}}
+    ]).to_list(None)
+    return {row['_id']: row for row in rows}
+
+async def _tail_sums(since: Dict[str, Optional[datetime]], until: Optional[datetime] = None) -> Dict[str, Decimal]:
+    """Sum entries per account after its own starting point (None = from the start)"""
+    clauses = []
+    for account, start in since.items():
+        window = {}
+        if start is not None:
+            window['$gt'] = start
+        if until is not None:
+            window['$lte'] = until
+        clauses.append({'account': account, **({'created_at': window} if window else {})})
+    if not clauses:
+        return {}
+    rows = await db.ledger_entries.aggregate([
+        {'$match': {'$or': clauses}},
+        {'$group': {'_id': '$account', 'amount': {'$sum': '$amount'}}}
+    ]).to_list(None)
+    return {row['_id']: row['amount'] for row in rows}
+
+async def get_account_balances(accounts: List[str], at: Optional[datetime] = None) -> Dict[str, Decimal]:
+    """Balance of each account at ``at`` (default: now) from its snapshot plus tail"""
+    snapshots = await _latest_snapshots(accounts, at)
+    tails = await _tail_sums({a: snapshots[a]['as_of'] if a in snapshots else None for a in accounts}, at)
+    return {
+        account: (snapshots[account]['balance'] if account in snapshots else ZERO) + tails.get(account, ZERO)
+        for account in accounts
+    }
+
+async def get_wallet_balances(user_id: str, at: Optional[datetime] = None) -> Dict[str, Decimal]:
+    """Ledger balance of each of a user's wallets, keyed by wallet_type"""
+    accounts = {wallet_type: wallet_account(user_id, wallet_type) for wallet_type in WALLET_TYPES}
+    balances = await get_account_balances(list(accounts.values()), at)
+    return {wallet_type: balances[account] for wallet_type, account in accounts.items()}
+
+# --- Replay ---------------------------------------------------------------
+
+async def replay(
+    until: Optional[datetime] = None,
+    accounts: Optional[List[str]] = None,
+    from_snapshots: bool = True,
+    batch_size: int = 5000
+) -> Dict[str, Decimal]:
+    """Rebuild account balances as of ``until`` by folding ledger entries.
+
+    Starts from the newest snapshot epoch at or before ``until`` and streams
+    only the entries after it, in created_at order, through a batched
+    cursor. Any account with entries before an epoch was snapshotted by it
+    or an earlier one, so nothing older needs reading. With
+    ``from_snapshots=False`` the whole history is folded from zero, which
+    is also how snapshots are verified. ``accounts=None`` replays every account.
+    """
+    balances: Dict[str, Decimal] = {}
+    query = {}
+    if accounts is not None:
+        query['account'] = {'$in': accounts}
+
+    window = {}
+    epoch = None
+    if from_snapshots:
+        epoch = await db.ledger_epochs.find_one(
+            {'as_of': {'$lte': until}} if until is not None else {},
+            sort=[('_id', DESCENDING)]
+        )
+    if epoch:
+        match = {**query, 'as_of': {'$lte': epoch['as_of']}}
+        async for row in db.ledger_snapshots.aggregate([
+            {'$match': match},
+            {'$sort': {'account': ASCENDING, 'as_of': DESCENDING}},
+            {'$group': {'_id': '$account', 'balance': {'$first': '$balance'}}}
+        ], allowDiskUse=True):
+            balances[row['_id']] = row['balance']
+        window['$gt'] = epoch['as_of']
+    if until is not None:
+        window['$lte'] = until
+    if window:
+        query['created_at'] = window
+
+    cursor = db.ledger_entries.find(
+        query, {'_id': 0, 'account': 1, 'amount': 1}
+    ).sort('created_at', ASCENDING).batch_size(batch_size)
+
+    async for entry in cursor:
+        account = entry['account']
+        balances[account] = balances.get(account, ZERO) + entry['amount']
+
+    return balances
+
+# --- Snapshots ------------------------------------------------------------
+
+async def take_snapshot(as_of: Optional[datetime] = None, batch_size: int = 500) -> Optional[dict]:
+    """Snapshot every account with entries since the previous epoch.
+
+    Only the window since the last epoch is aggregated, so the cost follows
+    write volume rather than ledger size; touched accounts are read and
+    snapshotted ``batch_size`` at a time. Snapshots are written before the
+    epoch that vouches for them; a snapshot is a plain fact about one
+    account at one instant, so a racing worker's extra rows are harmless.
+    Returns the epoch document, or None if there was nothing to do or
+    another worker recorded this epoch first.
+    """
+    as_of = as_of or datetime.utcnow() - timedelta(seconds=settings.LEDGER_SNAPSHOT_LAG_SECONDS)
+    last = await db.ledger_epochs.find_one(sort=[('_id', DESCENDING)])
+    seq = last['_id'] + 1 if last else 1
+    since = last['as_of'] if last else None
+    if since is not None and as_of <= since:
+        return None
+
+    async def snapshot(accounts: List[str]):
+        balances = await get_account_balances(accounts, as_of)
+        await db.ledger_snapshots.insert_many([
+            {'account': account, 'balance': balance, 'as_of': as_of, 'epoch': seq}
+            for account, balance in balances.items()
+        ], ordered=False)
+
+    window = {'$lte': as_of}
+    if since is not None:
+        window['$gt'] = since
+    touched = 0
+    chunk = []
+    async for row in db.ledger_entries.aggregate([
+        {'$match': {'created_at': window}},
+        {'$group': {'_id': '$account'}}
+    ], allowDiskUse=True):
+        chunk.append(row['_id'])
+        if len(chunk) >= batch_size:
+            await snapshot(chunk)
+            touched += len(chunk)
+            chunk = []
+    if chunk:
+        await snapshot(chunk)
+        touched += len(chunk)
+
+    epoch = {'_id': seq, 'as_of': as_of, 'accounts': touched, 'created_at': datetime.utcnow()}
+    try:
+        await db.ledger_epochs.insert_one(epoch)
+    except DuplicateKeyError:
+        return None
+
+    logger.info(f'Ledger snapshot {seq} as of {as_of.isoformat()}: {touched} account(s)')
+    return epoch
+
+async def run_snapshot_loop(interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await take_snapshot()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f'Ledger snapshot failed: {str(e)}')
+
+OPENING_MIGRATION_ID = 'ledger_opened'
+OPENING_PREFIX = 'opening:'
+
+async def _ledger_pending() -> bool:
+    # Only the completed marker counts: a run cut short left some opening
+    # postings behind, and the next run tops up exactly what is missing
+    return not await db.migrations.find_one({'_id': OPENING_MIGRATION_ID}, {'_id': 1})
+
+async def _opening_postings(wallet_ids: list, session=None) -> List[Posting]:
+    """Postings that bring each wallet's ledger balance up to its wallet balance.
+
+    Balances and ledger sums are read together in ``session``; every
+    movement updates both in one transaction, so at a snapshot the
+    difference is exactly what the ledger is missing from before it went
+    live, however many postings land meanwhile.
+    """
+    wallets = await db.wallets.find(
+        {'_id': {'$in': wallet_ids}}, {'_id': 0, 'user_id': 1, 'wallet_type': 1, 'balance': 1}, session=session
+    ).to_list(None)
+    accounts = [wallet_account(w['user_id'], w['wallet_type']) for w in wallets]
+    sums = {
+        row['_id']: row['amount'] async for row in db.ledger_entries.aggregate([
+            {'$match': {'account': {'$in': accounts}}},
+            {'$group': {'_id': '$account', 'amount': {'$sum': '$amount'}}}
+        ], session=session)
+    }
+    postings = []
+    for wallet, account in zip(wallets, accounts):
+        missing = to_money(wallet['balance']) - to_money(sums.get(account, ZERO))
+        if missing:
+            postings.append(
+                Posting('opening_balance', posting_id=f'{OPENING_PREFIX}{account}')
+                .wallet(wallet['user_id'], wallet['wallet_type'], missing)
+                .balance_against('opening')
+            )
+    return postings
+
+async def open_ledger(batch_size: int = 1000) -> int:
+    """Post the part of each wallet's balance the ledger does not hold yet.
+
+    Runs while other workers keep posting: each batch reads its wallets'
+    balances and ledger sums at one snapshot (see ``_opening_postings``)
+    and posts the difference, so movements posted live are not counted
+    twice. Opening postings have fixed ids per wallet and a wallet already
+    opened has nothing missing, so a run that was cut short can simply be
+    run again. The ledger is only marked opened after the last batch.
+    """
+    snapshots = await transactions_supported()
+    if not snapshots:
+        # MONGO_TRANSACTIONS=off: wallet and ledger writes are not atomic
+        # anyway, so plain reads are as good as it gets
+        logger.warning('Opening the ledger without snapshot reads; stop writers for an exact opening')
+
+    async def opening(wallet_ids: list) -> List[Posting]:
+        if not snapshots:
+            return await _opening_postings(wallet_ids)
+        async with await client.start_session(snapshot=True) as session:
+            return await _opening_postings(wallet_ids, session)
+
+    opened = 0
+    batch = []
+    async for wallet in db.wallets.find({}, {'_id': 1}).sort('_id', ASCENDING):
+        batch.append(wallet['_id'])
+        if len(batch) >= batch_size:
+            postings = await opening(batch)
+            await post(postings, skip_existing=True)
+            opened += len(postings)
+            batch = []
+    if batch:
+        postings = await opening(batch)
+        await post(postings, skip_existing=True)
+        opened += len(postings)
+
+    await db.migrations.update_one(
+        {'_id': OPENING_MIGRATION_ID},
+        {'$set': {'completed_at': datetime.utcnow(), 'counts': {'wallets': opened}}},
+        upsert=True
+    )
+    return opened
+
+async def ensure_ledger(batch_size: int = 1000):
+    """Open the ledger with each wallet's current balance on deployments that predate it"""
+    opened = await run_migration(OPENING_MIGRATION_ID, _ledger_pending, lambda: open_ledger(batch_size))
+    if opened:
+        logger.info(f'Ledger opened with {opened} wallet balance(s)')
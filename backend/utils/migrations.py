@@ -0,0 +1,75 @@
+from pymongo.errors import DuplicateKeyError
+from config.database import db
+from config.settings import settings
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Optional
+import asyncio
+import logging
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Every uvicorn worker runs the startup migrations. A worker only runs one
+# after claiming its document in ``migration_locks``; the others skip it
+# and carry on starting up. The claim is a lease renewed while the
+# migration runs, so a worker that dies mid-run does not block the next
+# startup for longer than MIGRATION_LOCK_SECONDS.
+
+async def _claim(name: str, owner: str) -> bool:
+    now = datetime.utcnow()
+    claim = {'owner': owner, 'claimed_at': now, 'expires_at': now + timedelta(seconds=settings.MIGRATION_LOCK_SECONDS)}
+    try:
+        await db.migration_locks.insert_one({'_id': name, **claim})
+        return True
+    except DuplicateKeyError:
+        pass
+    taken = await db.migration_locks.find_one_and_update(
+        {'_id': name, 'expires_at': {'$lt': now}},
+        {'$set': claim}
+    )
+    if taken:
+        logger.warning(f'Migration lock {name} taken over after its lease expired')
+    return taken is not None
+
+async def _renew(name: str, owner: str):
+    while True:
+        await asyncio.sleep(settings.MIGRATION_LOCK_SECONDS / 3)
+        await db.migration_locks.update_one(
+            {'_id': name, 'owner': owner},
+            {'$set': {'expires_at': datetime.utcnow() + timedelta(seconds=settings.MIGRATION_LOCK_SECONDS)}}
+        )
+
+@asynccontextmanager
+async def migration_lock(name: str):
+    """Yield True if this worker holds the lock for ``name``, False if another one does"""
+    owner = str(uuid.uuid4())
+    if not await _claim(name, owner):
+        yield False
+        return
+    heartbeat = asyncio.create_task(_renew(name, owner))
+    try:
+        yield True
+    finally:
+        heartbeat.cancel()
+        await db.migration_locks.delete_one({'_id': name, 'owner': owner})
+
+async def run_migration(
+    name: str,
+    pending: Callable[[], Awaitable[bool]],
+    migrate: Callable[[], Awaitable[Any]]
+) -> Optional[Any]:
+    """Run ``migrate`` on one worker if ``pending()``; returns its result, or None if skipped.
+
+    ``pending`` is checked again under the lock, so a worker that claims it
+    just after another one finished does not run the migration twice.
+    """
+    if not await pending():
+        return None
+    async with migration_lock(name) as acquired:
+        if not acquired:
+            logger.info(f'Migration {name} is running on another worker')
+            return None
+        if not await pending():
+            return None
+        return await migrate()
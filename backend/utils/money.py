@@ -0,0 +1,94 @@
+from pymongo import UpdateOne
+from config.database import db
+from models.money import to_money
+from utils.migrations import run_migration
+from datetime import datetime
+from typing import Dict, List
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Every stored money field, per collection. Documents written before money
+# became Decimal128 hold BSON doubles here; migrate_money() rewrites them.
+MONEY_FIELDS: Dict[str, List[str]] = {
+    'wallets': ['balance'],
+    'bets': ['amount', 'potential_win', 'actual_win'],
+    'transactions': ['amount'],
+    'deposits': ['amount'],
+    'withdrawals': ['amount'],
+    'ledger_entries': ['amount'],
+    'ledger_snapshots': ['balance'],
+    'platform_stats': [
+        'coin_supply', 'bonus_pool', 'locked_coins', 'withdrawals_held', 'total_minted',
+        'bet_volume', 'total_winnings', 'deposit_amount', 'withdrawal_amount'
+    ],
+    'games': ['min_bet', 'max_bet'],
+    'payment_methods': ['min_amount', 'max_amount'],
+    'bonus_rules': ['fixed_amount', 'min_deposit', 'max_bonus'],
+    'limits': ['min_amount', 'max_amount', 'default_limit'],
+    'referrals': ['commission_paid'],
+}
+
+MIGRATION_ID = 'money_decimal128'
+
+def coerce_money(collection: str, data: dict) -> dict:
+    """Convert the money fields of a raw update dict for ``collection`` in place"""
+    for field in MONEY_FIELDS.get(collection, []):
+        if data.get(field) is not None:
+            data[field] = to_money(data[field])
+    return data
+
+async def migrate_money(batch_size: int = 1000, dry_run: bool = False) -> Dict[str, int]:
+    """Convert double money fields to 2-place Decimal128 in bulk_write batches.
+
+    Each update is conditional on the double it read, so a value changed
+    concurrently (an $inc with a Decimal already makes it Decimal128) is
+    left alone. Safe to re-run; returns converted documents per collection.
+    """
+    counts = {}
+    for name, fields in MONEY_FIELDS.items():
+        collection = db[name]
+        counts[name] = 0
+        ops = []
+        query = {'$or': [{field: {'$type': 'double'}} for field in fields]}
+        projection = {'_id': 1, **{field: 1 for field in fields}}
+
+        async for doc in collection.find(query, projection).batch_size(batch_size):
+            doubles = {f: doc[f] for f in fields if isinstance(doc.get(f), float)}
+            if not doubles:
+                continue
+            ops.append(UpdateOne(
+                {'_id': doc['_id'], **doubles},
+                {'$set': {f: to_money(v) for f, v in doubles.items()}}
+            ))
+            if len(ops) >= batch_size:
+                counts[name] += await _flush(collection, ops, dry_run)
+                ops = []
+        if ops:
+            counts[name] += await _flush(collection, ops, dry_run)
+
+    if not dry_run:
+        await db.migrations.update_one(
+            {'_id': MIGRATION_ID},
+            {'$set': {'completed_at': datetime.utcnow(), 'counts': counts}},
+            upsert=True
+        )
+    return counts
+
+async def _flush(collection, ops: List[UpdateOne], dry_run: bool) -> int:
+    if dry_run:
+        return len(ops)
+    return (await collection.bulk_write(ops, ordered=False)).modified_count
+
+async def _money_pending() -> bool:
+    return not await db.migrations.find_one({'_id': MIGRATION_ID}, {'_id': 1})
+
+async def _migrate():
+    logger.info('Money fields not migrated yet, converting doubles to Decimal128')
+    counts = await migrate_money()
+    logger.info(f'Money migration: {counts}')
+    return counts
+
+async def ensure_money():
+    """Run the money migration once (on one worker) for deployments that predate Decimal128"""
+    await run_migration(MIGRATION_ID, _money_pending, _migrate)
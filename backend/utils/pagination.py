@@ -0,0 +1,107 @@
+from fastapi import HTTPException, Query, Response, status
+from pymongo import DESCENDING
+from datetime import datetime
+from typing import List, Optional, Tuple
+import base64
+import json
+
+# Keyset pagination over (sort_field, id). The cursor is the position of
+# the last document on a page, so the next page is an index range scan
+# starting right after it instead of a skip over every earlier row.
+
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
+Cursor = Tuple[object, str]
+
+def encode_cursor(doc: dict, sort_field: str = 'created_at') -> str:
+    value = doc.get(sort_field)
+    if isinstance(value, datetime):
+        payload = {'d': value.isoformat()}
+    else:
+        payload = {'v': value}
+    payload['id'] = doc['id']
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor: str) -> Cursor:
+    """Inverse of ``encode_cursor``; raises ValueError on anything malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        value = datetime.fromisoformat(payload['d']) if 'd' in payload else payload['v']
+        doc_id = payload['id']
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f'Invalid cursor: {cursor}') from e
+    if not isinstance(doc_id, str):
+        raise ValueError(f'Invalid cursor: {cursor}')
+    return value, doc_id
+
+def page_cursor(
+    cursor: Optional[str] = Query(None, description=f'Opaque cursor from the {NEXT_CURSOR_HEADER} response header')
+) -> Optional[Cursor]:
+    """Query dependency decoding the ``cursor`` parameter"""
+    if cursor is None:
+        return None
+    try:
+        return decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail='Invalid cursor'
+        )
+
+def keyset_filter(cursor: Cursor, sort_field: str = 'created_at', direction: int = DESCENDING) -> dict:
+    value, doc_id = cursor
+    op = '$lt' if direction == DESCENDING else '$gt'
+    return {'$or': [
+        {sort_field: {op: value}},
+        {sort_field: value, 'id': {op: doc_id}}
+    ]}
+
+def date_range(
+    date_from: Optional[datetime] = Query(None, description='Only records created at or after this time (UTC)'),
+    date_to: Optional[datetime] = Query(None, description='Only records created before this time (UTC)')
+) -> dict:
+    """Query dependency turning ``date_from``/``date_to`` into a created_at filter"""
+    if date_from and date_to and date_from >= date_to:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail='date_from must be before date_to'
+        )
+    window = {}
+    if date_from:
+        window['$gte'] = date_from
+    if date_to:
+        window['$lt'] = date_to
+    return {'created_at': window} if window else {}
+
+async def fetch_page(
+    collection,
+    filter_query: dict,
+    response: Response,
+    cursor: Optional[Cursor] = None,
+    skip: int = 0,
+    limit: int = 50,
+    sort_field: str = 'created_at',
+    direction: int = DESCENDING,
+    projection: Optional[dict] = None
+) -> List[dict]:
+    """One page of ``collection`` ordered by (sort_field, id).
+
+    With a cursor the page starts right after it and ``skip`` is ignored;
+    without one, ``skip`` is still honoured for older clients. When the page
+    is full, the cursor for the next page is set on the response header.
+    """
+    query = filter_query
+    if cursor is not None:
+        keyset = keyset_filter(cursor, sort_field, direction)
+        query = {'$and': [filter_query, keyset]} if filter_query else keyset
+
+    find = collection.find(query, projection).sort([(sort_field, direction), ('id', direction)])
+    if cursor is None and skip:
+        find = find.skip(skip)
+    docs = await find.limit(limit).to_list(limit)
+
+    if len(docs) == limit:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(docs[-1], sort_field)
+    return docs
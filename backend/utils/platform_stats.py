@@ -0,0 +1,261 @@
+from pymongo import UpdateOne
+from config.database import client, db
+from config.settings import settings
+from utils.migrations import run_migration
+from utils.transactions import transactions_supported
+from datetime import datetime
+from typing import Dict, List, Optional
+import asyncio
+import logging
+import random
+
+logger = logging.getLogger(__name__)
+
+# Rollup documents live in one collection: the running totals under
+# GLOBAL_ID and one bucket per UTC day under 'day:YYYY-MM-DD'.
+#
+# Each rollup is a base document plus PLATFORM_STATS_SLOTS slot documents
+# ('<rollup>/<k>', tagged with ``rollup``). record_stats runs inside the
+# money transactions, so it $incs one random slot: concurrent transactions
+# rarely touch the same document and do not write-conflict on a single
+# hot counter. Reads sum the base and its slots. Rebuilds only $set the
+# base (to the recomputed value minus the slots, read at the same
+# snapshot), so increments landing during a rebuild are kept.
+GLOBAL_ID = 'global'
+
+# Every counter the rollup maintains; rebuilds and drift reports use this list
+COUNTERS = [
+    'coin_supply', 'bonus_pool', 'locked_coins', 'withdrawals_held', 'total_minted',
+    'bet_count', 'bets_pending', 'bets_won', 'bets_lost', 'bets_cancelled', 'bet_volume', 'total_winnings',
+    'deposit_count', 'deposits_pending', 'deposits_approved', 'deposit_amount',
+    'withdrawal_count', 'withdrawals_pending', 'withdrawals_approved', 'withdrawal_amount'
+]
+
+# Counters that describe flow during a day (as opposed to running balances)
+DAILY_COUNTERS = [
+    'total_minted', 'bet_count', 'bet_volume', 'total_winnings', 'deposit_amount', 'withdrawal_amount'
+]
+
+def day_bucket_id(at: datetime) -> str:
+    return f'day:{at.strftime("%Y-%m-%d")}'
+
+def slot_id(rollup_id: str, slot: int) -> str:
+    return f'{rollup_id}/{slot}'
+
+def _rollup_of(doc: dict) -> str:
+    # Bases written before slots existed carry no ``rollup`` field
+    return doc.get('rollup') or doc['_id']
+
+async def record_stats(increments: Dict[str, float], session=None, at: Optional[datetime] = None):
+    """$inc one slot of the global rollup and of the day bucket in a single round trip"""
+    now = at or datetime.utcnow()
+    day_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    daily = {k: v for k, v in increments.items() if k in DAILY_COUNTERS}
+    slot = random.randrange(settings.PLATFORM_STATS_SLOTS)
+
+    ops = [UpdateOne(
+        {'_id': slot_id(GLOBAL_ID, slot)},
+        {'$inc': increments, '$set': {'rollup': GLOBAL_ID, 'updated_at': now}},
+        upsert=True
+    )]
+    if daily:
+        day_id = day_bucket_id(now)
+        ops.append(UpdateOne(
+            {'_id': slot_id(day_id, slot)},
+            {'$inc': daily, '$set': {'rollup': day_id, 'date': day_start, 'updated_at': now}},
+            upsert=True
+        ))
+
+    await db.platform_stats.bulk_write(ops, ordered=False, session=session)
+
+def _sum_docs(docs: List[dict]) -> Dict[str, Dict[str, float]]:
+    """Counters per rollup id, summed over its base and slots"""
+    totals: Dict[str, Dict[str, float]] = {}
+    for doc in docs:
+        rollup = totals.setdefault(_rollup_of(doc), {})
+        for counter in COUNTERS:
+            if doc.get(counter) is not None:
+                rollup[counter] = rollup.get(counter, 0) + doc[counter]
+    return totals
+
+def _rollup_filter(rollup_ids: List[str]) -> dict:
+    return {'$or': [{'_id': {'$in': rollup_ids}}, {'rollup': {'$in': rollup_ids}}]}
+
+async def get_platform_stats(at: Optional[datetime] = None) -> Dict[str, Dict[str, float]]:
+    """Read the global rollup and today's bucket, each summed over its slots"""
+    now = at or datetime.utcnow()
+    today = day_bucket_id(now)
+    docs = await db.platform_stats.find(_rollup_filter([GLOBAL_ID, today])).to_list(None)
+    totals = _sum_docs(docs)
+    return {
+        'global': totals.get(GLOBAL_ID, {}),
+        'today': totals.get(today, {})
+    }
+
+async def _group_one(collection, session, pipeline) -> dict:
+    rows = await collection.aggregate(pipeline, session=session).to_list(1)
+    return rows[0] if rows else {}
+
+def _count_if(field: str, value) -> dict:
+    return {'$sum': {'$cond': [{'$eq': [f'${field}', value]}, 1, 0]}}
+
+def _sum_if(field: str, value, amount_field: str = 'amount') -> dict:
+    return {'$sum': {'$cond': [{'$eq': [f'${field}', value]}, f'${amount_field}', 0]}}
+
+async def compute_platform_stats(session=None) -> Dict[str, Dict[str, float]]:
+    """Recompute every rollup from the source collections.
+
+    Ledger totals (minted, winnings, deposit/withdrawal amounts and the
+    per-day flows) come from ``transactions``; balances come from
+    ``wallets`` and status counts from bets, deposits and withdrawals.
+    With a snapshot ``session`` every read sees the same point in time;
+    the aggregations then run one after another, since a session serves
+    one operation at a time.
+    """
+    reads = [
+        db.wallets.aggregate([
+            {'$group': {'_id': '$wallet_type', 'balance': {'$sum': '$balance'}}}
+        ], session=session).to_list(None),
+        _group_one(db.transactions, session, [{'$group': {
+            '_id': None,
+            'total_minted': _sum_if('transaction_type', 'mint'),
+            'total_winnings': _sum_if('transaction_type', 'win'),
+            'deposit_amount': _sum_if('transaction_type', 'deposit'),
+            'withdrawal_amount': _sum_if('transaction_type', 'withdrawal')
+        }}]),
+        _group_one(db.bets, session, [{'$group': {
+            '_id': None,
+            'bet_count': {'$sum': 1},
+            'bet_volume': {'$sum': '$amount'},
+            'bets_pending': _count_if('status', 'pending'),
+            'bets_won': _count_if('status', 'won'),
+            'bets_lost': _count_if('status', 'lost'),
+            'bets_cancelled': _count_if('status', 'cancelled')
+        }}]),
+        _group_one(db.deposits, session, [{'$group': {
+            '_id': None,
+            'deposit_count': {'$sum': 1},
+            'deposits_pending': _count_if('status', 'pending'),
+            'deposits_approved': _count_if('status', 'approved')
+        }}]),
+        _group_one(db.withdrawals, session, [{'$group': {
+            '_id': None,
+            'withdrawal_count': {'$sum': 1},
+            'withdrawals_pending': _count_if('status', 'pending'),
+            'withdrawals_approved': _count_if('status', 'approved'),
+            'withdrawals_held': _sum_if('status', 'pending')
+        }}]),
+        db.transactions.aggregate([
+            {'$match': {'transaction_type': {'$in': ['mint', 'win', 'deposit', 'withdrawal']}}},
+            {'$group': {
+                '_id': {'$dateToString': {'format': '%Y-%m-%d', 'date': '$created_at'}},
+                'total_minted': _sum_if('transaction_type', 'mint'),
+                'total_winnings': _sum_if('transaction_type', 'win'),
+                'deposit_amount': _sum_if('transaction_type', 'deposit'),
+                'withdrawal_amount': _sum_if('transaction_type', 'withdrawal')
+            }}
+        ], session=session).to_list(None),
+        db.bets.aggregate([
+            {'$group': {
+                '_id': {'$dateToString': {'format': '%Y-%m-%d', 'date': '$created_at'}},
+                'bet_count': {'$sum': 1},
+                'bet_volume': {'$sum': '$amount'}
+            }}
+        ], session=session).to_list(None)
+    ]
+    if session is None:
+        results = await asyncio.gather(*reads)
+    else:
+        results = [await read for read in reads]
+    wallet_rows, txn_stats, bet_stats, deposit_stats, withdrawal_stats, daily_txns, daily_bets = results
+
+    balances = {row['_id']: row['balance'] for row in wallet_rows}
+    totals = {
+        'coin_supply': balances.get('main_coin', 0),
+        'bonus_pool': balances.get('bonus', 0),
+        'locked_coins': balances.get('locked', 0)
+    }
+    for row in (txn_stats, bet_stats, deposit_stats, withdrawal_stats):
+        totals.update({k: v for k, v in row.items() if k != '_id'})
+
+    days: Dict[str, Dict[str, float]] = {}
+    for row in daily_txns + daily_bets:
+        bucket = days.setdefault(f'day:{row["_id"]}', {})
+        bucket.update({k: v for k, v in row.items() if k != '_id'})
+
+    return {
+        GLOBAL_ID: {k: totals.get(k, 0) for k in COUNTERS},
+        **{day: {k: values.get(k, 0) for k in DAILY_COUNTERS} for day, values in days.items()}
+    }
+
+async def _read_at_snapshot():
+    """Recomputed rollups and the stored rollup documents, read at one point in time"""
+    if not await transactions_supported():
+        # Standalone development server: no snapshot reads, so increments
+        # made while a rebuild runs can be counted twice or missed
+        return await compute_platform_stats(), await db.platform_stats.find({}).to_list(None)
+    async with await client.start_session(snapshot=True) as session:
+        expected = await compute_platform_stats(session)
+        stored = await db.platform_stats.find({}, session=session).to_list(None)
+        return expected, stored
+
+async def reconcile_platform_stats(apply: bool = False, tolerance: float = 1e-6) -> Dict[str, Dict[str, tuple]]:
+    """Compare stored rollups against a full recompute and optionally rebuild them.
+
+    The recompute and the stored documents are read at the same snapshot,
+    and a rebuild only sets each base to the recomputed value minus its
+    slots. Slots keep taking increments throughout, so nothing recorded
+    after the snapshot is overwritten.
+
+    Returns ``{rollup_id: {counter: (stored, expected)}}`` for every drifted counter.
+    """
+    expected, stored_docs = await _read_at_snapshot()
+    stored = _sum_docs(stored_docs)
+    slots = _sum_docs([d for d in stored_docs if d['_id'] != _rollup_of(d)])
+
+    drift: Dict[str, Dict[str, tuple]] = {}
+    for rollup_id in set(expected) | set(stored):
+        want = expected.get(rollup_id, {})
+        have = stored.get(rollup_id, {})
+        counters = COUNTERS if rollup_id == GLOBAL_ID else DAILY_COUNTERS
+        diffs = {
+            k: (have.get(k, 0), want.get(k, 0))
+            for k in counters
+            if abs(float(have.get(k, 0) or 0) - float(want.get(k, 0) or 0)) > tolerance
+        }
+        if diffs:
+            drift[rollup_id] = diffs
+
+    if apply:
+        now = datetime.utcnow()
+        ops = []
+        for rollup_id in set(expected) | set(stored):
+            counters = COUNTERS if rollup_id == GLOBAL_ID else DAILY_COUNTERS
+            want = expected.get(rollup_id, {})
+            in_slots = slots.get(rollup_id, {})
+            fields = {k: want.get(k, 0) - in_slots.get(k, 0) for k in counters}
+            fields.update({'rollup': rollup_id, 'updated_at': now})
+            if rollup_id != GLOBAL_ID:
+                fields['date'] = datetime.strptime(rollup_id[4:], '%Y-%m-%d')
+            ops.append(UpdateOne({'_id': rollup_id}, {'$set': fields}, upsert=True))
+        await db.platform_stats.bulk_write(ops, ordered=False)
+        logger.info(f'Platform stats rebuilt: {len(drift)} rollup(s) had drift')
+
+    return drift
+
+async def _rollup_missing() -> bool:
+    return not await db.platform_stats.find_one({'_id': GLOBAL_ID}, {'_id': 1})
+
+async def _build_rollups():
+    logger.info('Platform stats rollup missing, rebuilding from source collections')
+    await reconcile_platform_stats(apply=True)
+    return True
+
+async def ensure_platform_stats():
+    """Build the rollup bases once for deployments that predate them.
+
+    run_migration keeps it to one worker. Other workers keep recording
+    into the slots meanwhile; the rebuild leaves those increments alone
+    (see reconcile_platform_stats).
+    """
+    await run_migration('platform_stats', _rollup_missing, _build_rollups)
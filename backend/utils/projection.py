@@ -0,0 +1,61 @@
+from fastapi import HTTPException, Query, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel
+from typing import Callable, Dict, Iterable, List, Optional, Type
+
+# List routes load only what their summary model shows; heavy fields
+# (embedded messages, config blobs, file references) are left to the
+# detail routes. A FieldSet turns a summary model into a Mongo projection
+# and doubles as the dependency for the optional ``fields=`` parameter,
+# which narrows a list to a sparse fieldset.
+
+class FieldSet:
+    def __init__(self, model: Type[BaseModel], stored: Iterable[str] = (), computed: Iterable[str] = ()):
+        self.model = model
+        self.fields: List[str] = list(model.model_fields)
+        # Summary fields the route computes (e.g. links) rather than reads,
+        # and the stored fields it needs to compute them
+        self.computed = set(computed)
+        self.stored = list(stored)
+
+    def __call__(
+        self,
+        fields: Optional[str] = Query(None, description='Comma-separated fields to return (sparse fieldset)')
+    ) -> Optional[List[str]]:
+        """Query dependency validating ``fields`` against the summary model"""
+        if fields is None:
+            return None
+        requested = list(dict.fromkeys(f.strip() for f in fields.split(',') if f.strip()))
+        unknown = [f for f in requested if f not in self.fields]
+        if unknown or not requested:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f'Unknown fields: {", ".join(unknown)}' if unknown else 'fields is empty'
+            )
+        return requested
+
+    def projection(self, requested: Optional[List[str]] = None, required: Iterable[str] = ('id',)) -> dict:
+        """Mongo projection for the summary (or just ``requested`` plus ``required``,
+        which must cover whatever the pagination cursor is built from)"""
+        names = self.fields if requested is None else [*required, *requested]
+        return {
+            '_id': 0,
+            **{name: 1 for name in names if name not in self.computed},
+            **{name: 1 for name in self.stored}
+        }
+
+    def respond(self, docs: List[dict], requested: Optional[List[str]] = None,
+                computed: Optional[Callable[[dict], Dict]] = None, response: Optional[Response] = None):
+        """Summary models, or plain JSON rows holding only the requested fields.
+
+        Sparse rows bypass the route's response model, so headers already
+        set on ``response`` (the next-page cursor) are carried over.
+        """
+        rows = [{**doc, **computed(doc)} if computed else doc for doc in docs]
+        if requested is None:
+            return [self.model(**row) for row in rows]
+        return JSONResponse(
+            jsonable_encoder([{name: row.get(name) for name in requested} for row in rows]),
+            headers=dict(response.headers) if response is not None else None
+        )
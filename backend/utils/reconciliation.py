@@ -0,0 +1,222 @@
+from config.database import db
+from config.settings import settings
+from utils.ledger import get_account_balances, replay, wallet_account
+from datetime import datetime, timedelta
+from decimal import Decimal
+from models.money import ZERO
+from typing import AsyncIterator, Dict, List, Optional
+import asyncio
+import logging
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Wallet vs ledger reconciliation. Both sides are compared at a cut-off
+# (``as_of``) a little behind the clock. A full run folds the ledger into a
+# dict of expected balances per wallet account (memory follows the number
+# of wallets, not ledger rows) and streams ``wallets`` against it. An
+# incremental run only looks at accounts with ledger entries or wallet
+# updates since the last completed run's cut-off, which is its checkpoint.
+#
+# Wallets that moved after the cut-off are compared once more against the
+# ledger at the current time, so live traffic doesn't show up as drift.
+# Every run is recorded in ``reconciliation_runs`` with its summary and
+# the first mismatches.
+
+MAX_STORED_MISMATCHES = 1000
+
+def _mismatch(account: str, wallet: Optional[dict], expected: Decimal) -> dict:
+    user_id, _, wallet_type = account.rpartition(':')
+    have = wallet.get('balance', ZERO) if wallet else None
+    return {
+        'type': 'mismatch',
+        'account': account,
+        'user_id': user_id,
+        'wallet_type': wallet_type,
+        'wallet_balance': have,
+        'ledger_balance': expected,
+        'difference': None if have is None else have - expected
+    }
+
+async def _wallets_for(accounts: List[str]) -> Dict[str, dict]:
+    clauses = []
+    for account in accounts:
+        user_id, _, wallet_type = account.rpartition(':')
+        clauses.append({'user_id': user_id, 'wallet_type': wallet_type})
+    if not clauses:
+        return {}
+    wallets = await db.wallets.find(
+        {'$or': clauses}, {'_id': 0, 'user_id': 1, 'wallet_type': 1, 'balance': 1, 'updated_at': 1}
+    ).to_list(None)
+    return {wallet_account(w['user_id'], w['wallet_type']): w for w in wallets}
+
+async def _recheck(accounts: List[str], tolerance: float) -> AsyncIterator[dict]:
+    """Compare wallets that moved after the cut-off against the ledger as it is now"""
+    for i in range(0, len(accounts), 500):
+        chunk = accounts[i:i + 500]
+        expected = await get_account_balances(chunk)
+        wallets = await _wallets_for(chunk)
+        for account in chunk:
+            wallet = wallets.get(account)
+            if wallet is None or abs(wallet.get('balance', ZERO) - expected[account]) > tolerance:
+                yield _mismatch(account, wallet, expected[account])
+
+async def _full(as_of: datetime, batch_size: int, tolerance: float, from_zero: bool, counts: dict):
+    expected = await replay(until=as_of, from_snapshots=not from_zero, batch_size=batch_size)
+    expected = {a: v for a, v in expected.items() if not a.startswith('system:')}
+    counts['ledger_accounts'] = len(expected)
+
+    active = []
+    cursor = db.wallets.find(
+        {}, {'_id': 0, 'user_id': 1, 'wallet_type': 1, 'balance': 1, 'updated_at': 1}
+    ).batch_size(batch_size)
+    async for wallet in cursor:
+        counts['checked'] += 1
+        account = wallet_account(wallet['user_id'], wallet['wallet_type'])
+        want = expected.pop(account, ZERO)
+        if abs(wallet.get('balance', ZERO) - want) <= tolerance:
+            continue
+        if wallet.get('updated_at') and wallet['updated_at'] > as_of:
+            active.append(account)
+        else:
+            yield _mismatch(account, wallet, want)
+
+    # Ledger balances with no wallet behind them
+    for account, want in expected.items():
+        if abs(want) > tolerance:
+            yield _mismatch(account, None, want)
+
+    counts['rechecked'] = len(active)
+    async for item in _recheck(active, tolerance):
+        yield item
+
+async def _touched_since(checkpoint: datetime, as_of: datetime, batch_size: int) -> AsyncIterator[List[str]]:
+    """Wallet accounts with ledger entries or wallet updates in (checkpoint, as_of], in chunks"""
+    seen = set()
+    chunk = []
+    sources = [
+        db.ledger_entries.aggregate([
+            {'$match': {'created_at': {'$gt': checkpoint, '$lte': as_of}, 'user_id': {'$ne': None}}},
+            {'$group': {'_id': '$account'}}
+        ], allowDiskUse=True, batchSize=batch_size),
+        db.wallets.aggregate([
+            {'$match': {'updated_at': {'$gt': checkpoint, '$lte': as_of}}},
+            {'$project': {'_id': {'$concat': ['$user_id', ':', '$wallet_type']}}}
+        ], batchSize=batch_size)
+    ]
+    for source in sources:
+        async for row in source:
+            if row['_id'] in seen:
+                continue
+            seen.add(row['_id'])
+            chunk.append(row['_id'])
+            if len(chunk) >= batch_size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+async def _incremental(checkpoint: datetime, as_of: datetime, batch_size: int, tolerance: float, counts: dict):
+    active = []
+    async for accounts in _touched_since(checkpoint, as_of, batch_size):
+        counts['checked'] += len(accounts)
+        expected = await get_account_balances(accounts, as_of)
+        wallets = await _wallets_for(accounts)
+        for account in accounts:
+            wallet = wallets.get(account)
+            want = expected[account]
+            if wallet is not None and abs(wallet.get('balance', ZERO) - want) <= tolerance:
+                continue
+            if wallet is not None and wallet.get('updated_at') and wallet['updated_at'] > as_of:
+                active.append(account)
+            else:
+                yield _mismatch(account, wallet, want)
+
+    counts['rechecked'] = len(active)
+    async for item in _recheck(active, tolerance):
+        yield item
+
+async def last_checkpoint() -> Optional[datetime]:
+    run = await db.reconciliation_runs.find_one(
+        {'status': 'completed'}, {'as_of': 1}, sort=[('as_of', -1)]
+    )
+    return run['as_of'] if run else None
+
+async def reconcile_wallets(
+    incremental: bool = False,
+    from_zero: bool = False,
+    batch_size: int = 1000,
+    tolerance: float = 1e-6
+) -> AsyncIterator[dict]:
+    """Diff wallets.balance against the ledger, yielding mismatches as they are found.
+
+    The last item is always the run summary (``type: 'summary'``). An
+    incremental run with no completed run before it falls back to a full
+    run. ``from_zero`` makes a full run fold the entire ledger instead of
+    starting from the newest snapshot epoch.
+    """
+    started = time.perf_counter()
+    as_of = datetime.utcnow() - timedelta(seconds=settings.LEDGER_SNAPSHOT_LAG_SECONDS)
+    checkpoint = await last_checkpoint() if incremental else None
+    mode = 'incremental' if checkpoint else 'full'
+
+    run_id = str(uuid.uuid4())
+    await db.reconciliation_runs.insert_one({
+        'id': run_id,
+        'mode': mode,
+        'checkpoint': checkpoint,
+        'as_of': as_of,
+        'status': 'running',
+        'started_at': datetime.utcnow()
+    })
+
+    counts = {'checked': 0, 'rechecked': 0}
+    mismatches = []
+    total = 0
+    try:
+        if checkpoint:
+            items = _incremental(checkpoint, as_of, batch_size, tolerance, counts)
+        else:
+            items = _full(as_of, batch_size, tolerance, from_zero, counts)
+        async for item in items:
+            total += 1
+            if len(mismatches) < MAX_STORED_MISMATCHES:
+                mismatches.append(item)
+            yield item
+    except Exception as e:
+        await db.reconciliation_runs.update_one(
+            {'id': run_id}, {'$set': {'status': 'failed', 'error': str(e), 'finished_at': datetime.utcnow()}}
+        )
+        raise
+    except BaseException:
+        # The consumer went away: GeneratorExit when the stream is closed
+        # early, CancelledError when a disconnected client's task is
+        # cancelled. Shielded so the status update outlives the cancellation.
+        try:
+            await asyncio.shield(db.reconciliation_runs.update_one(
+                {'id': run_id}, {'$set': {'status': 'aborted', 'finished_at': datetime.utcnow()}}
+            ))
+        except asyncio.CancelledError:
+            pass
+        raise
+
+    summary = {
+        'type': 'summary',
+        'run_id': run_id,
+        'mode': mode,
+        'checkpoint': checkpoint,
+        'as_of': as_of,
+        **counts,
+        'mismatches': total,
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 1)
+    }
+    await db.reconciliation_runs.update_one({'id': run_id}, {'$set': {
+        'status': 'completed',
+        'summary': {k: v for k, v in summary.items() if k != 'type'},
+        'mismatch_report': [{k: v for k, v in m.items() if k != 'type'} for m in mismatches],
+        'finished_at': datetime.utcnow()
+    }})
+    if total:
+        logger.warning(f'Wallet reconciliation {run_id} ({mode}): {total} mismatch(es)')
+    yield summary
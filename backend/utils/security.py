@@ -1,45 +1,25 @@
+import asyncio
 import hashlib
-import hmac
-import os
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
 from typing import Optional
 import pyotp
 import qrcode
+from qrcode.image.svg import SvgPathImage
 import io
 import base64
 from config.settings import settings
+from utils.hashers import make_password, verify_hash
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a password against a hash"""
-    # Use PBKDF2 with SHA256
-    salt = hashed_password[:32]  # First 32 chars are salt
-    stored_hash = hashed_password[32:]
-    
-    new_hash = hashlib.pbkdf2_hmac(
-        'sha256',
-        plain_password.encode('utf-8'),
-        salt.encode('utf-8'),
-        100000
-    ).hex()
-    
-    return hmac.compare_digest(new_hash, stored_hash)
+    """Verify a password against a hash (any registered or legacy format)"""
+    return verify_hash(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
-    """Hash a password"""
-    # Generate random salt
-    salt = base64.b64encode(os.urandom(24)).decode('utf-8')[:32]
-    
-    # Hash password with PBKDF2
-    pwd_hash = hashlib.pbkdf2_hmac(
-        'sha256',
-        password.encode('utf-8'),
-        salt.encode('utf-8'),
-        100000
-    ).hex()
-    
-    # Return salt + hash
-    return salt + pwd_hash
+    """Hash a password with the configured hasher"""
+    return make_password(password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create JWT access token"""
@@ -61,20 +41,85 @@ def create_refresh_token(data: dict) -> str:
     encoded_jwt = jwt.encode(to_encode, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
     return encoded_jwt
 
-def decode_token(token: str) -> Optional[dict]:
-    """Decode and verify JWT token"""
-    try:
-        payload = jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
+class TokenCache:
+    """Bounded LRU of verified token payloads, keyed by SHA-256 of the token.
+
+    Entries are only added after a full signature check and are dropped
+    once the token's ``exp`` passes, so a hit is exactly as valid as a
+    fresh verify. Failed verifications are never cached.
+    """
+    
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, digest: bytes) -> Optional[dict]:
+        entry = self._entries.get(digest)
+        if entry is None:
+            self.misses += 1
+            return None
+        payload, expires_at = entry
+        if expires_at <= time.time():
+            del self._entries[digest]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(digest)
+        self.hits += 1
         return payload
+    
+    def put(self, digest: bytes, payload: dict):
+        expires_at = payload.get('exp')
+        if not isinstance(expires_at, (int, float)):
+            return
+        self._entries[digest] = (payload, expires_at)
+        self._entries.move_to_end(digest)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+    
+    def clear(self):
+        self._entries.clear()
+    
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else 0.0
+        }
+
+token_cache = TokenCache(settings.JWT_CACHE_SIZE)
+
+def verify_token(token: str) -> Optional[dict]:
+    """Full signature and expiry check, bypassing the cache"""
+    try:
+        return jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
     except JWTError:
         return None
 
+def decode_token(token: str) -> Optional[dict]:
+    """Decode and verify JWT token (served from the verified-token cache when possible)"""
+    digest = hashlib.sha256(token.encode('utf-8')).digest()
+    payload = token_cache.get(digest)
+    if payload is not None:
+        return payload
+    
+    payload = verify_token(token)
+    if payload is not None:
+        token_cache.put(digest, payload)
+    return payload
+
 def generate_totp_secret() -> str:
     """Generate a new TOTP secret"""
     return pyotp.random_base32()
 
-def generate_qr_code(secret: str, email: str) -> str:
-    """Generate QR code for TOTP setup"""
+QR_FORMATS = {'png': 'image/png', 'svg': 'image/svg+xml'}
+
+def generate_qr_code(secret: str, email: str, image_format: str = 'png') -> str:
+    """Generate QR code for TOTP setup as a data URL (PNG via PIL, or SVG without it)"""
     totp = pyotp.TOTP(secret)
     provisioning_uri = totp.provisioning_uri(name=email, issuer_name=settings.TOTP_ISSUER)
     
@@ -83,14 +128,41 @@ def generate_qr_code(secret: str, email: str) -> str:
     qr.add_data(provisioning_uri)
     qr.make(fit=True)
     
-    img = qr.make_image(fill_color='black', back_color='white')
+    buffered = io.BytesIO()
+    if image_format == 'svg':
+        qr.make_image(image_factory=SvgPathImage).save(buffered)
+    else:
+        img = qr.make_image(fill_color='black', back_color='white')
+        img.save(buffered, format='PNG')
     
     # Convert to base64
-    buffered = io.BytesIO()
-    img.save(buffered, format='PNG')
     img_str = base64.b64encode(buffered.getvalue()).decode()
     
-    return f'data:image/png;base64,{img_str}'
+    return f'data:{QR_FORMATS[image_format]};base64,{img_str}'
+
+# Rendered QR codes for pending (not yet verified) secrets, so repeated
+# /2fa/setup calls return the same image without re-rendering
+_qr_cache: OrderedDict = OrderedDict()
+QR_CACHE_SIZE = 256
+
+async def render_qr_code(secret: str, email: str, image_format: str = 'png') -> str:
+    """Cached generate_qr_code, rendered in a worker thread"""
+    key = (secret, email, image_format)
+    cached = _qr_cache.get(key)
+    if cached is not None:
+        _qr_cache.move_to_end(key)
+        return cached
+    
+    qr_code = await asyncio.to_thread(generate_qr_code, secret, email, image_format)
+    _qr_cache[key] = qr_code
+    if len(_qr_cache) > QR_CACHE_SIZE:
+        _qr_cache.popitem(last=False)
+    return qr_code
+
+def discard_qr_code(secret: str):
+    """Forget rendered QR codes for ``secret`` once it is enabled or replaced"""
+    for key in [k for k in _qr_cache if k[0] == secret]:
+        del _qr_cache[key]
 
 def verify_totp(secret: str, code: str) -> bool:
     """Verify TOTP code"""
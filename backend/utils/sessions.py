@@ -0,0 +1,151 @@
+from pymongo import ReturnDocument
+from config.database import db
+from config.settings import settings
+from utils.security import create_access_token, create_refresh_token, verify_token
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+import asyncio
+import logging
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Server-side login sessions. Each login creates a ``sessions`` document
+# whose id travels in both tokens as ``sid``; the refresh token also carries
+# the session's current ``jti``, which rotates on every refresh. Sessions
+# expire through a TTL index on ``expires_at`` (sliding: each refresh
+# pushes it out again).
+#
+# Revoked session ids are mirrored into an in-memory set on every worker so
+# get_current_user can reject a revoked access token with one set lookup.
+# Entries only need to outlive the longest access token issued for them.
+
+SYNC_OVERLAP = timedelta(seconds=5)
+
+class SessionError(ValueError):
+    """Refresh token is invalid, expired, reused or belongs to a revoked session"""
+
+class RevocationSet:
+    def __init__(self):
+        self._revoked: Dict[bytes, datetime] = {}
+        self._last_seen: Optional[datetime] = None
+
+    @staticmethod
+    def _key(sid: str) -> bytes:
+        # 16-byte UUID keys instead of 36-char strings
+        try:
+            return uuid.UUID(sid).bytes
+        except ValueError:
+            return sid.encode('utf-8')
+
+    def add(self, sid: str, revoked_at: datetime):
+        self._revoked[self._key(sid)] = revoked_at
+
+    def __contains__(self, sid: str) -> bool:
+        return self._key(sid) in self._revoked
+
+    def __len__(self) -> int:
+        return len(self._revoked)
+
+    def prune(self, now: datetime):
+        horizon = now - timedelta(minutes=settings.JWT_ACCESS_TOKEN_EXPIRE_MINUTES)
+        for key in [k for k, at in self._revoked.items() if at < horizon]:
+            del self._revoked[key]
+
+    async def sync(self):
+        """Pull revocations made by any worker since the last sync"""
+        now = datetime.utcnow()
+        since = self._last_seen or now - timedelta(minutes=settings.JWT_ACCESS_TOKEN_EXPIRE_MINUTES)
+        # Overlap the window a little: revoked_at comes from each worker's clock
+        async for doc in db.sessions.find(
+            {'revoked_at': {'$gt': since - SYNC_OVERLAP}},
+            {'_id': 0, 'id': 1, 'revoked_at': 1}
+        ):
+            self.add(doc['id'], doc['revoked_at'])
+            since = max(since, doc['revoked_at'])
+        self._last_seen = since
+        self.prune(now)
+
+    async def run_sync_loop(self, interval: float):
+        while True:
+            try:
+                await self.sync()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f'Session revocation sync failed: {str(e)}')
+            await asyncio.sleep(interval)
+
+revoked_sessions = RevocationSet()
+
+def is_session_revoked(sid: Optional[str]) -> bool:
+    return bool(sid) and sid in revoked_sessions
+
+def _issue_tokens(user: dict, sid: str, jti: str) -> Tuple[str, str]:
+    token_data = {'sub': user['id'], 'role': user['role'], 'email': user['email'], 'sid': sid}
+    return create_access_token(token_data), create_refresh_token({**token_data, 'jti': jti})
+
+async def create_session(user: dict, user_agent: Optional[str] = None) -> Tuple[str, str]:
+    """Open a session for ``user`` and return (access_token, refresh_token)"""
+    now = datetime.utcnow()
+    sid, jti = str(uuid.uuid4()), str(uuid.uuid4())
+    await db.sessions.insert_one({
+        'id': sid,
+        'user_id': user['id'],
+        'refresh_jti': jti,
+        'user_agent': user_agent,
+        'created_at': now,
+        'last_used_at': now,
+        'expires_at': now + timedelta(days=settings.JWT_REFRESH_TOKEN_EXPIRE_DAYS),
+        'revoked_at': None
+    })
+    return _issue_tokens(user, sid, jti)
+
+async def refresh_session(refresh_token: str) -> Tuple[str, str, dict]:
+    """Rotate a session's refresh token; returns (access_token, refresh_token, user).
+
+    Presenting a refresh token that was already rotated away means it leaked
+    or was replayed, so the whole session is revoked.
+    """
+    payload = verify_token(refresh_token)
+    if not payload or payload.get('type') != 'refresh' or not payload.get('sid') or not payload.get('jti'):
+        raise SessionError('Invalid refresh token')
+
+    sid, now = payload['sid'], datetime.utcnow()
+    new_jti = str(uuid.uuid4())
+    session = await db.sessions.find_one_and_update(
+        {'id': sid, 'refresh_jti': payload['jti'], 'revoked_at': None, 'expires_at': {'$gt': now}},
+        {'$set': {
+            'refresh_jti': new_jti,
+            'last_used_at': now,
+            'expires_at': now + timedelta(days=settings.JWT_REFRESH_TOKEN_EXPIRE_DAYS)
+        }},
+        return_document=ReturnDocument.AFTER
+    )
+    if not session:
+        if await db.sessions.find_one({'id': sid, 'revoked_at': None}, {'_id': 1}):
+            logger.warning(f'Refresh token reuse detected, revoking session {sid}')
+            await revoke_session(sid)
+        raise SessionError('Refresh token expired or revoked')
+
+    user = await db.users.find_one({'id': session['user_id']})
+    if not user or not user.get('is_active', True):
+        await revoke_session(sid)
+        raise SessionError('Account is unavailable')
+
+    access_token, new_refresh_token = _issue_tokens(user, sid, new_jti)
+    return access_token, new_refresh_token, user
+
+async def revoke_session(sid: str):
+    now = datetime.utcnow()
+    await db.sessions.update_one({'id': sid, 'revoked_at': None}, {'$set': {'revoked_at': now}})
+    revoked_sessions.add(sid, now)
+
+async def revoke_user_sessions(user_id: str):
+    """Revoke every live session of ``user_id`` (suspension, password change)"""
+    now = datetime.utcnow()
+    sids = await db.sessions.distinct('id', {'user_id': user_id, 'revoked_at': None})
+    if sids:
+        await db.sessions.update_many({'id': {'$in': sids}}, {'$set': {'revoked_at': now}})
+        for sid in sids:
+            revoked_sessions.add(sid, now)
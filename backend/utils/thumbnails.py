@@ -0,0 +1,64 @@
+from concurrent.futures import ThreadPoolExecutor
+from config.settings import settings
+from pathlib import Path
+from typing import Dict, Optional, Union
+import asyncio
+import io
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Image variants for review screens: a small thumbnail for lists and a
+# larger preview for the detail view. Decoding and resampling are
+# CPU-bound (Pillow releases the GIL for most of it), so rendering runs on
+# a dedicated thread pool, never on the event loop.
+
+VARIANTS = ('thumbnail', 'preview')
+
+def _sizes() -> Dict[str, int]:
+    return {'thumbnail': settings.THUMBNAIL_SIZE, 'preview': settings.PREVIEW_SIZE}
+
+def render_variants(source: Union[str, Path, bytes]) -> Dict[str, bytes]:
+    """JPEG thumbnail and preview of an image file; {} if it is not an image Pillow can read"""
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    try:
+        image = Image.open(io.BytesIO(source) if isinstance(source, bytes) else source)
+        image.load()
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+        return {}
+
+    with image:
+        # Phone photos carry their rotation in EXIF
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        rendered = {}
+        for variant, size in _sizes().items():
+            copy = image.copy()
+            copy.thumbnail((size, size))
+            out = io.BytesIO()
+            copy.save(out, 'JPEG', quality=80, optimize=True)
+            rendered[variant] = out.getvalue()
+        return rendered
+
+class ThumbnailPool:
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.rendered = 0
+
+    async def render(self, source: Union[str, Path, bytes]) -> Dict[str, bytes]:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='thumbs')
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(self._executor, render_variants, source)
+        self.rendered += 1
+        return result
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+thumbnail_pool = ThumbnailPool(settings.THUMBNAIL_WORKERS)
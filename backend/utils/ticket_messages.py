@@ -0,0 +1,106 @@
+from pymongo import UpdateOne
+from config.database import db
+from models.support import TicketMessage
+from utils.migrations import run_migration
+from utils.transactions import run_in_transaction
+from datetime import datetime
+from typing import Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Ticket threads live in ticket_messages, one document per message, read
+# oldest first through (ticket_id, created_at, id). The ticket keeps a
+# message_count and a copy of its last message so lists never touch the
+# thread. Tickets created before the split carried the thread as an
+# embedded ``messages`` array; migrate_ticket_messages() unbundles it.
+
+MIGRATION_ID = 'ticket_messages_unbundled'
+
+async def add_message(ticket_id: str, message: TicketMessage, ticket_update: Optional[dict] = None):
+    """Append ``message`` to a thread and refresh the ticket's summary fields"""
+    async def record(session):
+        await db.ticket_messages.insert_one(message.dict(), session=session)
+        await db.tickets.update_one(
+            {'id': ticket_id},
+            {
+                '$inc': {'message_count': 1},
+                '$set': {
+                    **(ticket_update or {}),
+                    'last_message': message.dict(),
+                    'updated_at': message.created_at
+                }
+            },
+            session=session
+        )
+
+    await run_in_transaction(record)
+
+def _unbundle(ticket: dict) -> list:
+    messages = []
+    for index, embedded in enumerate(ticket.get('messages') or []):
+        messages.append({
+            **embedded,
+            # Stable fallback id so a re-run upserts rather than duplicates
+            'id': embedded.get('id') or f'{ticket["id"]}:{index}',
+            'ticket_id': ticket['id'],
+            'created_at': embedded.get('created_at') or ticket.get('created_at') or datetime.utcnow()
+        })
+    return messages
+
+async def migrate_ticket_messages(batch_size: int = 100, dry_run: bool = False) -> Dict[str, int]:
+    """Move embedded ``messages`` arrays into ticket_messages.
+
+    Messages are upserted by id, then the array is dropped and its length
+    added to message_count in the same conditional update, so a ticket
+    replied to mid-migration (the reply already counted and set as
+    last_message) stays consistent. Safe to re-run; returns counts.
+    """
+    counts = {'tickets': 0, 'messages': 0}
+    query = {'messages': {'$exists': True}}
+    projection = {'_id': 1, 'id': 1, 'created_at': 1, 'messages': 1}
+
+    async for ticket in db.tickets.find(query, projection).batch_size(batch_size):
+        messages = _unbundle(ticket)
+        counts['tickets'] += 1
+        counts['messages'] += len(messages)
+        if dry_run:
+            continue
+
+        if messages:
+            await db.ticket_messages.bulk_write([
+                UpdateOne({'id': m['id']}, {'$setOnInsert': m}, upsert=True) for m in messages
+            ], ordered=False)
+        last = max(messages, key=lambda m: m['created_at']) if messages else None
+        await db.tickets.bulk_write([
+            # A reply written since is newer than anything in the array
+            UpdateOne(
+                {'_id': ticket['_id'], 'last_message': {'$exists': False}},
+                {'$set': {'last_message': last}}
+            ),
+            UpdateOne(
+                {'_id': ticket['_id'], 'messages': {'$exists': True}},
+                {'$unset': {'messages': ''}, '$inc': {'message_count': len(messages)}}
+            ),
+        ])
+
+    if not dry_run:
+        await db.migrations.update_one(
+            {'_id': MIGRATION_ID},
+            {'$set': {'completed_at': datetime.utcnow(), 'counts': counts}},
+            upsert=True
+        )
+    return counts
+
+async def _threads_pending() -> bool:
+    return not await db.migrations.find_one({'_id': MIGRATION_ID}, {'_id': 1})
+
+async def _migrate():
+    logger.info('Ticket messages still embedded, moving them to ticket_messages')
+    counts = await migrate_ticket_messages()
+    logger.info(f'Ticket message migration: {counts}')
+    return counts
+
+async def ensure_ticket_messages():
+    """Run the thread migration once (on one worker) for deployments that embedded messages"""
+    await run_migration(MIGRATION_ID, _threads_pending, _migrate)
@@ -0,0 +1,112 @@
+from pymongo.errors import PyMongoError
+from pymongo.read_concern import ReadConcern
+from pymongo.write_concern import WriteConcern
+from pymongo.read_preferences import ReadPreference
+from config.database import client
+from config.settings import settings
+from typing import Any, Awaitable, Callable, Optional
+import asyncio
+import random
+import logging
+
+logger = logging.getLogger(__name__)
+
+_transactions_supported: Optional[bool] = None
+
+class TransactionsUnavailableError(RuntimeError):
+    """Raised instead of running a write path without a transaction"""
+
+def transactions_disabled() -> bool:
+    """Whether non-atomic writes were explicitly allowed (MONGO_TRANSACTIONS=off)"""
+    return settings.MONGO_TRANSACTIONS.lower() in ('off', 'false', '0')
+
+async def transactions_supported() -> bool:
+    """Check (once) whether the deployment can run multi-document transactions"""
+    global _transactions_supported
+
+    if _transactions_supported is None:
+        mode = settings.MONGO_TRANSACTIONS.lower()
+        if mode in ('on', 'true', '1'):
+            _transactions_supported = True
+        elif transactions_disabled():
+            _transactions_supported = False
+            logger.warning('MONGO_TRANSACTIONS=off: ledger writes are not atomic (development only)')
+        else:
+            # Transactions need a replica set member or a mongos router
+            hello = await client.admin.command('hello')
+            _transactions_supported = bool(hello.get('setName')) or hello.get('msg') == 'isdbgrid'
+            logger.info(f'MongoDB transactions supported: {_transactions_supported}')
+            if not _transactions_supported:
+                logger.error(
+                    'MongoDB is a standalone server without transaction support; ledger writes will be '
+                    'refused. Run a replica set, or set MONGO_TRANSACTIONS=off for development.'
+                )
+
+    return _transactions_supported
+
+def _backoff(attempt: int) -> float:
+    return min(0.5, 0.01 * (2 ** attempt)) * random.uniform(0.5, 1.0)
+
+async def run_in_transaction(
+    callback: Callable[[Any], Awaitable[Any]],
+    max_attempts: Optional[int] = None
+) -> Any:
+    """Run ``callback(session)`` inside a MongoDB transaction and return its result.
+
+    This is the only retry layer (``session.with_transaction`` is not used,
+    as its own 120s retry loop would multiply with ours). The whole
+    transaction is retried with jittered backoff on TransientTransactionError
+    (write conflicts, elections), and a commit whose outcome is unknown is
+    committed again, up to ``max_attempts`` times in all. Any other
+    exception raised by the callback aborts the transaction and propagates.
+
+    Without transaction support this fails closed: a claim-then-move write
+    path run piecemeal could flip a status and then fail before moving the
+    money. Only with MONGO_TRANSACTIONS=off (single-node development) does
+    the callback run with ``session=None``.
+    """
+    if not await transactions_supported():
+        if not transactions_disabled():
+            raise TransactionsUnavailableError('MongoDB transactions are unavailable; refusing a non-atomic write')
+        return await callback(None)
+
+    attempts = max_attempts or settings.MONGO_TXN_MAX_ATTEMPTS
+    attempt = 0
+
+    async with await client.start_session() as session:
+        while True:
+            attempt += 1
+            session.start_transaction(
+                read_concern=ReadConcern('snapshot'),
+                write_concern=WriteConcern('majority'),
+                read_preference=ReadPreference.PRIMARY
+            )
+            try:
+                result = await callback(session)
+            except BaseException as e:
+                if session.in_transaction:
+                    await session.abort_transaction()
+                if (isinstance(e, PyMongoError) and e.has_error_label('TransientTransactionError')
+                        and attempt < attempts):
+                    logger.warning(f'Transient transaction error (attempt {attempt}/{attempts}), retrying: {str(e)}')
+                    await asyncio.sleep(_backoff(attempt))
+                    continue
+                raise
+
+            while True:
+                try:
+                    await session.commit_transaction()
+                    return result
+                except PyMongoError as e:
+                    if attempt >= attempts:
+                        raise
+                    if e.has_error_label('UnknownTransactionCommitResult'):
+                        # Committing again is safe: the server applies a commit once
+                        attempt += 1
+                        logger.warning(f'Unknown commit result (attempt {attempt}/{attempts}), committing again: {str(e)}')
+                        continue
+                    if e.has_error_label('TransientTransactionError'):
+                        break
+                    raise
+            logger.warning(f'Transient commit error (attempt {attempt}/{attempts}), retrying the transaction')
+            await asyncio.sleep(_backoff(attempt))
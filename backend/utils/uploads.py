@@ -0,0 +1,101 @@
+from fastapi import UploadFile
+from config.settings import settings
+from models.blob import BlobRef
+from utils.blobstore import (
+    CHUNK_SIZE, InvalidBlobError, allowed_content_type, decode_base64_file, get_blob_store, put_blob, read_blob
+)
+from utils.thumbnails import thumbnail_pool
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+import asyncio
+import hashlib
+import tempfile
+import uuid
+
+# Uploaded files (KYC documents, deposit screenshots) end up in the blob
+# store with their image variants next to them. Multipart uploads are
+# copied chunk by chunk to a temp file while being hashed, so a file is
+# never held in memory whole; the temp file is then moved into the store
+# under its hash.
+
+def _incoming_dir() -> Path:
+    # Next to local blobs so the final move is a rename, not a copy
+    if settings.UPLOAD_TMP_DIR:
+        path = Path(settings.UPLOAD_TMP_DIR)
+    elif settings.BLOB_STORE == 'local':
+        path = Path(settings.BLOB_LOCAL_PATH) / '.incoming'
+    else:
+        path = Path(tempfile.gettempdir())
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+async def _receive(upload: UploadFile, max_bytes: int) -> Tuple[Path, str, int, bytes]:
+    """Copy an upload to a temp file; returns (path, sha256, size, first chunk)"""
+    path = _incoming_dir() / f'{uuid.uuid4().hex}.part'
+    digest = hashlib.sha256()
+    size = 0
+    head = b''
+    f = await asyncio.to_thread(open, path, 'wb')
+    try:
+        while True:
+            chunk = await upload.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise InvalidBlobError(f'File exceeds {max_bytes} bytes')
+            if not head:
+                head = chunk
+            digest.update(chunk)
+            await asyncio.to_thread(f.write, chunk)
+    except BaseException:
+        await asyncio.to_thread(f.close)
+        path.unlink(missing_ok=True)
+        raise
+    await asyncio.to_thread(f.close)
+    if not size:
+        path.unlink(missing_ok=True)
+        raise InvalidBlobError('File is empty')
+    return path, digest.hexdigest(), size, head
+
+async def _store_variants(rendered: Dict[str, bytes]) -> Dict[str, BlobRef]:
+    return {variant: await put_blob(data, 'image/jpeg') for variant, data in rendered.items()}
+
+async def store_upload(upload: UploadFile, max_bytes: Optional[int] = None) -> Tuple[BlobRef, Dict[str, BlobRef]]:
+    """Store a multipart upload; returns its reference and its image variants"""
+    path, key, size, head = await _receive(upload, max_bytes or settings.BLOB_MAX_BYTES)
+    try:
+        # The multipart Content-Type is the client's claim; only the bytes count
+        content_type = allowed_content_type(head)
+        # Render from the temp file before it is moved into the store
+        variants = await _store_variants(await thumbnail_pool.render(path)) if content_type.startswith('image/') else {}
+        await get_blob_store().put_path(key, path)
+    finally:
+        path.unlink(missing_ok=True)
+    return BlobRef(key=key, size=size, content_type=content_type), variants
+
+async def store_base64(payload: str, max_bytes: Optional[int] = None) -> Tuple[BlobRef, Dict[str, BlobRef]]:
+    """Store a base64 (or data: URL) file from a JSON body, with its image variants"""
+    data, content_type = decode_base64_file(payload, max_bytes or settings.BLOB_MAX_BYTES)
+    ref = await put_blob(data, content_type)
+    variants = await _store_variants(await thumbnail_pool.render(data)) if content_type.startswith('image/') else {}
+    return ref, variants
+
+async def resolve_variant(collection, doc_id: str, path: str, ref: BlobRef,
+                          stored: Dict[str, dict], variant: str) -> Optional[BlobRef]:
+    """The ``variant`` of a stored file (None if it has none).
+
+    Files stored before variants were rendered at upload get them on first
+    request; they are saved under ``path`` on the owning document.
+    """
+    if variant == 'original':
+        return ref
+    if variant not in stored and ref.content_type.startswith('image/'):
+        rendered = await _store_variants(await thumbnail_pool.render(await read_blob(ref)))
+        if rendered:
+            await collection.update_one({'id': doc_id}, {'$set': {path: {k: v.dict() for k, v in rendered.items()}}})
+        stored = rendered
+    value = stored.get(variant)
+    if value is None:
+        return None
+    return value if isinstance(value, BlobRef) else BlobRef(**value)
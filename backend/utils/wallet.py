@@ -0,0 +1,168 @@
+from pymongo import ReturnDocument, UpdateOne
+from config.database import db
+from utils import ledger
+from utils.ledger import Posting
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+from models.money import ZERO
+from typing import Dict, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+class WalletError(ValueError):
+    """Base error for wallet mutations"""
+
+class WalletNotFoundError(WalletError):
+    """Raised when the target wallet does not exist"""
+
+class InsufficientBalanceError(WalletError):
+    """Raised when a debit would take the wallet below zero"""
+
+async def _inc_balance(user_id: str, wallet_type: str, delta: Decimal, session=None) -> Decimal:
+    """Single conditional $inc; debits are guarded by ``balance >= -delta``"""
+    wallet_filter = {'user_id': user_id, 'wallet_type': wallet_type}
+    query = dict(wallet_filter)
+    if delta < 0:
+        query['balance'] = {'$gte': -delta}
+
+    wallet = await db.wallets.find_one_and_update(
+        query,
+        {'$inc': {'balance': delta}, '$set': {'updated_at': datetime.utcnow()}},
+        projection={'balance': 1},
+        return_document=ReturnDocument.AFTER,
+        session=session
+    )
+
+    if wallet is None:
+        # Only the failure path pays for a second round trip to explain why
+        existing = await db.wallets.find_one(wallet_filter, {'balance': 1}, session=session)
+        if not existing:
+            raise WalletNotFoundError(f'Wallet not found for user {user_id}, type {wallet_type}')
+        raise InsufficientBalanceError(
+            f'Insufficient balance. Have: {existing.get("balance", 0.0)}, Need: {-delta}'
+        )
+
+    return wallet['balance']
+
+async def update_wallet_balance(
+    user_id: str,
+    wallet_type: str,
+    amount: Decimal,
+    operation: str = 'add',
+    session=None,
+    entry_type: str = 'adjustment',
+    ref: Optional[dict] = None,
+    counterparty: Optional[str] = None
+) -> Decimal:
+    """Update wallet balance atomically with a single conditional $inc.
+
+    Debits are guarded by ``balance >= amount`` in the filter, so concurrent
+    writers can never overdraw the wallet. The movement is posted to the
+    ledger against the system account ``counterparty`` (default: the entry
+    type). Returns the new balance.
+    """
+    if operation == 'add':
+        delta = amount
+    elif operation == 'subtract':
+        delta = -amount
+    else:
+        raise ValueError(f'Invalid operation: {operation}')
+
+    new_balance = await _inc_balance(user_id, wallet_type, delta, session=session)
+    await ledger.post([
+        Posting(entry_type, ref).wallet(user_id, wallet_type, delta).balance_against(counterparty or entry_type)
+    ], session=session)
+    return new_balance
+
+async def move_balance(
+    from_user_id: str,
+    from_wallet_type: str,
+    to_user_id: str,
+    to_wallet_type: str,
+    amount: Decimal,
+    session=None,
+    entry_type: str = 'transfer',
+    ref: Optional[dict] = None
+) -> Decimal:
+    """Debit one wallet and credit another, one round trip per leg.
+
+    Outside a transaction, a failed credit leg is compensated so coins are
+    never lost; inside one, the abort rolls both legs back instead. Both
+    legs go to the ledger as a single posting. Returns the new balance of
+    the debited wallet.
+    """
+    new_balance = await _inc_balance(from_user_id, from_wallet_type, -amount, session=session)
+
+    try:
+        await _inc_balance(to_user_id, to_wallet_type, amount, session=session)
+    except Exception:
+        if session is not None and session.in_transaction:
+            raise
+        logger.error(
+            f'Credit leg failed, compensating debit: {amount} back to {from_user_id}/{from_wallet_type}'
+        )
+        await _inc_balance(from_user_id, from_wallet_type, amount)
+        raise
+
+    await ledger.post([
+        Posting(entry_type, ref)
+        .wallet(from_user_id, from_wallet_type, -amount)
+        .wallet(to_user_id, to_wallet_type, amount)
+    ], session=session)
+    return new_balance
+
+async def apply_postings(postings: List[Posting], session=None):
+    """Apply many ledger postings: net wallet changes in one bulk_write, entries in one insert_many.
+
+    Wallet legs are summed per (user_id, wallet_type) and each net debit
+    carries the same ``balance >= amount`` guard as update_wallet_balance.
+    If any wallet is missing or would go negative a WalletError is raised
+    before the ledger is written; inside a transaction the abort undoes
+    the rest of the batch.
+    """
+    deltas: Dict[Tuple[str, str], Decimal] = defaultdict(Decimal)
+    for posting in postings:
+        for _, user_id, wallet_type, amount in posting.legs:
+            if user_id is not None:
+                deltas[(user_id, wallet_type)] += amount
+
+    now = datetime.utcnow()
+    ops = []
+    for (user_id, wallet_type), delta in deltas.items():
+        if not delta:
+            continue
+        query = {'user_id': user_id, 'wallet_type': wallet_type}
+        if delta < 0:
+            query['balance'] = {'$gte': -delta}
+        ops.append(UpdateOne(query, {'$inc': {'balance': delta}, '$set': {'updated_at': now}}))
+
+    if ops:
+        result = await db.wallets.bulk_write(ops, ordered=False, session=session)
+        if result.matched_count != len(ops):
+            raise WalletError(
+                f'{len(ops) - result.matched_count} of {len(ops)} wallet updates did not apply '
+                f'(missing wallet or insufficient balance)'
+            )
+
+    await ledger.post(postings, session=session)
+
+async def get_main_balances(user_ids: List[str]) -> Dict[str, Decimal]:
+    """Sum main_coin balances for many users in one round trip"""
+    if not user_ids:
+        return {}
+
+    rows = await db.wallets.aggregate([
+        {'$match': {'user_id': {'$in': user_ids}, 'wallet_type': 'main_coin'}},
+        {'$group': {'_id': '$user_id', 'balance': {'$sum': '$balance'}}}
+    ]).to_list(None)
+
+    balances = {user_id: ZERO for user_id in user_ids}
+    balances.update({row['_id']: row['balance'] for row in rows})
+    return balances
+
+async def get_main_balance(user_id: str) -> Decimal:
+    """Sum main_coin balance for a single user"""
+    balances = await get_main_balances([user_id])
+    return balances[user_id]